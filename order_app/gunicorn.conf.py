@@ -0,0 +1,26 @@
+"""Gunicorn configuration for serving order_app.asgi with Uvicorn workers.
+
+    gunicorn order_app.asgi:application -c gunicorn.conf.py
+
+Each worker runs one event loop, so the async views under ``/orders/async/``
+keep a slow client on a coroutine instead of a thread; the synchronous DRF
+views still run in the worker's thread pool. Leave ``DB_CONN_MAX_AGE`` at 0
+under ASGI: Django closes connections at the end of each async request, and
+``DB_POOL_MAX_SIZE`` is the way to reuse them on PostgreSQL.
+"""
+
+import multiprocessing
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+worker_class = "uvicorn.workers.UvicornWorker"
+workers = int(os.environ.get("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+# Exports of the whole table can stream for minutes; the timeout only
+# applies to workers whose event loop stops responding.
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 120))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", 60))
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", 5))
+# Recycle workers now and then so memory held by large exports is returned.
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 10000))
+max_requests_jitter = max_requests // 10
+accesslog = "-"
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -42,6 +43,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "orders.metrics.OrderMetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -98,12 +100,95 @@ LOGGING = {
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+# SQLite by default, in WAL mode so the API keeps reading while fetch_orders
+# writes. Set DB_ENGINE=postgresql for concurrent writers; connections are
+# kept for DB_CONN_MAX_AGE seconds, or taken from a psycopg pool when
+# DB_POOL_MAX_SIZE is set (the two are mutually exclusive). DB_CONN_MAX_AGE
+# defaults to 0 as ASGI runs each request in a new thread, whose persistent
+# connection would never be reused; raise it only under WSGI. PostgreSQL
+# needs psycopg 3, installed with its "pool" extra for pooling.
+
+if os.environ.get("DB_ENGINE") == "postgresql":
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": os.environ.get("DB_NAME", "order_app"),
+            "USER": os.environ.get("DB_USER", ""),
+            "PASSWORD": os.environ.get("DB_PASSWORD", ""),
+            "HOST": os.environ.get("DB_HOST", ""),
+            "PORT": os.environ.get("DB_PORT", ""),
+            "CONN_MAX_AGE": int(os.environ.get("DB_CONN_MAX_AGE", 0)),
+            "CONN_HEALTH_CHECKS": True,
+        }
     }
-}
+    if os.environ.get("DB_POOL_MAX_SIZE"):
+        DATABASES["default"]["CONN_MAX_AGE"] = 0
+        DATABASES["default"]["OPTIONS"] = {
+            "pool": {
+                "min_size": int(os.environ.get("DB_POOL_MIN_SIZE", 2)),
+                "max_size": int(os.environ["DB_POOL_MAX_SIZE"]),
+                "timeout": int(os.environ.get("DB_POOL_TIMEOUT", 10)),
+            }
+        }
+else:
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": os.environ.get("DB_NAME", BASE_DIR / "db.sqlite3"),
+            "OPTIONS": {
+                "init_command": "PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;",
+                # Take the write lock when a transaction starts, so concurrent
+                # writers wait for up to "timeout" seconds instead of failing
+                # with "database is locked" when upgrading a read lock.
+                "transaction_mode": "IMMEDIATE",
+                "timeout": int(os.environ.get("DB_BUSY_TIMEOUT", 20)),
+            },
+        }
+    }
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# The order API caches serialized responses once REDIS_URL is set. The cache
+# must be shared: fetch_orders and every web worker invalidate the entries of
+# the orders they write. An in-process cache would keep serving the other
+# processes' stale entries, so without Redis nothing is cached.
+
+if os.environ.get("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ["REDIS_URL"],
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.dummy.DummyCache",
+        }
+    }
+
+# Seconds a cached order response stays valid.
+ORDERS_CACHE_TIMEOUT = int(os.environ.get("ORDERS_CACHE_TIMEOUT", 300))
+
+
+# Per-view latency, SQL query and response size metrics of the orders API,
+# exposed at /orders/metrics/. The middleware is unloaded when disabled.
+ORDERS_METRICS_ENABLED = os.environ.get("ORDERS_METRICS_ENABLED", "").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+
+# Directory where fetch_orders keeps a compressed copy of each feed and its
+# ETag/Last-Modified validators. Caching is disabled when unset.
+ORDERS_FEED_CACHE_DIR = os.environ.get("ORDERS_FEED_CACHE_DIR")
+
+# Directory of the compressed segments archive_orders moves old orders to,
+# and the default age in days past which it archives them. The order detail
+# endpoint falls back to the archive when it is set.
+ORDERS_ARCHIVE_DIR = os.environ.get("ORDERS_ARCHIVE_DIR")
+ORDERS_ARCHIVE_AFTER_DAYS = int(os.environ.get("ORDERS_ARCHIVE_AFTER_DAYS", 365))
 
 
 # Password validation
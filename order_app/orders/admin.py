@@ -1,5 +1,26 @@
 from django.contrib import admin
 
-from .models import Order
+from .models import Order, OrderLine, RejectedOrder
 
-admin.site.register(Order)
+
+class OrderLineInline(admin.TabularInline):
+    model = OrderLine
+    extra = 0
+
+
+@admin.register(Order)
+class OrderAdmin(admin.ModelAdmin):
+    inlines = [OrderLineInline]
+    raw_id_fields = [
+        "billing_customer",
+        "billing_location",
+        "delivery_customer",
+        "delivery_location",
+    ]
+
+
+@admin.register(RejectedOrder)
+class RejectedOrderAdmin(admin.ModelAdmin):
+    list_display = ["order_id", "stage", "feed", "rejected_at"]
+    list_filter = ["stage"]
+    search_fields = ["order_id", "reason"]
@@ -0,0 +1,212 @@
+"""Cold storage for old orders.
+
+archive_orders moves the orders purchased before a cutoff out of the
+database into gzip-compressed NDJSON segments, one directory per purchase
+month. Each line is the full API representation of an order, so an archived
+order is served exactly as it was. ``index.json`` lists the segments with
+their row count, purchase date range and sorted order_ids; a lookup opens
+only the segment holding the id, and an id that is not archived opens none.
+
+Archived days keep their sales rollups: rebuild_sales_rollups leaves the
+days up to the newest archived purchase date alone, and changes to orders
+of those days adjust their rollups rather than recompute them. fetch_orders
+skips the archived orders a feed sends again; with --restore-archived it
+stores them anew, and the stored copy then takes precedence over the
+archived one, in the rollups too.
+"""
+
+import gzip
+import json
+import os
+import time
+from dataclasses import dataclass
+from datetime import date, timedelta
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from orders.cache import invalidate_orders
+from orders.contacts import CONTACT_RELATIONS
+from orders.models import Order
+from orders.serializers import OrderSerializer
+from orders.utils import batched
+
+INDEX = "index.json"
+
+
+class OrderArchive:
+    """Segments of archived orders under ``directory`` and their index."""
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self._index: list[dict] = []
+        self._index_mtime: int | None = None
+        # order_id -> segment, for every archived order.
+        self._locations: dict[str, str] = {}
+
+    @property
+    def index_path(self) -> Path:
+        return self.directory / INDEX
+
+    def segments(self) -> list[dict]:
+        """Index entries, re-read whenever another process rewrote the file."""
+        try:
+            mtime = self.index_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return []
+        if mtime != self._index_mtime:
+            self._index = json.loads(self.index_path.read_text(encoding="utf-8"))
+            self._index_mtime = mtime
+            self._locations = {}
+            for entry in self._index:
+                self._locate(entry)
+        return self._index
+
+    def _locate(self, entry: dict):
+        if "order_ids" not in entry:
+            # Segments indexed before the index listed their order_ids.
+            with gzip.open(
+                self.directory / entry["segment"], "rt", encoding="utf-8"
+            ) as file:
+                entry["order_ids"] = [json.loads(line)["order_id"] for line in file]
+        self._locations.update(dict.fromkeys(entry["order_ids"], entry["segment"]))
+
+    def _write_index(self, segments: list[dict]):
+        tmp_path = self.index_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(segments), encoding="utf-8")
+        os.replace(tmp_path, self.index_path)
+        self._index = segments
+        self._index_mtime = self.index_path.stat().st_mtime_ns
+
+    def write_segment(self, partition: str, records: list[dict]) -> dict:
+        """Write ``records``, sorted by order_id, as a new segment of
+        ``partition`` (a purchase month) and add it to the index."""
+        encoder = DjangoJSONEncoder(separators=(",", ":"))
+        relative = (
+            Path(partition[:4])
+            / partition
+            / (f"{partition}-{time.time_ns()}.ndjson.gz")
+        )
+        path = self.directory / relative
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "wb") as file:
+            with gzip.GzipFile(fileobj=file, mode="wb", compresslevel=6) as body:
+                for record in records:
+                    body.write(encoder.encode(record).encode() + b"\n")
+            # The orders are deleted next: the segment must be on disk first.
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+
+        order_ids = [record["order_id"] for record in records]
+        dates = [
+            record["order_purchase_date"]
+            for record in records
+            if record["order_purchase_date"]
+        ]
+        entry = {
+            "segment": relative.as_posix(),
+            "partition": partition,
+            "rows": len(records),
+            "bytes": path.stat().st_size,
+            "min_purchase_date": min(dates, default=None),
+            "max_purchase_date": max(dates, default=None),
+            "order_ids": sorted(order_ids),
+        }
+        self._write_index([*self.segments(), entry])
+        self._locate(entry)
+        return entry
+
+    def archived_until(self) -> date | None:
+        """Latest purchase date of an archived order."""
+        dates = [
+            entry["max_purchase_date"]
+            for entry in self.segments()
+            if entry["max_purchase_date"]
+        ]
+        return date.fromisoformat(max(dates)) if dates else None
+
+    def __contains__(self, order_id: str) -> bool:
+        self.segments()
+        return order_id in self._locations
+
+    def find(self, order_id: str) -> dict | None:
+        """Archived representation of ``order_id``, or None."""
+        self.segments()
+        segment = self._locations.get(order_id)
+        if segment is None:
+            return None
+        # Records start with their order_id, so lines are matched on that
+        # prefix and only the matching one is decoded.
+        prefix = '{"order_id":' + json.dumps(order_id) + ","
+        with gzip.open(self.directory / segment, "rt", encoding="utf-8") as file:
+            for line in file:
+                if line.startswith(prefix):
+                    return json.loads(line)
+        return None
+
+
+@lru_cache(maxsize=None)
+def _open_archive(directory: str) -> OrderArchive:
+    return OrderArchive(directory)
+
+
+def get_archive() -> OrderArchive | None:
+    """Archive configured by ``ORDERS_ARCHIVE_DIR``, or None."""
+    directory = getattr(settings, "ORDERS_ARCHIVE_DIR", None)
+    return _open_archive(str(directory)) if directory else None
+
+
+def find_archived_order(order_id: str) -> dict | None:
+    archive = get_archive()
+    return archive.find(order_id) if archive is not None else None
+
+
+@dataclass
+class ArchiveResult:
+    orders: int = 0
+    segments: int = 0
+    bytes: int = 0
+
+
+def archive_orders(
+    archive: OrderArchive, before: date, segment_size=20000, delete_batch_size=1000
+) -> ArchiveResult:
+    """Move the orders purchased before ``before`` into ``archive``.
+
+    Each month is read in order_id order, ``segment_size`` orders at a time.
+    A segment is written and indexed before its orders are deleted, so an
+    interruption can at worst leave orders both archived and in the database,
+    where the database copy wins.
+    """
+    result = ArchiveResult()
+    orders = (
+        Order.objects.select_related(*CONTACT_RELATIONS)
+        .prefetch_related("lines")
+        .filter(order_purchase_date__lt=before)
+        .order_by("order_id")
+    )
+    for month in orders.dates("order_purchase_date", "month"):
+        next_month = (month + timedelta(days=31)).replace(day=1)
+        rows = orders.filter(
+            order_purchase_date__gte=month, order_purchase_date__lt=next_month
+        )
+        while batch := list(rows[:segment_size]):
+            entry = archive.write_segment(
+                month.strftime("%Y-%m"), OrderSerializer(batch, many=True).data
+            )
+            order_ids = [order.order_id for order in batch]
+            with transaction.atomic():
+                for ids in batched(order_ids, delete_batch_size):
+                    Order.objects.filter(order_id__in=ids).delete()
+                transaction.on_commit(
+                    lambda order_ids=order_ids: invalidate_orders(order_ids)
+                )
+            result.orders += entry["rows"]
+            result.segments += 1
+            result.bytes += entry["bytes"]
+    return result
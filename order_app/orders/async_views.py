@@ -0,0 +1,142 @@
+"""Async counterparts of the order list, detail and export endpoints.
+
+Served under ASGI, these views await the async ORM and stream their output
+from async generators, so a slow client holds a coroutine rather than a
+worker thread. They authenticate with the DRF authentication classes and
+share the pagination and export code of the DRF views, so they accept the
+same credentials and return the same representations.
+"""
+
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework import exceptions
+from rest_framework.request import Request
+from rest_framework.views import APIView
+
+from .archive import find_archived_order
+from .cache import acached_entry, detail_key
+from .contacts import only_order_fields
+from .filters import filter_orders
+from .models import Order
+from .pagination import OrderKeysetPagination
+from .search import search_orders
+from .serializers import OrderListSerializer, OrderSerializer
+from .views import PAGINATION_COLUMNS, OrderDetailView, OrderExportView
+
+CHUNK_SIZE = 500
+
+
+def error(detail, status: int) -> JsonResponse:
+    if isinstance(detail, str):
+        detail = {"detail": detail}
+    return JsonResponse(detail, status=status, safe=False)
+
+
+def authenticated(view):
+    """Authenticate like the DRF views, reject anonymous requests and render
+    DRF exceptions, for the GET-only async views below. The view receives
+    the DRF Request."""
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        authenticators = APIView().get_authenticators()
+        request = Request(request, authenticators=authenticators)
+        try:
+            # Authenticators query the database synchronously.
+            user = await sync_to_async(lambda: request.user)()
+            if not user.is_authenticated:
+                raise exceptions.NotAuthenticated()
+            return await view(request, *args, **kwargs)
+        except exceptions.APIException as e:
+            response = error(e.detail, e.status_code)
+            if isinstance(
+                e, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)
+            ):
+                # As APIView.handle_exception: 401 only when the first
+                # authenticator can challenge the client.
+                header = authenticators[0].authenticate_header(request)
+                if header:
+                    response["WWW-Authenticate"] = header
+                else:
+                    response.status_code = 403
+            return response
+
+    return require_GET(wrapper)
+
+
+def filtered_orders(request):
+    queryset = filter_orders(Order.objects.all(), request.query_params)
+    return search_orders(queryset, request.query_params.get("q", ""))
+
+
+async def stream_page(paginator, queryset, size: int):
+    """Stream ``{"results": [...], "next": ...}`` one order at a time."""
+    encoder = DjangoJSONEncoder()
+    yield '{"results": ['
+    count = 0
+    previous = None
+    paginator.next_position = None
+    async for order in queryset[: size + 1].aiterator(chunk_size=CHUNK_SIZE):
+        if count == size:
+            paginator.next_position = (
+                previous.order_purchase_date,
+                previous.order_id,
+            )
+            break
+        if count:
+            yield ","
+        yield encoder.encode(OrderListSerializer(order).data)
+        previous = order
+        count += 1
+    yield f'], "next": {encoder.encode(paginator.get_next_link())}}}'
+
+
+@authenticated
+async def order_list(request):
+    """Compact order list with the filters, search and keyset pagination of
+    OrderListView, streamed as it is read."""
+    paginator = OrderKeysetPagination()
+    paginator.request = request
+    queryset = only_order_fields(
+        filtered_orders(request),
+        [*OrderListSerializer.Meta.fields, *PAGINATION_COLUMNS],
+    ).order_by(*PAGINATION_COLUMNS)
+    position = paginator.decode_cursor(request)
+    if position is not None:
+        queryset = queryset.filter(paginator.after(*position))
+    return StreamingHttpResponse(
+        stream_page(paginator, queryset, paginator.get_page_size(request)),
+        content_type="application/json",
+    )
+
+
+@authenticated
+async def order_detail(request, order_id):
+    """Order with its lines, sharing the response cache of OrderDetailView."""
+
+    async def build_data():
+        try:
+            order = await OrderDetailView.queryset.aget(order_id=order_id)
+        except Order.DoesNotExist:
+            return await sync_to_async(find_archived_order)(order_id)
+        return OrderSerializer(order).data
+
+    entry = await acached_entry(detail_key(order_id), build_data)
+    if entry is None:
+        return error("No Order matches the given query.", 404)
+    if entry.etag in request.headers.get("If-None-Match", ""):
+        response = HttpResponse(status=304)
+    else:
+        response = JsonResponse(entry.data, encoder=DjangoJSONEncoder)
+    response["ETag"] = entry.etag
+    return response
+
+
+@authenticated
+async def order_export(request):
+    """NDJSON or CSV export of OrderExportView, read with aiterator()."""
+    return OrderExportView.export(request.query_params, asynchronous=True)
@@ -0,0 +1,681 @@
+"""Micro-benchmarks for the order ingestion pipeline.
+
+Run them through ``python manage.py benchmark <suite>``.
+"""
+
+import copy
+import json
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from datetime import date, timedelta
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+from xml.etree import ElementTree
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import DatabaseError, connection, transaction
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from orders.contacts import (
+    CONTACT_RELATIONS,
+    build_contact,
+    contact_cache,
+    only_order_fields,
+)
+from orders.feedgen import write_feed
+from orders.filters import filter_orders
+
+from orders.ingestion import (
+    DELIVERING_BY_MARKETPLACE_XPATH,
+    bulk_upsert_orders,
+    date_fields,
+    decimal_fields,
+    field_mappings,
+    extract_order_values,
+    order_field_extractor,
+)
+from orders.models import Address, Customer, Order
+from orders.search import rebuild_search_index, search_orders
+from orders.serializers import OrderListSerializer, OrderSerializer
+from orders.utils import (
+    batched,
+    datetime_converter,
+    get_str_from_element_and_xpath,
+    safe_datetime_conversion,
+    safe_decimal_conversion,
+)
+from orders.workers import extract_order_values_in_workers
+
+FIXTURE = Path(__file__).resolve().parent / "fixtures" / "xml_full_orders_lengow.xml"
+
+
+def load_order_element() -> ElementTree.Element:
+    root = ElementTree.fromstring(FIXTURE.read_text(encoding="utf-8"))
+    return root.find(".//order")
+
+
+def build_order_elements(count: int) -> list[ElementTree.Element]:
+    """Copies of the fixture order with unique order ids."""
+    template = load_order_element()
+    elements = []
+    for index in range(count):
+        order_elem = copy.deepcopy(template)
+        for tag in ("order_id", "order_mrid", "order_refid"):
+            order_elem.find(tag).text = f"111-2222222-{index:07d}"
+        elements.append(order_elem)
+    return elements
+
+
+def legacy_extract(order_elem: ElementTree.Element) -> dict:
+    """Reference extraction using one XPath lookup per field."""
+    values = {
+        field: get_str_from_element_and_xpath(order_elem, xpath)
+        for field, xpath in field_mappings.items()
+    }
+    for field, (xpath, date_format) in date_fields.items():
+        date_value = safe_datetime_conversion(
+            get_str_from_element_and_xpath(order_elem, xpath), date_format
+        )
+        if date_value:
+            if "time" in field:
+                values[field] = date_value.time()
+            else:
+                values[field] = timezone.make_aware(date_value)
+    for field in decimal_fields:
+        values[field] = safe_decimal_conversion(
+            get_str_from_element_and_xpath(order_elem, field)
+        ) or Decimal(0.0)
+    values["tracking_delivering_by_marketplace"] = (
+        get_str_from_element_and_xpath(order_elem, DELIVERING_BY_MARKETPLACE_XPATH)
+        == "1"
+    )
+    return values
+
+
+def measure(function, iterations: int) -> dict:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        function()
+    duration = time.perf_counter() - start
+    return {
+        "iterations": iterations,
+        "seconds": duration,
+        "per_second": iterations / duration if duration else 0.0,
+    }
+
+
+def bench_extractor(options) -> dict:
+    order_elem = load_order_element()
+    iterations = options["orders"]
+    return {
+        "legacy_xpath": measure(lambda: legacy_extract(order_elem), iterations),
+        "compiled_extractor": measure(
+            lambda: order_field_extractor.extract(order_elem), iterations
+        ),
+    }
+
+
+def legacy_decimal_conversion(value):
+    try:
+        return Decimal(value)
+    except (InvalidOperation, TypeError, ValueError):
+        return None
+
+
+def bench_converters(options) -> dict:
+    """Per-order date and decimal conversion, strptime versus the fast path."""
+    order_elem = load_order_element()
+    date_texts = [
+        (field, get_str_from_element_and_xpath(order_elem, xpath), date_format)
+        for field, (xpath, date_format) in date_fields.items()
+    ]
+    decimal_texts = [
+        get_str_from_element_and_xpath(order_elem, field) for field in decimal_fields
+    ] + ["", ""]
+    converters = {
+        date_format: datetime_converter(date_format) for _, _, date_format in date_texts
+    }
+
+    def before():
+        for field, value, date_format in date_texts:
+            date_value = safe_datetime_conversion(value, date_format)
+            if date_value:
+                if "time" in field:
+                    date_value.time()
+                else:
+                    timezone.make_aware(date_value)
+        for value in decimal_texts:
+            legacy_decimal_conversion(value)
+
+    def after():
+        current_timezone = timezone.get_current_timezone()
+        for field, value, date_format in date_texts:
+            date_value = converters[date_format](value)
+            if date_value:
+                if "time" in field:
+                    date_value.time()
+                else:
+                    timezone.make_aware(date_value, current_timezone)
+        for value in decimal_texts:
+            safe_decimal_conversion(value)
+
+    iterations = options["orders"]
+    return {
+        "strptime": measure(before, iterations),
+        "fast_path": measure(after, iterations),
+    }
+
+
+def bench_workers(options) -> dict:
+    order_elements = build_order_elements(options["orders"])
+    results = {}
+    for workers in range(1, (os.cpu_count() or 1) + 1):
+        start = time.perf_counter()
+        if workers == 1:
+            list(extract_order_values(order_elements))
+        else:
+            list(extract_order_values_in_workers(order_elements, workers))
+        duration = time.perf_counter() - start
+        results[f"workers={workers}"] = {
+            "iterations": len(order_elements),
+            "seconds": duration,
+            "per_second": len(order_elements) / duration if duration else 0.0,
+        }
+    return results
+
+
+@contextmanager
+def benchmark_database(on_disk=False):
+    """Run the enclosed block against a throwaway test database.
+
+    SQLite test databases live in memory unless ``on_disk`` is set, which
+    the backend comparison needs for journal and locking settings to apply.
+    """
+    test_settings = connection.settings_dict.setdefault("TEST", {})
+    old_test_name = test_settings.get("NAME")
+    with tempfile.TemporaryDirectory() as directory:
+        if on_disk and connection.vendor == "sqlite":
+            test_settings["NAME"] = os.path.join(directory, "benchmark.sqlite3")
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False
+        )
+        # Contacts remembered from an earlier database are not in this one.
+        contact_cache.clear()
+        try:
+            yield
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            contact_cache.clear()
+            test_settings["NAME"] = old_test_name
+
+
+MARKETPLACES = ["amazon", "cdiscount", "fnac", "ebay", "rakuten", "manomano"]
+STATUSES = ["new", "processing", "shipped", "cancel", "closed"]
+
+
+def seed_orders(count: int, seed=0, batch_size=10000):
+    """Insert ``count`` synthetic orders spread over three years, placed by
+    50,000 repeat customers.
+
+    Rows go through ``executemany`` rather than ``bulk_create``: at a million
+    rows the ORM's per-field preparation dominates the seeding time.
+    """
+    rng = random.Random(seed)
+    first_day = date(2022, 1, 1)
+    fields = Order._meta.concrete_fields
+    customers = [
+        build_contact(
+            Customer,
+            {"lastname": f"Customer {index}", "email": f"customer{index}@example.com"},
+        )
+        for index in range(min(count, 50000))
+    ]
+    Customer.objects.bulk_create(customers, batch_size=batch_size)
+    blanks = {
+        relation: build_contact(model, {})
+        for relation, model in CONTACT_RELATIONS.items()
+    }
+    Customer.objects.bulk_create([blanks["delivery_customer"]])
+    Address.objects.bulk_create([blanks["billing_location"]])
+    template = Order(
+        order_amount=0,
+        order_shipping=0,
+        order_commission=0,
+        order_processing_fee=0,
+        order_currency="EUR",
+        **blanks,
+    )
+    template_row = [
+        field.get_db_prep_save(field.pre_save(template, True), connection)
+        for field in fields
+    ]
+    positions = {field.name: position for position, field in enumerate(fields)}
+    sql = "INSERT INTO {} ({}) VALUES ({})".format(
+        connection.ops.quote_name(Order._meta.db_table),
+        ", ".join(connection.ops.quote_name(field.column) for field in fields),
+        ", ".join(["%s"] * len(fields)),
+    )
+
+    def rows():
+        for index in range(count):
+            order_id = f"{index:012d}"
+            row = list(template_row)
+            for name, value in (
+                ("order_id", order_id),
+                ("order_mrid", order_id),
+                ("order_refid", order_id),
+                ("marketplace", rng.choice(MARKETPLACES)),
+                ("id_flux", str(rng.randint(1, 50))),
+                ("order_status_lengow", rng.choice(STATUSES)),
+                (
+                    "order_purchase_date",
+                    (first_day + timedelta(days=rng.randint(0, 1095))).isoformat(),
+                ),
+                ("order_amount", str(rng.randint(100, 50000) / 100)),
+                ("billing_customer", customers[index % 50000].pk),
+            ):
+                row[positions[name]] = value
+            yield row
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        for batch in batched(rows(), batch_size):
+            cursor.executemany(sql, batch)
+
+
+EXPLAIN_QUERIES = {
+    "marketplace": {"marketplace": "amazon"},
+    "order_status_lengow": {"order_status_lengow": "shipped"},
+    "billing_email": {"billing_email": "customer42@example.com"},
+    "order_purchase_date": {"order_purchase_date": "2023-06-01"},
+    "marketplace+date_range": {
+        "marketplace": "amazon",
+        "order_purchase_date_from": "2023-01-01",
+        "order_purchase_date_to": "2023-01-31",
+    },
+    "status+date_range": {
+        "order_status_lengow": "new",
+        "order_purchase_date_from": "2024-06-01",
+        "order_purchase_date_to": "2024-06-30",
+    },
+}
+
+
+def bench_explain(options) -> dict:
+    """EXPLAIN the list view filters against a seeded dataset."""
+    results = {}
+    with benchmark_database():
+        start = time.perf_counter()
+        seed_orders(options["orders"])
+        results["seed"] = {
+            "rows": options["orders"],
+            "seconds": time.perf_counter() - start,
+        }
+        for name, params in EXPLAIN_QUERIES.items():
+            queryset = filter_orders(Order.objects.all(), params)[:100]
+            start = time.perf_counter()
+            rows = len(list(queryset))
+            results[name] = {
+                "rows": rows,
+                "seconds": time.perf_counter() - start,
+                "plan": queryset.explain(),
+            }
+    return results
+
+
+SEARCH_TERMS = {
+    "name": "customer 4242",
+    "email": "customer4242@",
+    "digits": "750",
+    "no_match": "nobody@nowhere",
+    "short_term": "zz",
+}
+
+
+def bench_search(options) -> dict:
+    """Latency of the ``?q=`` search against a seeded, indexed dataset."""
+    results = {}
+    with benchmark_database():
+        seed_orders(options["orders"])
+        start = time.perf_counter()
+        rebuild_search_index()
+        results["index"] = {
+            "rows": options["orders"],
+            "seconds": time.perf_counter() - start,
+        }
+        for name, term in SEARCH_TERMS.items():
+            queryset = search_orders(Order.objects.all(), term).order_by(
+                "order_purchase_date", "order_id"
+            )[:100]
+            start = time.perf_counter()
+            rows = len(list(queryset.values_list("order_id", flat=True)))
+            results[name] = {"rows": rows, "seconds": time.perf_counter() - start}
+    return results
+
+
+def bench_serializers(options) -> dict:
+    """Serialize the seeded orders in the full, compact and sparse shapes."""
+    sparse_fields = ["order_id", "order_purchase_date", "order_amount"]
+    shapes = {
+        "full": lambda: (
+            OrderSerializer(
+                Order.objects.select_related(*CONTACT_RELATIONS).prefetch_related(
+                    "lines"
+                ),
+                many=True,
+            ).data
+        ),
+        "compact": lambda: (
+            OrderListSerializer(
+                only_order_fields(Order.objects.all(), OrderListSerializer.Meta.fields),
+                many=True,
+            ).data
+        ),
+        "sparse": lambda: (
+            OrderSerializer(
+                Order.objects.only(*sparse_fields), many=True, fields=sparse_fields
+            ).data
+        ),
+    }
+    results = {}
+    with benchmark_database():
+        seed_orders(options["orders"])
+        for name, serialize in shapes.items():
+            start = time.perf_counter()
+            count = len(serialize())
+            duration = time.perf_counter() - start
+            results[name] = {
+                "iterations": count,
+                "seconds": duration,
+                "per_second": count / duration if duration else 0.0,
+            }
+    return results
+
+
+def ingest_orders(order_values: list[dict], batch_size=1000) -> dict:
+    start = time.perf_counter()
+    for batch in batched(order_values, batch_size):
+        bulk_upsert_orders(batch)
+    duration = time.perf_counter() - start
+    return {
+        "iterations": len(order_values),
+        "seconds": duration,
+        "per_second": len(order_values) / duration if duration else 0.0,
+    }
+
+
+def request_orders(client: APIClient, order_ids: list[str], stop=None) -> dict:
+    """Alternate detail and list requests, until ``stop`` is set if given."""
+    list_url = reverse("order_list")
+    requests = errors = 0
+    start = time.perf_counter()
+    for order_id in order_ids:
+        if stop is not None and stop.is_set():
+            break
+        for url in (reverse("order_by_id", args=[order_id]), list_url):
+            try:
+                client.get(url, {"order_purchase_date_from": "2014-10-01"})
+            except DatabaseError:
+                errors += 1
+            requests += 1
+    duration = time.perf_counter() - start
+    return {
+        "iterations": requests,
+        "seconds": duration,
+        "per_second": requests / duration if duration else 0.0,
+        "errors": errors,
+        "unit": "requests",
+    }
+
+
+def bench_backend(options) -> dict:
+    """Ingest and API throughput of the configured database backend.
+
+    Run it once per backend, e.g. with and without DB_ENGINE=postgresql, and
+    compare the outputs. The API is measured alone, then while a second ingest
+    of the same orders runs in another thread. Response caching is disabled
+    so every request reaches the database.
+    """
+    order_values = [
+        values
+        for values, _ in extract_order_values(build_order_elements(options["orders"]))
+    ]
+    order_ids = [values["order_id"] for values in order_values]
+    random.Random(0).shuffle(order_ids)
+    client = APIClient()
+    client.force_authenticate(User(username="benchmark"))
+
+    results = {}
+    with (
+        benchmark_database(on_disk=True),
+        override_settings(
+            ALLOWED_HOSTS=["testserver"],
+            CACHES={
+                "default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}
+            },
+        ),
+    ):
+        with connection.cursor() as cursor:
+            if connection.vendor == "sqlite":
+                journal_mode = cursor.execute("PRAGMA journal_mode").fetchone()[0]
+            else:
+                journal_mode = "-"
+        results["backend"] = {
+            "vendor": connection.vendor,
+            "journal_mode": journal_mode,
+            "conn_max_age": connection.settings_dict["CONN_MAX_AGE"],
+            "pool": bool(connection.settings_dict["OPTIONS"].get("pool")),
+        }
+        results["ingest"] = ingest_orders(order_values)
+        results["api"] = request_orders(client, order_ids[:500])
+
+        done = threading.Event()
+        concurrent_ingest = {}
+
+        def ingest_in_background():
+            try:
+                concurrent_ingest.update(ingest_orders(order_values))
+            finally:
+                done.set()
+                connection.close()
+
+        writer = threading.Thread(target=ingest_in_background)
+        writer.start()
+        results["api_during_ingest"] = request_orders(client, order_ids * 10, stop=done)
+        writer.join()
+        results["ingest_during_api"] = concurrent_ingest
+    return results
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+@contextmanager
+def serve_directory(directory: str):
+    """Serve ``directory`` over HTTP on a free local port, yielding its URL."""
+    server = ThreadingHTTPServer(
+        ("127.0.0.1", 0), partial(QuietHandler, directory=directory)
+    )
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_port}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@contextmanager
+def quiet_logger(name: str):
+    logger = logging.getLogger(name)
+    level = logger.level
+    logger.setLevel(logging.WARNING)
+    try:
+        yield
+    finally:
+        logger.setLevel(level)
+
+
+def percentile(values: list[float], percent: float) -> float:
+    """Nearest-rank percentile of ``values``."""
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, round(percent / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def fetch_with_stats(url: str, directory: str, *args) -> dict:
+    stats_path = os.path.join(directory, "stats.json")
+    with quiet_logger("orders.management.commands.fetch_orders"):
+        call_command("fetch_orders", url, "--stream", "--stats-json", stats_path, *args)
+    with open(stats_path, encoding="utf-8") as file:
+        stats = json.load(file)
+    processed = stats["orders"] + stats["skipped"]
+    return {
+        "iterations": processed,
+        "seconds": stats["total_seconds"],
+        "per_second": stats["orders_per_second"],
+        "written": stats["orders"],
+        "skipped": stats["skipped"],
+        "peak_rss_bytes": stats["peak_rss_bytes"],
+    }
+
+
+def measure_requests(client: APIClient, requests: list[tuple[str, dict]]) -> dict:
+    latencies = []
+    start = time.perf_counter()
+    for url, params in requests:
+        request_start = time.perf_counter()
+        response = client.get(url, params)
+        latencies.append((time.perf_counter() - request_start) * 1000)
+        if response.status_code != 200:
+            raise RuntimeError(f"GET {url} {params} returned {response.status_code}")
+    duration = time.perf_counter() - start
+    return {
+        "iterations": len(requests),
+        "seconds": duration,
+        "per_second": len(requests) / duration if duration else 0.0,
+        "p50_ms": percentile(latencies, 50),
+        "p99_ms": percentile(latencies, 99),
+        "unit": "requests",
+    }
+
+
+def bench_e2e(options) -> dict:
+    """Generate a feed, ingest it over HTTP with fetch_orders, re-ingest a
+    revision incrementally, then load the list and detail endpoints.
+
+    Response caching is disabled so every request reaches the database. Peak
+    RSS is the high-water mark of the whole benchmark process.
+    """
+    count = options["orders"]
+    rng = random.Random(0)
+    results = {}
+    client = APIClient()
+    client.force_authenticate(User(username="benchmark"))
+    with (
+        tempfile.TemporaryDirectory() as directory,
+        serve_directory(directory) as base_url,
+        benchmark_database(on_disk=True),
+        override_settings(
+            ALLOWED_HOSTS=["testserver"],
+            CACHES={
+                "default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}
+            },
+        ),
+    ):
+        start = time.perf_counter()
+        size = write_feed(os.path.join(directory, "feed-0.xml"), count)
+        write_feed(os.path.join(directory, "feed-1.xml"), count, revision=1)
+        results["generate"] = {
+            "orders": count,
+            "bytes": size,
+            "seconds": time.perf_counter() - start,
+        }
+
+        results["ingest"] = fetch_with_stats(f"{base_url}/feed-0.xml", directory)
+        results["ingest_incremental"] = fetch_with_stats(
+            f"{base_url}/feed-1.xml", directory, "--incremental"
+        )
+
+        order_ids = list(Order.objects.values_list("order_id", flat=True))
+        list_url = reverse("order_list")
+        requests = options["requests"]
+        results["api_list"] = measure_requests(client, [(list_url, {})] * requests)
+        results["api_list_filtered"] = measure_requests(
+            client,
+            [
+                (
+                    list_url,
+                    {
+                        "marketplace": rng.choice(MARKETPLACES),
+                        "order_purchase_date_from": "2023-01-01",
+                    },
+                )
+                for _ in range(requests)
+            ],
+        )
+        results["api_search"] = measure_requests(
+            client,
+            [
+                (list_url, {"q": f"{rng.randrange(count)}@marketplace"})
+                for _ in range(requests)
+            ],
+        )
+        results["api_detail"] = measure_requests(
+            client,
+            [
+                (reverse("order_by_id", args=[rng.choice(order_ids)]), {})
+                for _ in range(requests)
+            ],
+        )
+    return results
+
+
+# Result metrics checked against a saved baseline, and whether higher values
+# are better.
+BASELINE_METRICS = {
+    "per_second": True,
+    "p50_ms": False,
+    "p99_ms": False,
+    "peak_rss_bytes": False,
+}
+
+
+def compare_to_baseline(results: dict, baseline: dict, tolerance: float) -> list:
+    """Describe every metric more than ``tolerance`` worse than its baseline."""
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name, {})
+        for metric, higher_is_better in BASELINE_METRICS.items():
+            if metric not in result or not previous.get(metric):
+                continue
+            ratio = result[metric] / previous[metric]
+            if ratio < 1 - tolerance if higher_is_better else ratio > 1 + tolerance:
+                regressions.append(
+                    f"{name} {metric}: {previous[metric]:.4g} -> {result[metric]:.4g}"
+                )
+    return regressions
+
+
+SUITES = {
+    "extractor": bench_extractor,
+    "converters": bench_converters,
+    "workers": bench_workers,
+    "explain": bench_explain,
+    "serializers": bench_serializers,
+    "search": bench_search,
+    "e2e": bench_e2e,
+    "backend": bench_backend,
+}
@@ -0,0 +1,96 @@
+"""Serialized response cache for the order API.
+
+Detail entries are keyed by order_id. List entries are keyed by the
+normalized query string plus a list version that is bumped on every write,
+so a write invalidates every cached list page at once. Each entry stores the
+serialized data together with its ETag.
+"""
+
+import hashlib
+import json
+from dataclasses import dataclass
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework import status
+from rest_framework.response import Response
+
+LIST_VERSION_KEY = "orders:list-version"
+
+
+@dataclass
+class CachedResponse:
+    data: object
+    etag: str
+
+
+def cache_timeout() -> int:
+    return getattr(settings, "ORDERS_CACHE_TIMEOUT", 300)
+
+
+def detail_key(order_id: str) -> str:
+    return f"orders:detail:{order_id}"
+
+
+def list_key(request) -> str:
+    version = cache.get_or_set(LIST_VERSION_KEY, 1, timeout=None)
+    params = urlencode(sorted(request.query_params.lists()), doseq=True)
+    digest = hashlib.sha1(
+        f"{request.get_host()}{request.path}?{params}".encode()
+    ).hexdigest()
+    return f"orders:list:{version}:{digest}"
+
+
+def make_entry(data) -> CachedResponse:
+    payload = json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True)
+    return CachedResponse(
+        data=data, etag=f'"{hashlib.sha1(payload.encode()).hexdigest()}"'
+    )
+
+
+def cached_response(request, key: str, build_response) -> Response:
+    """Serve ``key`` from the cache, calling ``build_response`` on a miss.
+
+    Returns a 304 when the client's If-None-Match already has the ETag.
+    """
+    entry = cache.get(key)
+    if entry is None:
+        response = build_response()
+        if response.status_code != status.HTTP_200_OK:
+            return response
+        entry = make_entry(response.data)
+        cache.set(key, entry, timeout=cache_timeout())
+
+    if entry.etag in request.headers.get("If-None-Match", ""):
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = Response(entry.data)
+    response["ETag"] = entry.etag
+    return response
+
+
+async def acached_entry(key: str, build_data) -> CachedResponse | None:
+    """Async lookup of ``key``, awaiting ``build_data()`` on a miss.
+
+    Shares its entries with ``cached_response``. Nothing is cached when
+    ``build_data`` returns None, which is then returned as is.
+    """
+    entry = await cache.aget(key)
+    if entry is None:
+        data = await build_data()
+        if data is None:
+            return None
+        entry = make_entry(data)
+        await cache.aset(key, entry, timeout=cache_timeout())
+    return entry
+
+
+def invalidate_orders(order_ids) -> None:
+    """Drop the cached details of ``order_ids`` and every cached list page."""
+    cache.delete_many([detail_key(order_id) for order_id in order_ids])
+    try:
+        cache.incr(LIST_VERSION_KEY)
+    except ValueError:
+        cache.set(LIST_VERSION_KEY, 2, timeout=None)
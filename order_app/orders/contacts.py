@@ -0,0 +1,172 @@
+"""Deduplicated billing and delivery contacts of orders.
+
+The billing and delivery blocks of an order are stored as Customer and
+Address rows keyed by a digest of their values, so repeat customers share
+rows instead of repeating sixteen text columns per party on every order.
+Feeds, the API and exports keep using the flat ``billing_*``/``delivery_*``
+names, which Order exposes through ContactAttribute.
+"""
+
+import hashlib
+
+from django.db import transaction
+
+from orders.models import ContactAttribute, Order
+
+# Flat field name -> (Order foreign key, field of the related model), in the
+# order the fields were declared when they were Order columns.
+CONTACT_FIELDS = {
+    name: (value.relation, value.attribute)
+    for name, value in vars(Order).items()
+    if isinstance(value, ContactAttribute)
+}
+
+# Order foreign key -> Customer or Address.
+CONTACT_RELATIONS = {
+    relation: Order._meta.get_field(relation).related_model
+    for relation, _ in CONTACT_FIELDS.values()
+}
+
+
+def _order_field_names() -> list[str]:
+    names = []
+    for field in Order._meta.concrete_fields:
+        if field.name not in CONTACT_RELATIONS:
+            names.append(field.name)
+        elif field.name == next(iter(CONTACT_RELATIONS)):
+            names.extend(CONTACT_FIELDS)
+    return names
+
+
+# Order fields as the API and exports show them, in column order.
+ORDER_FIELD_NAMES = _order_field_names()
+
+
+def content_fields(model) -> list[str]:
+    return [
+        field.name for field in model._meta.concrete_fields if not field.primary_key
+    ]
+
+
+def contact_key(values: dict, fields) -> str:
+    """Digest of ``values`` over ``fields``, the primary key of a contact."""
+    digest = hashlib.blake2b(digest_size=16)
+    for field in fields:
+        digest.update(f"{values.get(field) or ''}\x1f".encode())
+    return digest.hexdigest()
+
+
+def build_contact(model, values: dict):
+    """Unsaved Customer or Address holding ``values``, keyed by their digest.
+
+    Also works on the historical models of migrations.
+    """
+    fields = content_fields(model)
+    values = {field: values.get(field) or "" for field in fields}
+    return model(content_hash=contact_key(values, fields), **values)
+
+
+def split_contacts(values: dict) -> tuple[dict, dict]:
+    """Split flat order ``values`` into the order's own fields and, per
+    contact foreign key, the values of the contact it points to."""
+    fields = {}
+    contacts: dict[str, dict] = {}
+    for name, value in values.items():
+        if name in CONTACT_FIELDS:
+            relation, attribute = CONTACT_FIELDS[name]
+            contacts.setdefault(relation, {})[attribute] = value
+        else:
+            fields[name] = value
+    return fields, contacts
+
+
+def order_lookups(names) -> list[str]:
+    """ORM lookups of the Order field ``names``, flat contact fields included."""
+    return [
+        "__".join(CONTACT_FIELDS[name]) if name in CONTACT_FIELDS else name
+        for name in names
+    ]
+
+
+def only_order_fields(queryset, names):
+    """Load only the columns behind the Order field ``names``, joining the
+    contact tables they live in. Names that are not fields are ignored."""
+    columns = {field.name for field in Order._meta.concrete_fields}
+    names = [name for name in names if name in CONTACT_FIELDS or name in columns]
+    relations = {CONTACT_FIELDS[name][0] for name in names if name in CONTACT_FIELDS}
+    return queryset.select_related(*relations).only(*order_lookups(names))
+
+
+class ContactCache:
+    """Keys of the Customer and Address rows known to be stored.
+
+    Repeat customers then cost no insert at all. Keys are only remembered
+    once the transaction that wrote them commits, and the cache is emptied
+    whenever it would grow past ``max_size`` keys.
+    """
+
+    def __init__(self, max_size=500_000):
+        self.max_size = max_size
+        self.known: set[tuple[type, str]] = set()
+
+    def save(self, contacts):
+        """Insert the ``contacts`` not known to be stored, with one bulk
+        insert per model."""
+        pending: dict[type, dict] = {}
+        for contact in contacts:
+            if (type(contact), contact.pk) not in self.known:
+                pending.setdefault(type(contact), {})[contact.pk] = contact
+        for model, objs in pending.items():
+            model.objects.bulk_create(objs.values(), ignore_conflicts=True)
+        keys = {(model, key) for model, objs in pending.items() for key in objs}
+        if keys:
+            transaction.on_commit(lambda: self.remember(keys))
+
+    def remember(self, keys):
+        if len(self.known) + len(keys) > self.max_size:
+            self.known.clear()
+        self.known.update(keys)
+
+    def clear(self):
+        self.known.clear()
+
+
+contact_cache = ContactCache()
+
+
+def build_order(values: dict, contacts: dict) -> Order:
+    """Unsaved Order for flat ``values``.
+
+    Its contacts are looked up in, or added to, ``contacts`` (keyed by model
+    and digest) so the orders of a batch share them; save them with
+    ``contact_cache.save(contacts.values())`` before the orders.
+    """
+    fields, blocks = split_contacts(values)
+    for relation, model in CONTACT_RELATIONS.items():
+        contact = build_contact(model, blocks.get(relation, {}))
+        fields[relation] = contacts.setdefault((model, contact.pk), contact)
+    return Order(**fields)
+
+
+def resolve_contacts(values: dict, instance: Order | None = None) -> dict:
+    """Replace the flat contact fields of ``values`` by stored contacts.
+
+    When updating ``instance``, contacts none of whose fields are given are
+    left alone and the others start from the instance's current values.
+    """
+    fields, blocks = split_contacts(values)
+    contacts = []
+    for relation, model in CONTACT_RELATIONS.items():
+        if instance is not None:
+            if relation not in blocks:
+                continue
+            current = getattr(instance, relation)
+            blocks[relation] = {
+                **{field: getattr(current, field) for field in content_fields(model)},
+                **blocks[relation],
+            }
+        contact = build_contact(model, blocks.get(relation, {}))
+        contacts.append(contact)
+        fields[relation] = contact
+    contact_cache.save(contacts)
+    return fields
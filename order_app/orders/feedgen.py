@@ -0,0 +1,234 @@
+"""Deterministic synthetic Lengow feeds, built on the fixture order layout.
+
+The same ``count``, ``seed`` and ``revision`` always produce the same bytes.
+Revision 0 is the initial state of the orders; each later revision moves
+about ``change_rate`` of them to shipped with a new tracking number, which
+is what an incremental re-fetch of the same feed sees.
+"""
+
+import random
+import re
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+FIXTURE = Path(__file__).resolve().parent / "fixtures" / "xml_full_orders_lengow.xml"
+
+ENCODING = "windows-1252"
+
+MARKETPLACES = ["amazon", "cdiscount", "fnac", "ebay", "rakuten", "manomano"]
+STATUSES = [("accept", "processing"), ("new", "new"), ("accept", "processing")]
+SHIPPED = ("shipped", "shipped")
+CARRIERS = ["Colissimo", "Chronopost", "UPS", "DHL", "Mondial Relay"]
+FIRST_NAMES = ["Camille", "Léa", "Hugo", "Louis", "Chloé", "Inès", "Jules", "Manon"]
+LAST_NAMES = ["Martin", "Bernard", "Dubois", "Durand", "Lefèvre", "Moreau", "Garnier"]
+CITIES = [
+    ("75011", "Paris"),
+    ("69003", "Lyon"),
+    ("13008", "Marseille"),
+    ("31000", "Toulouse"),
+    ("33000", "Bordeaux"),
+    ("59000", "Lille"),
+]
+PRODUCTS = [
+    ("T-Shirt col rond", "Vetements Femmes > Tee-shirts", Decimal("19.90")),
+    ("Jean slim", "Vetements Hommes > Jeans", Decimal("49.00")),
+    ("Sneakers cuir", "Chaussures > Baskets", Decimal("89.50")),
+    ("Sac a dos", "Bagagerie > Sacs", Decimal("35.00")),
+    ("Montre sport", "Accessoires > Montres", Decimal("129.00")),
+    ("Casquette", "Accessoires > Chapeaux", Decimal("15.00")),
+]
+# Products per order and their weights: most carts hold one or two lines.
+CART_SIZES = [1, 2, 3, 4, 6, 8]
+CART_WEIGHTS = [60, 22, 9, 5, 3, 1]
+
+FIRST_DAY = date(2022, 1, 1)
+
+
+# Tag path -> placeholder of the values filled in for each order.
+ORDER_FIELDS = {
+    "marketplace": "marketplace",
+    "idFlux": "id_flux",
+    "order_status/marketplace": "status_marketplace",
+    "order_status/lengow": "status_lengow",
+    "order_id": "order_id",
+    "order_mrid": "order_id",
+    "order_refid": "order_id",
+    "order_purchase_date": "purchase_date",
+    "order_purchase_heure": "purchase_time",
+    "order_amount": "amount",
+    "order_shipping": "shipping",
+    ".//payment_date": "purchase_date",
+    ".//payment_heure": "purchase_time",
+    ".//tracking_carrier": "carrier",
+    ".//tracking_number": "tracking_number",
+    ".//tracking_shipped_date": "shipped_date",
+    "order_items": "items",
+    ".//products": "products",
+}
+for prefix in ("billing", "delivery"):
+    ORDER_FIELDS.update(
+        {
+            f".//{prefix}_firstname": "first_name",
+            f".//{prefix}_lastname": "last_name",
+            f".//{prefix}_email": "email",
+            f".//{prefix}_address": "street",
+            f".//{prefix}_zipcode": "zipcode",
+            f".//{prefix}_city": "city",
+            f".//{prefix}_phone_mobile": "phone",
+            f".//{prefix}_phone_home": "empty",
+            f".//{prefix}_full_address": "full_address",
+        }
+    )
+
+PRODUCT_FIELDS = {
+    "sku": "sku",
+    "title": "title",
+    "category": "category",
+    "order_lineid": "line_id",
+    "quantity": "quantity",
+    "price": "price",
+    "price_unit": "price_unit",
+}
+
+
+def _template(element: ElementTree.Element, fields: dict) -> str:
+    """Serialize ``element`` as a str.format template over ``fields``."""
+    for path, name in fields.items():
+        element.find(path).text = f"\x00{name}\x00"
+    text = ElementTree.tostring(element, encoding="unicode")
+    text = text.replace("{", "{{").replace("}", "}}")
+    return re.sub("\x00(\\w+)\x00", r"{\1}", text)
+
+
+def load_templates() -> tuple[str, str, str]:
+    """Feed header up to the orders, and order and product templates built
+    from the fixture order."""
+    text = FIXTURE.read_text(encoding="utf-8")
+    header = text[: text.index("<order>")]
+    header = re.sub(r"\s*<count_by_(\w+)>.*?</count_by_\1>", "", header, flags=re.S)
+    order = ElementTree.fromstring(text).find(".//order")
+    products = order.find("./cart/products")
+    product = products.find("product")
+    products.remove(product)
+    return (
+        header,
+        _template(order, ORDER_FIELDS),
+        _template(product, PRODUCT_FIELDS),
+    )
+
+
+def changed_in(seed: int, index: int, revision: int, change_rate: float) -> int:
+    """Latest revision up to ``revision`` in which the order changed, or 0."""
+    for current in range(revision, 0, -1):
+        if random.Random(f"{seed}:{index}:{current}").random() < change_rate:
+            return current
+    return 0
+
+
+def order_values(
+    index: int, seed: int, revision: int, change_rate: float
+) -> tuple[dict, list[dict]]:
+    """Field values of an order and of its cart lines."""
+    rng = random.Random(seed * 1_000_003 + index)
+    order_id = (
+        f"{400 + seed % 600:03d}-{index // 10_000_000:07d}-{index % 10_000_000:07d}"
+    )
+    marketplace = rng.choice(MARKETPLACES)
+    purchased = datetime.combine(
+        FIRST_DAY + timedelta(days=rng.randint(0, 1095)), datetime.min.time()
+    ) + timedelta(seconds=rng.randint(0, 86399))
+    first_name = rng.choice(FIRST_NAMES)
+    last_name = rng.choice(LAST_NAMES)
+    zipcode, city = rng.choice(CITIES)
+    street = f"{rng.randint(1, 200)} rue {rng.choice(LAST_NAMES)}"
+
+    lines = []
+    amount = Decimal(0)
+    for line in range(rng.choices(CART_SIZES, CART_WEIGHTS)[0]):
+        title, category, price = rng.choice(PRODUCTS)
+        quantity = rng.choices([1, 2, 3], [85, 12, 3])[0]
+        lines.append(
+            {
+                "sku": f"SKU-{rng.randint(1, 5000):05d}",
+                "title": title,
+                "category": category,
+                "line_id": f"{order_id}-{line + 1}",
+                "quantity": quantity,
+                "price": price * quantity,
+                "price_unit": price,
+            }
+        )
+        amount += price * quantity
+    shipping = Decimal(rng.choice(["0.0", "4.9", "5.5", "9.9"]))
+
+    values = {
+        "order_id": order_id,
+        "marketplace": marketplace,
+        "id_flux": rng.randint(10000, 99999),
+        "status_marketplace": "",
+        "status_lengow": "",
+        "purchase_date": purchased.date().isoformat(),
+        "purchase_time": purchased.time().isoformat(),
+        "amount": amount + shipping,
+        "shipping": shipping,
+        "items": len(lines),
+        "first_name": first_name,
+        "last_name": last_name,
+        "email": f"{first_name.lower()}.{last_name.lower()}{index}"
+        f"@marketplace.{marketplace}.fr",
+        "street": street,
+        "zipcode": zipcode,
+        "city": city,
+        "phone": f"06{rng.randint(0, 99999999):08d}",
+        "empty": "",
+        "full_address": f"{street}   {zipcode} {city} FR",
+        "carrier": CARRIERS[index % len(CARRIERS)],
+        "tracking_number": "",
+        "shipped_date": "",
+    }
+    values["status_marketplace"], values["status_lengow"] = rng.choice(STATUSES)
+    change = changed_in(seed, index, revision, change_rate)
+    if change:
+        values["status_marketplace"], values["status_lengow"] = SHIPPED
+        values["tracking_number"] = f"TRK{index:010d}R{change}"
+        values["shipped_date"] = (purchased + timedelta(days=1 + change)).isoformat(" ")
+    return values, lines
+
+
+def _escaped(values: dict) -> dict:
+    return {name: escape(str(value)) for name, value in values.items()}
+
+
+def iter_feed(count: int, seed=0, revision=0, change_rate=0.1):
+    """Yield the encoded feed in chunks of a hundred orders."""
+    header, order_template, product_template = load_templates()
+    header = header.replace(
+        "<count_total>5</count_total>", f"<count_total>{count}</count_total>"
+    )
+    yield header.encode(ENCODING, errors="xmlcharrefreplace")
+    chunk = []
+    for index in range(count):
+        values, lines = order_values(index, seed, revision, change_rate)
+        values = _escaped(values)
+        values["products"] = "".join(
+            product_template.format_map(_escaped(line)) for line in lines
+        )
+        chunk.append(order_template.format_map(values))
+        if len(chunk) == 100:
+            yield "".join(chunk).encode(ENCODING, errors="xmlcharrefreplace")
+            chunk = []
+    chunk.append("</orders>\n</statistics>\n")
+    yield "".join(chunk).encode(ENCODING, errors="xmlcharrefreplace")
+
+
+def write_feed(path, count: int, seed=0, revision=0, change_rate=0.1) -> int:
+    """Write a feed to ``path`` and return its size in bytes."""
+    size = 0
+    with open(path, "wb") as file:
+        for chunk in iter_feed(count, seed, revision, change_rate):
+            file.write(chunk)
+            size += len(chunk)
+    return size
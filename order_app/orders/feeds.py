@@ -0,0 +1,232 @@
+"""Concurrent download of several Lengow feeds over a shared connection pool."""
+
+import gzip
+import hashlib
+import json
+import logging
+import mmap
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from pathlib import Path
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+# Bodies larger than this are spooled to a temporary file instead of memory.
+SPOOL_MAX_SIZE = 16 * 1024 * 1024
+
+
+@dataclass
+class Feed:
+    url: str
+    timeout: float | None = None
+
+
+@dataclass
+class FetchedFeed:
+    feed: Feed
+    body: tempfile.SpooledTemporaryFile | None = None
+    size: int = 0
+    error: str | None = None
+    not_modified: bool = False
+    duration: float = 0.0
+
+
+class FeedCache:
+    """On-disk copy of each feed body, gzip-compressed, with its validators.
+
+    Entries are keyed by URL and query parameters. The stored ETag and
+    Last-Modified values turn the next download into a conditional request.
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _paths(self, url: str, params) -> tuple[Path, Path]:
+        key = hashlib.sha256(
+            json.dumps([url, sorted((params or {}).items())]).encode()
+        ).hexdigest()[:32]
+        return self.directory / f"{key}.xml.gz", self.directory / f"{key}.json"
+
+    def metadata(self, url: str, params) -> dict | None:
+        body_path, meta_path = self._paths(url, params)
+        if not (body_path.exists() and meta_path.exists()):
+            return None
+        return json.loads(meta_path.read_text(encoding="utf-8"))
+
+    def conditional_headers(self, url: str, params) -> dict:
+        metadata = self.metadata(url, params) or {}
+        headers = {}
+        if metadata.get("etag"):
+            headers["If-None-Match"] = metadata["etag"]
+        if metadata.get("last_modified"):
+            headers["If-Modified-Since"] = metadata["last_modified"]
+        return headers
+
+    @contextmanager
+    def writer(self, url: str, params, response_headers):
+        """Yield a ``write(chunk)`` callable and a ``complete()`` callable.
+
+        The entry only replaces the previous one if ``complete()`` was called
+        before the block exits, so a partially read body is never cached.
+        """
+        body_path, meta_path = self._paths(url, params)
+        tmp_path = body_path.with_suffix(".tmp")
+        completed = []
+        try:
+            with gzip.open(tmp_path, "wb", compresslevel=5) as body:
+                yield body.write, lambda: completed.append(True)
+        finally:
+            if not completed:
+                tmp_path.unlink(missing_ok=True)
+        if not completed:
+            return
+        os.replace(tmp_path, body_path)
+        meta_path.write_text(
+            json.dumps(
+                {
+                    "url": url,
+                    "params": params,
+                    "etag": response_headers.get("ETag"),
+                    "last_modified": response_headers.get("Last-Modified"),
+                }
+            ),
+            encoding="utf-8",
+        )
+
+    @contextmanager
+    def read_chunks(self, url: str, params, chunk_size: int):
+        """Yield the decompressed body, read from a memory-mapped file."""
+        body_path, _ = self._paths(url, params)
+        with (
+            open(body_path, "rb") as file,
+            mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped,
+            gzip.GzipFile(fileobj=mapped) as body,
+        ):
+            yield iter(lambda: body.read(chunk_size), b"")
+
+
+def load_feeds(path: str) -> list[Feed]:
+    """Read feeds from a JSON list or from a file with one URL per line.
+
+    JSON entries are either URLs or ``{"url": ..., "timeout": ...}`` objects.
+    """
+    content = Path(path).read_text(encoding="utf-8")
+    if content.lstrip().startswith("["):
+        return [
+            Feed(entry) if isinstance(entry, str) else Feed(**entry)
+            for entry in json.loads(content)
+        ]
+    return [
+        Feed(line.strip())
+        for line in content.splitlines()
+        if line.strip() and not line.lstrip().startswith("#")
+    ]
+
+
+@contextmanager
+def cache_writer(cache: FeedCache | None, url: str, params, response_headers):
+    """``FeedCache.writer`` that does nothing when caching is disabled."""
+    if cache is None:
+        yield (lambda chunk: None), (lambda: None)
+        return
+    with cache.writer(url, params, response_headers) as callbacks:
+        yield callbacks
+
+
+def build_session(pool_size: int, retries: int, backoff: float) -> requests.Session:
+    """Session whose pooled connections are shared by every download thread."""
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=["GET"],
+    )
+    adapter = HTTPAdapter(
+        pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry
+    )
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["Accept-Encoding"] = "gzip, deflate"
+    return session
+
+
+def fetch_feed(
+    session, feed: Feed, params, timeout, chunk_size, cache=None, conditional=True
+) -> FetchedFeed:
+    body = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    size = 0
+    start = time.perf_counter()
+    headers = (
+        cache.conditional_headers(feed.url, params) if cache and conditional else {}
+    )
+    try:
+        with session.get(
+            feed.url,
+            params=params,
+            headers=headers,
+            stream=True,
+            timeout=feed.timeout or timeout,
+        ) as response:
+            if response.status_code == requests.codes.not_modified:
+                body.close()
+                return FetchedFeed(feed, not_modified=True)
+            response.raise_for_status()
+            with cache_writer(cache, feed.url, params, response.headers) as (
+                write_cache,
+                complete_cache,
+            ):
+                for chunk in response.iter_content(chunk_size=chunk_size):
+                    body.write(chunk)
+                    write_cache(chunk)
+                    size += len(chunk)
+                complete_cache()
+    except requests.RequestException as e:
+        body.close()
+        return FetchedFeed(feed, error=str(e))
+    body.seek(0)
+    return FetchedFeed(feed, body=body, size=size, duration=time.perf_counter() - start)
+
+
+def fetch_feeds(
+    feeds,
+    params,
+    timeout,
+    concurrency,
+    retries,
+    backoff,
+    chunk_size,
+    cache=None,
+    refetch=frozenset(),
+):
+    """Download ``feeds`` concurrently and yield each one as soon as it lands.
+
+    The feeds whose URL is in ``refetch`` are downloaded in full even when
+    ``cache`` holds validators for them.
+    """
+    session = build_session(concurrency, retries, backoff)
+    with session, ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [
+            executor.submit(
+                fetch_feed,
+                session,
+                feed,
+                params,
+                timeout,
+                chunk_size,
+                cache,
+                feed.url not in refetch,
+            )
+            for feed in feeds
+        ]
+        for future in as_completed(futures):
+            yield future.result()
@@ -0,0 +1,44 @@
+from datetime import date
+
+from rest_framework.exceptions import ValidationError
+
+# Query parameter -> ORM lookup. Every lookup is backed by an index on Order,
+# or on Customer for the billing email.
+ORDER_FILTERS = {
+    "marketplace": "marketplace",
+    "order_status_lengow": "order_status_lengow",
+    "billing_email": "billing_customer__email",
+    "order_purchase_date": "order_purchase_date",
+    "order_purchase_date_from": "order_purchase_date__gte",
+    "order_purchase_date_to": "order_purchase_date__lte",
+}
+
+# Filters of the daily sales rollups, which share the Order field names.
+ROLLUP_FILTERS = {
+    "marketplace": "marketplace",
+    "order_currency": "order_currency",
+    "order_purchase_date_from": "order_purchase_date__gte",
+    "order_purchase_date_to": "order_purchase_date__lte",
+}
+
+DATE_FILTERS = {
+    "order_purchase_date",
+    "order_purchase_date_from",
+    "order_purchase_date_to",
+}
+
+
+def filter_orders(queryset, params, filters=ORDER_FILTERS):
+    """Apply the supported order filters found in ``params`` to ``queryset``."""
+    lookups = {}
+    for param, lookup in filters.items():
+        value = params.get(param)
+        if not value:
+            continue
+        if param in DATE_FILTERS:
+            try:
+                value = date.fromisoformat(value)
+            except ValueError:
+                raise ValidationError({param: "Enter a valid date (YYYY-MM-DD)."})
+        lookups[lookup] = value
+    return queryset.filter(**lookups)
@@ -0,0 +1,633 @@
+import hashlib
+import json
+import resource
+import sys
+import time
+from dataclasses import asdict, dataclass
+from decimal import Decimal
+from typing import Any
+from xml.etree import ElementTree
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+
+from orders.archive import get_archive
+from orders.cache import invalidate_orders
+from orders.contacts import build_order, contact_cache
+from orders.models import IngestCheckpoint, Order, OrderLine, RejectedOrder
+from orders.rollups import ROLLUP_FIELDS, as_date, refresh_sales_rollups
+from orders.search import index_orders
+from orders.utils import (
+    datetime_converter,
+    get_str_from_element_and_xpath,
+    safe_decimal_conversion,
+)
+
+field_mappings = {
+    "marketplace": "marketplace",
+    "id_flux": "idFlux",
+    "order_status_marketplace": ".//marketplace",
+    "order_status_lengow": ".//lengow",
+    "order_id": "order_id",
+    "order_mrid": "order_mrid",
+    "order_refid": "order_refid",
+    "order_external_id": "order_external_id",
+    "order_currency": "order_currency",
+    "payment_checkout": ".//payment_checkout",
+    "payment_status": ".//payment_status",
+    "payment_type": ".//payment_type",
+    "invoice_number": ".//invoice_number",
+    "invoice_url": ".//invoice_url",
+    "billing_society": ".//billing_society",
+    "billing_civility": ".//billing_civility",
+    "billing_lastname": ".//billing_lastname",
+    "billing_firstname": ".//billing_firstname",
+    "billing_email": ".//billing_email",
+    "billing_address": "./billing_address/billing_address",
+    "billing_address_2": ".//billing_address_2",
+    "billing_address_complement": ".//billing_address_complement",
+    "billing_zipcode": ".//billing_zipcode",
+    "billing_city": ".//billing_city",
+    "billing_country": ".//billing_country",
+    "billing_country_iso": ".//billing_country_iso",
+    "billing_phone_home": ".//billing_phone_home",
+    "billing_phone_office": ".//billing_phone_office",
+    "billing_phone_mobile": ".//billing_phone_mobile",
+    "billing_full_address": ".//billing_full_address",
+    "delivery_society": ".//delivery_society",
+    "delivery_civility": ".//delivery_civility",
+    "delivery_lastname": ".//delivery_lastname",
+    "delivery_firstname": ".//delivery_firstname",
+    "delivery_email": ".//delivery_email",
+    "delivery_address": "./delivery_address/delivery_address",
+    "delivery_address_2": ".//delivery_address_2",
+    "delivery_address_complement": ".//delivery_address_complement",
+    "delivery_zipcode": ".//delivery_zipcode",
+    "delivery_city": ".//delivery_city",
+    "delivery_country": ".//delivery_country",
+    "delivery_country_iso": ".//delivery_country_iso",
+    "delivery_phone_home": ".//delivery_phone_home",
+    "delivery_phone_office": ".//delivery_phone_office",
+    "delivery_phone_mobile": ".//delivery_phone_mobile",
+    "delivery_full_address": ".//delivery_full_address",
+    "tracking_method": ".//tracking_method",
+    "tracking_carrier": ".//tracking_carrier",
+    "tracking_number": ".//tracking_number",
+    "tracking_url": ".//tracking_url",
+    "tracking_relay": ".//tracking_relay",
+    "order_comments": ".//order_comments",
+    "customer_id": ".//customer_id",
+}
+
+date_fields = {
+    "order_purchase_date": ("order_purchase_date", "%Y-%m-%d"),
+    "order_purchase_time": ("order_purchase_heure", "%H:%M:%S"),
+    "payment_date": (".//payment_date", "%Y-%m-%d"),
+    "payment_time": (".//payment_heure", "%H:%M:%S"),
+    "tracking_shipped_date": (".//tracking_shipped_date", "%Y-%m-%d %H:%M:%S"),
+}
+
+DECIMAL_ZERO = Decimal(0)
+
+decimal_fields = [
+    "order_amount",
+    "order_tax",
+    "order_shipping",
+    "order_commission",
+    "order_processing_fee",
+    "tracking_parcel_weight",
+]
+
+# Line items, read from each <cart><products><product> element.
+LINES_XPATH = "./cart/products/product"
+
+line_field_mappings = {
+    "order_lineid": "order_lineid",
+    "sku": "sku",
+    "ean": "ean",
+    "title": "title",
+    "brand": "brand",
+    "category": "category",
+    "status": "status",
+}
+
+line_decimal_fields = ["price", "price_unit"]
+
+# Extra boolean flag read from the tracking block.
+DELIVERING_BY_MARKETPLACE_XPATH = ".//tracking_deliveringByMarketPlace"
+
+# Fields that are not part of the order content itself.
+NON_CONTENT_FIELDS = {"content_hash"}
+
+# Key of the extracted values holding the order's source: its element, or
+# its serialized fragment when parsed by a worker. Not an Order field.
+SOURCE_FIELD = "source"
+
+ORDER_UPDATE_FIELDS = [
+    field.name for field in Order._meta.concrete_fields if not field.primary_key
+]
+
+
+@dataclass
+class IngestStats:
+    """Per-stage counters of a fetch_orders run.
+
+    Stage timings are exclusive: time spent downloading while the streaming
+    parser waits for bytes is not counted as parse time, and so on.
+    """
+
+    download_bytes: int = 0
+    download_seconds: float = 0.0
+    parse_seconds: float = 0.0
+    conversion_seconds: float = 0.0
+    db_seconds: float = 0.0
+    orders: int = 0
+    skipped: int = 0
+    rejected: int = 0
+    archived: int = 0
+    batches: int = 0
+    total_seconds: float = 0.0
+
+    @property
+    def orders_per_second(self) -> float:
+        processed = self.orders + self.skipped + self.archived
+        return processed / self.total_seconds if self.total_seconds else 0.0
+
+    @staticmethod
+    def peak_rss_bytes() -> int:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+        return peak if sys.platform == "darwin" else peak * 1024
+
+    def as_dict(self) -> dict:
+        return {
+            **asdict(self),
+            "orders_per_second": self.orders_per_second,
+            "peak_rss_bytes": self.peak_rss_bytes(),
+        }
+
+    def summary(self) -> str:
+        return (
+            f"Saved {self.orders} orders ({self.skipped} unchanged), "
+            f"{self.rejected} rejected, {self.archived} archived, in "
+            f"{self.batches} batches, {self.total_seconds:.3f}s total, "
+            f"{self.orders_per_second:.0f} orders/s: "
+            f"download {self.download_bytes} bytes {self.download_seconds:.3f}s, "
+            f"parse {self.parse_seconds:.3f}s, "
+            f"conversion {self.conversion_seconds:.3f}s, "
+            f"db {self.db_seconds:.3f}s, "
+            f"peak RSS {self.peak_rss_bytes() / 1024 / 1024:.1f} MiB"
+        )
+
+
+def timed_iter(iterable, stats: IngestStats, stage: str, nested=()):
+    """Yield from ``iterable``, adding the time spent producing items to
+    ``stats.<stage>_seconds`` minus the time recorded meanwhile by the
+    ``nested`` stages that ``iterable`` pulls from.
+    """
+    iterator = iter(iterable)
+    attribute = f"{stage}_seconds"
+    nested_attributes = [f"{name}_seconds" for name in nested]
+    while True:
+        start = time.perf_counter()
+        nested_before = sum(getattr(stats, name) for name in nested_attributes)
+        try:
+            item = next(iterator)
+        except StopIteration:
+            item = StopIteration
+        nested_spent = (
+            sum(getattr(stats, name) for name in nested_attributes) - nested_before
+        )
+        setattr(
+            stats,
+            attribute,
+            getattr(stats, attribute) + time.perf_counter() - start - nested_spent,
+        )
+        if item is StopIteration:
+            return
+        yield item
+
+
+def timed_chunks(chunks, stats: IngestStats):
+    """Count the bytes and the time spent downloading ``chunks``."""
+    for chunk in timed_iter(chunks, stats, "download"):
+        stats.download_bytes += len(chunk)
+        yield chunk
+
+
+@dataclass
+class OrderRejection:
+    """An order that could not be extracted or saved."""
+
+    order_id: str
+    reason: str
+    raw: str
+    stage: str = RejectedOrder.EXTRACTION
+
+
+@dataclass
+class BatchResult:
+    rows: int
+    duration: float
+    skipped: int = 0
+    rejected: int = 0
+    archived: int = 0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.duration if self.duration else 0.0
+
+
+def bulk_upsert_orders(order_values: list[dict], incremental=False) -> BatchResult:
+    """Insert or update orders and their lines in a single transaction.
+
+    Orders are keyed on order_id and their lines are replaced wholesale. The
+    batch's distinct contacts are inserted first, skipping those the contact
+    cache knows are stored. In incremental mode, orders whose content hash
+    matches the stored one are skipped.
+    """
+    start = time.perf_counter()
+    skipped = 0
+    if incremental:
+        changed = filter_changed_orders(order_values)
+        skipped = len(order_values) - len(changed)
+        order_values = changed
+
+    orders = []
+    lines = []
+    contacts = {}
+    for values in order_values:
+        order_fields = {
+            field: value
+            for field, value in values.items()
+            if field not in ("lines", SOURCE_FIELD)
+        }
+        orders.append(build_order(order_fields, contacts))
+        lines.extend(
+            OrderLine(order_id=values["order_id"], **line_values)
+            for line_values in values.get("lines", [])
+        )
+
+    if orders:
+        order_ids = [order.order_id for order in orders]
+        with transaction.atomic():
+            # The orders as stored before the write, and the days the batch
+            # touches before and after it, so orders moving to another day
+            # are removed from the old day's rollup.
+            previous = list(
+                Order.objects.filter(order_id__in=order_ids).values(*ROLLUP_FIELDS)
+            )
+            days = {as_date(order.order_purchase_date) for order in orders}
+            days.update(row["order_purchase_date"] for row in previous)
+            contact_cache.save(contacts.values())
+            copy = can_copy()
+            if copy:
+                copy_upsert_orders(orders)
+            else:
+                Order.objects.bulk_create(
+                    orders,
+                    update_conflicts=True,
+                    unique_fields=["order_id"],
+                    update_fields=ORDER_UPDATE_FIELDS,
+                )
+            OrderLine.objects.filter(order_id__in=order_ids).delete()
+            if copy:
+                copy_insert(OrderLine, lines)
+            else:
+                OrderLine.objects.bulk_create(lines)
+            index_orders(orders)
+            refresh_sales_rollups(days, previous, orders)
+            # Callers such as save_order_batch wrap this in their own
+            # transaction: drop cached copies only once it commits.
+            transaction.on_commit(lambda: invalidate_orders(order_ids))
+    return BatchResult(
+        rows=len(orders), duration=time.perf_counter() - start, skipped=skipped
+    )
+
+
+def can_copy() -> bool:
+    """Whether batches can be loaded with COPY (PostgreSQL through psycopg 3)."""
+    if connection.vendor != "postgresql":
+        return False
+    from django.db.backends.postgresql.psycopg_any import is_psycopg3
+
+    return is_psycopg3
+
+
+def _copy_rows(cursor, table: str, fields, objs):
+    quote = connection.ops.quote_name
+    columns = ", ".join(quote(field.column) for field in fields)
+    with cursor.copy(f"COPY {table} ({columns}) FROM STDIN") as copy:
+        for obj in objs:
+            copy.write_row(
+                [
+                    field.get_db_prep_save(getattr(obj, field.attname), connection)
+                    for field in fields
+                ]
+            )
+
+
+def copy_insert(model, objs):
+    """Insert ``objs`` with COPY, leaving the primary key to the database."""
+    fields = [field for field in model._meta.concrete_fields if not field.primary_key]
+    with connection.cursor() as cursor:
+        _copy_rows(
+            cursor, connection.ops.quote_name(model._meta.db_table), fields, objs
+        )
+
+
+def copy_upsert_orders(orders: list[Order]):
+    """Upsert orders on PostgreSQL by COPYing them into a staging table and
+    merging it with one INSERT ... ON CONFLICT.
+
+    Unlike a multi-row INSERT, COPY has no bind parameter limit, so the
+    whole batch goes in one round trip whatever its size.
+    """
+    quote = connection.ops.quote_name
+    table = quote(Order._meta.db_table)
+    fields = Order._meta.concrete_fields
+    columns = ", ".join(quote(field.column) for field in fields)
+    updates = ", ".join(
+        f"{quote(field.column)} = EXCLUDED.{quote(field.column)}"
+        for field in fields
+        if not field.primary_key
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE TEMPORARY TABLE IF NOT EXISTS order_ingest_staging "
+            f"(LIKE {table}) ON COMMIT DROP"
+        )
+        cursor.execute("TRUNCATE order_ingest_staging")
+        _copy_rows(cursor, "order_ingest_staging", fields, orders)
+        cursor.execute(
+            f"INSERT INTO {table} ({columns}) "
+            f"SELECT {columns} FROM order_ingest_staging "
+            f"ON CONFLICT ({quote(Order._meta.pk.column)}) DO UPDATE SET {updates}"
+        )
+
+
+def save_order_batch(
+    items: list,
+    incremental=False,
+    feed="",
+    checkpoint: IngestCheckpoint | None = None,
+    restore_archived=False,
+) -> BatchResult:
+    """Save a batch of ``(values, rejection)`` items in one transaction.
+
+    The batch is first written with a single bulk upsert. If the database
+    refuses it, each order is retried in its own savepoint so one bad order
+    only rejects itself. Rejections are stored as RejectedOrder rows and the
+    checkpoint, if any, advances past the batch in the same transaction.
+    Orders kept in the order archive are left there unless
+    ``restore_archived`` is set.
+    """
+    start = time.perf_counter()
+    order_values = [values for values, rejection in items if rejection is None]
+    rejections = [rejection for _, rejection in items if rejection is not None]
+    rows = skipped = archived = 0
+    with transaction.atomic():
+        if not restore_archived:
+            unarchived = filter_archived_orders(order_values)
+            archived = len(order_values) - len(unarchived)
+            order_values = unarchived
+        try:
+            result = bulk_upsert_orders(order_values, incremental)
+            rows, skipped = result.rows, result.skipped
+        except DatabaseError:
+            for values in order_values:
+                try:
+                    result = bulk_upsert_orders([values], incremental)
+                except DatabaseError as e:
+                    rejections.append(
+                        OrderRejection(
+                            order_id=values["order_id"],
+                            reason=str(e),
+                            raw=order_source(values),
+                            stage=RejectedOrder.DATABASE,
+                        )
+                    )
+                else:
+                    rows += result.rows
+                    skipped += result.skipped
+        RejectedOrder.objects.bulk_create(
+            RejectedOrder(
+                feed=feed,
+                order_id=rejection.order_id[:50],
+                stage=rejection.stage,
+                reason=rejection.reason,
+                raw=rejection.raw,
+            )
+            for rejection in rejections
+        )
+        if checkpoint is not None:
+            checkpoint.position += len(items)
+            checkpoint.save(update_fields=["position", "updated_at"])
+    return BatchResult(
+        rows=rows,
+        duration=time.perf_counter() - start,
+        skipped=skipped,
+        rejected=len(rejections),
+        archived=archived,
+    )
+
+
+def filter_archived_orders(order_values: list[dict]) -> list[dict]:
+    """Drop the orders kept in the order archive.
+
+    Archived orders that were restored into the database are kept, so that
+    their stored copy stays up to date.
+    """
+    archive = get_archive()
+    if archive is None:
+        return order_values
+    archived_ids = {
+        values["order_id"] for values in order_values if values["order_id"] in archive
+    }
+    if not archived_ids:
+        return order_values
+    archived_ids -= set(
+        Order.objects.filter(order_id__in=archived_ids).values_list(
+            "order_id", flat=True
+        )
+    )
+    return [values for values in order_values if values["order_id"] not in archived_ids]
+
+
+def filter_changed_orders(order_values: list[dict]) -> list[dict]:
+    """Drop the orders whose stored content hash is unchanged."""
+    stored_hashes = dict(
+        Order.objects.filter(
+            order_id__in=[values["order_id"] for values in order_values]
+        ).values_list("order_id", "content_hash")
+    )
+    return [
+        values
+        for values in order_values
+        if stored_hashes.get(values["order_id"]) != values["content_hash"]
+    ]
+
+
+def compute_content_hash(values: dict) -> str:
+    """Stable digest of the extracted order fields."""
+    digest = hashlib.sha256()
+    for field in sorted(values):
+        if field not in NON_CONTENT_FIELDS:
+            digest.update(f"{field}={values[field]}\x1f".encode())
+    return digest.hexdigest()
+
+
+class OrderFieldExtractor:
+    """Extract every Order field from an ``<order>`` element in a single pass.
+
+    Paths of the form ``tag`` (direct child) and ``.//tag`` (first descendant)
+    are resolved from tag indexes built by walking the subtree once. Any
+    other path (e.g. ``./billing_address/billing_address``) falls back to
+    ``Element.find``. Results match ``get_str_from_element_and_xpath``.
+    """
+
+    def __init__(self, field_mappings, date_fields, decimal_fields):
+        self.string_fields = [
+            (field, self._compile(xpath)) for field, xpath in field_mappings.items()
+        ]
+        self.date_fields = [
+            (
+                field,
+                self._compile(xpath),
+                datetime_converter(date_format),
+                "time" in field,
+            )
+            for field, (xpath, date_format) in date_fields.items()
+        ]
+        self.decimal_fields = [
+            (field, self._compile(field)) for field in decimal_fields
+        ]
+        self.delivering_by_marketplace = self._compile(DELIVERING_BY_MARKETPLACE_XPATH)
+        lookups = [lookup for _, lookup in self.string_fields]
+        lookups += [lookup for _, lookup, _, _ in self.date_fields]
+        lookups += [lookup for _, lookup in self.decimal_fields]
+        lookups.append(self.delivering_by_marketplace)
+        self.child_tags = {key for kind, key in lookups if kind == "child"}
+        self.descendant_tags = {key for kind, key in lookups if kind == "descendant"}
+
+    @staticmethod
+    def _compile(xpath: str) -> tuple[str, str]:
+        if xpath.startswith(".//") and _is_plain_tag(xpath[3:]):
+            return ("descendant", xpath[3:])
+        if _is_plain_tag(xpath):
+            return ("child", xpath)
+        return ("path", xpath)
+
+    def _index(self, element: ElementTree.Element):
+        children: dict[str, str] = {}
+        descendants: dict[str, str] = {}
+        child_tags = self.child_tags
+        descendant_tags = self.descendant_tags
+        for child in element:
+            tag = child.tag
+            if tag in child_tags and tag not in children:
+                children[tag] = child.text.strip() if child.text else ""
+        for node in element.iter():
+            tag = node.tag
+            if (
+                tag in descendant_tags
+                and tag not in descendants
+                and node is not element
+            ):
+                descendants[tag] = node.text.strip() if node.text else ""
+        return children, descendants
+
+    def extract(self, element: ElementTree.Element) -> dict[str, Any]:
+        children, descendants = self._index(element)
+
+        def text(lookup):
+            kind, key = lookup
+            if kind == "child":
+                return children.get(key, "")
+            if kind == "descendant":
+                return descendants.get(key, "")
+            found_element = element.find(key)
+            if found_element is None:
+                return ""
+            return found_element.text.strip() if found_element.text else ""
+
+        values: dict[str, Any] = {
+            field: text(lookup) for field, lookup in self.string_fields
+        }
+
+        current_timezone = timezone.get_current_timezone()
+        for field, lookup, convert, is_time in self.date_fields:
+            date_value = convert(text(lookup))
+            if date_value:
+                if is_time:
+                    values[field] = date_value.time()
+                else:
+                    values[field] = timezone.make_aware(date_value, current_timezone)
+
+        for field, lookup in self.decimal_fields:
+            values[field] = safe_decimal_conversion(text(lookup)) or DECIMAL_ZERO
+
+        values["tracking_delivering_by_marketplace"] = (
+            text(self.delivering_by_marketplace) == "1"
+        )
+        return values
+
+
+def _is_plain_tag(xpath: str) -> bool:
+    return bool(xpath) and not any(char in xpath for char in "/[]@*.")
+
+
+order_field_extractor = OrderFieldExtractor(field_mappings, date_fields, decimal_fields)
+
+
+def extract_order_values(order_elements):
+    """Yield ``(values, rejection)`` for each order element, in feed order."""
+    for order_elem in order_elements:
+        try:
+            values = order_field_extractor.extract(order_elem)
+            values["lines"] = extract_order_lines(order_elem)
+        except Exception as e:
+            yield (
+                None,
+                OrderRejection(
+                    order_id=get_str_from_element_and_xpath(order_elem, "order_id"),
+                    reason=str(e),
+                    raw=ElementTree.tostring(order_elem, encoding="unicode"),
+                ),
+            )
+            continue
+        values["content_hash"] = compute_content_hash(values)
+        values[SOURCE_FIELD] = order_elem
+        yield values, None
+
+
+def order_source(values: dict) -> str:
+    """XML fragment the order ``values`` were extracted from.
+
+    It is only serialized here, for the few orders that get rejected, and
+    falls back to the values as JSON when the source is unknown.
+    """
+    source = values.get(SOURCE_FIELD)
+    if source is None:
+        return json.dumps(values, cls=DjangoJSONEncoder)
+    if isinstance(source, bytes):
+        return source.decode(errors="replace")
+    return ElementTree.tostring(source, encoding="unicode")
+
+
+def extract_order_lines(order_elem: ElementTree.Element) -> list[dict[str, Any]]:
+    lines = []
+    for product_elem in order_elem.iterfind(LINES_XPATH):
+        line = {
+            field: get_str_from_element_and_xpath(product_elem, xpath)
+            for field, xpath in line_field_mappings.items()
+        }
+        for field in line_decimal_fields:
+            line[field] = safe_decimal_conversion(
+                get_str_from_element_and_xpath(product_elem, field)
+            )
+        quantity = get_str_from_element_and_xpath(product_elem, "quantity")
+        line["quantity"] = int(quantity) if quantity.isdigit() else 0
+        lines.append(line)
+    return lines
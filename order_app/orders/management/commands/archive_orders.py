@@ -0,0 +1,66 @@
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from orders.archive import OrderArchive, archive_orders
+from orders.models import Order
+
+
+class Command(BaseCommand):
+    help = (
+        "Move the orders purchased before a cutoff date out of the database "
+        "into compressed archive segments"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--before",
+            type=date.fromisoformat,
+            help="Archive the orders purchased before this date (YYYY-MM-DD)",
+        )
+        parser.add_argument(
+            "--older-than-days",
+            type=int,
+            default=getattr(settings, "ORDERS_ARCHIVE_AFTER_DAYS", 365),
+            help="Archive the orders purchased more than this many days ago, "
+            "when --before is not given",
+        )
+        parser.add_argument(
+            "--archive-dir",
+            default=getattr(settings, "ORDERS_ARCHIVE_DIR", None),
+            help="Directory of the archive segments and their index",
+        )
+        parser.add_argument(
+            "--segment-size",
+            type=int,
+            default=20000,
+            help="Maximum number of orders per segment",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only count the orders that would be archived",
+        )
+
+    def handle(self, *args, **options):
+        if not options["archive_dir"]:
+            raise CommandError("Set ORDERS_ARCHIVE_DIR or pass --archive-dir.")
+        before = options["before"] or timezone.localdate() - timedelta(
+            days=options["older_than_days"]
+        )
+        if options["dry_run"]:
+            count = Order.objects.filter(order_purchase_date__lt=before).count()
+            self.stdout.write(f"{count} orders purchased before {before}")
+            return
+
+        result = archive_orders(
+            OrderArchive(options["archive_dir"]),
+            before,
+            segment_size=options["segment_size"],
+        )
+        self.stdout.write(
+            f"Archived {result.orders} orders purchased before {before} "
+            f"into {result.segments} segments ({result.bytes} bytes)"
+        )
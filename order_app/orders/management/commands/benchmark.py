@@ -0,0 +1,90 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from orders.benchmarks import SUITES, compare_to_baseline
+
+# Optional result entries appended to a throughput row.
+EXTRA_COLUMNS = {
+    "p50_ms": lambda value: f"p50 {value:.2f}ms",
+    "p99_ms": lambda value: f"p99 {value:.2f}ms",
+    "peak_rss_bytes": lambda value: f"peak RSS {value / 1024 / 1024:.1f} MiB",
+    "errors": lambda value: f"{value} errors",
+}
+
+
+class Command(BaseCommand):
+    help = "Run an ingestion micro-benchmark suite and print its throughput"
+
+    def add_arguments(self, parser):
+        parser.add_argument("suite", choices=sorted(SUITES), help="Suite to run")
+        parser.add_argument(
+            "--orders",
+            type=int,
+            default=10000,
+            help="Number of orders processed by the suite",
+        )
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=200,
+            help="Number of requests per endpoint of the e2e suite",
+        )
+        parser.add_argument(
+            "--json", action="store_true", help="Print the raw results as JSON"
+        )
+        parser.add_argument(
+            "--save-baseline", help="Write the results to this JSON baseline file"
+        )
+        parser.add_argument(
+            "--baseline",
+            help="Fail if a throughput, latency or memory figure regressed "
+            "against this baseline file",
+        )
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.2,
+            help="Relative regression allowed against the baseline",
+        )
+
+    def handle(self, *args, **kwargs):
+        results = SUITES[kwargs["suite"]](kwargs)
+
+        if kwargs["json"]:
+            self.stdout.write(json.dumps(results, indent=2))
+        else:
+            self.write_table(results)
+
+        if kwargs["save_baseline"]:
+            with open(kwargs["save_baseline"], "w", encoding="utf-8") as file:
+                json.dump(results, file, indent=2)
+        if kwargs["baseline"]:
+            with open(kwargs["baseline"], encoding="utf-8") as file:
+                baseline = json.load(file)
+            regressions = compare_to_baseline(results, baseline, kwargs["tolerance"])
+            if regressions:
+                raise CommandError(
+                    "Regressions against the baseline:\n" + "\n".join(regressions)
+                )
+
+    def write_table(self, results):
+        for name, result in results.items():
+            if "per_second" in result:
+                unit = result.get("unit", "orders")
+                extras = [
+                    format_value(result[key])
+                    for key, format_value in EXTRA_COLUMNS.items()
+                    if result.get(key)
+                ]
+                self.stdout.write(
+                    f"{name:<24} {result['iterations']:>10} {unit} "
+                    f"{result['seconds']:>9.3f}s {result['per_second']:>12.0f} {unit}/s"
+                    + (f"  {', '.join(extras)}" if extras else "")
+                )
+                continue
+            self.stdout.write(name)
+            for key, value in result.items():
+                if isinstance(value, float):
+                    value = f"{value:.4f}"
+                self.stdout.write(f"    {key}: {value}")
@@ -1,153 +1,375 @@
-from decimal import Decimal
+import cProfile
+import itertools
+import json
 import logging
+import time
+from datetime import date
+from urllib.parse import urlencode
 from xml.etree import ElementTree
 import requests
 from django.core.management.base import BaseCommand
-from django.utils import timezone
-from orders.models import Order
-from orders.utils import (
-    get_str_from_element_and_xpath,
-    safe_datetime_conversion,
-    safe_decimal_conversion,
+from django.db import DatabaseError
+from django.conf import settings
+from orders.feeds import Feed, FeedCache, cache_writer, fetch_feeds, load_feeds
+from orders.ingestion import (
+    IngestStats,
+    extract_order_values,
+    save_order_batch,
+    timed_chunks,
+    timed_iter,
 )
+from orders.models import IngestCheckpoint
+from orders.utils import batched, iter_elements_from_chunks
+from orders.workers import extract_order_values_in_workers
 
 logger = logging.getLogger(__name__)
 
-field_mappings = {
-    "marketplace": "marketplace",
-    "id_flux": "idFlux",
-    "order_status_marketplace": ".//marketplace",
-    "order_status_lengow": ".//lengow",
-    "order_id": "order_id",
-    "order_mrid": "order_mrid",
-    "order_refid": "order_refid",
-    "order_external_id": "order_external_id",
-    "order_currency": "order_currency",
-    "payment_checkout": ".//payment_checkout",
-    "payment_status": ".//payment_status",
-    "payment_type": ".//payment_type",
-    "invoice_number": ".//invoice_number",
-    "invoice_url": ".//invoice_url",
-    "billing_society": ".//billing_society",
-    "billing_civility": ".//billing_civility",
-    "billing_lastname": ".//billing_lastname",
-    "billing_firstname": ".//billing_firstname",
-    "billing_email": ".//billing_email",
-    "billing_address": "./billing_address/billing_address",
-    "billing_address_2": ".//billing_address_2",
-    "billing_address_complement": ".//billing_address_complement",
-    "billing_zipcode": ".//billing_zipcode",
-    "billing_city": ".//billing_city",
-    "billing_country": ".//billing_country",
-    "billing_country_iso": ".//billing_country_iso",
-    "billing_phone_home": ".//billing_phone_home",
-    "billing_phone_office": ".//billing_phone_office",
-    "billing_phone_mobile": ".//billing_phone_mobile",
-    "billing_full_address": ".//billing_full_address",
-    "delivery_society": ".//delivery_society",
-    "delivery_civility": ".//delivery_civility",
-    "delivery_lastname": ".//delivery_lastname",
-    "delivery_firstname": ".//delivery_firstname",
-    "delivery_email": ".//delivery_email",
-    "delivery_address": "./delivery_address/delivery_address",
-    "delivery_address_2": ".//delivery_address_2",
-    "delivery_address_complement": ".//delivery_address_complement",
-    "delivery_zipcode": ".//delivery_zipcode",
-    "delivery_city": ".//delivery_city",
-    "delivery_country": ".//delivery_country",
-    "delivery_country_iso": ".//delivery_country_iso",
-    "delivery_phone_home": ".//delivery_phone_home",
-    "delivery_phone_office": ".//delivery_phone_office",
-    "delivery_phone_mobile": ".//delivery_phone_mobile",
-    "delivery_full_address": ".//delivery_full_address",
-    "tracking_method": ".//tracking_method",
-    "tracking_carrier": ".//tracking_carrier",
-    "tracking_number": ".//tracking_number",
-    "tracking_url": ".//tracking_url",
-    "tracking_relay": ".//tracking_relay",
-    "order_comments": ".//order_comments",
-    "customer_id": ".//customer_id",
-}
-
-date_fields = {
-    "order_purchase_date": ("order_purchase_date", "%Y-%m-%d"),
-    "order_purchase_time": ("order_purchase_heure", "%H:%M:%S"),
-    "payment_date": (".//payment_date", "%Y-%m-%d"),
-    "payment_time": (".//payment_heure", "%H:%M:%S"),
-    "tracking_shipped_date": (".//tracking_shipped_date", "%Y-%m-%d %H:%M:%S"),
-}
-
-decimal_fields = [
-    "order_amount",
-    "order_tax",
-    "order_shipping",
-    "order_commission",
-    "order_processing_fee",
-    "tracking_parcel_weight",
-]
+DEFAULT_URL = "http://test.lengow.io/orders-test.xml"
 
 
 class Command(BaseCommand):
     help = "Fetch orders from the Lengow XML feed and save them to the database"
 
     def add_arguments(self, parser):
-        parser.add_argument("url", type=str, help="URL of the remote XML feed")
+        parser.add_argument("url", nargs="*", help="URLs of the remote XML feeds")
+        parser.add_argument(
+            "--feeds-file",
+            help="File listing feed URLs, one per line or as a JSON list",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=8,
+            help="Number of feeds downloaded at the same time",
+        )
+        parser.add_argument(
+            "--timeout",
+            type=float,
+            default=60,
+            help="Timeout in seconds of each feed request",
+        )
+        parser.add_argument(
+            "--retries",
+            type=int,
+            default=3,
+            help="Number of retries of a failed feed request (multi-feed mode)",
+        )
+        parser.add_argument(
+            "--backoff",
+            type=float,
+            default=0.5,
+            help="Backoff factor in seconds between retries (multi-feed mode)",
+        )
+        parser.add_argument(
+            "--cache-dir",
+            default=getattr(settings, "ORDERS_FEED_CACHE_DIR", None),
+            help="Directory keeping a compressed copy and the validators of "
+            "each feed, used for conditional requests",
+        )
+        parser.add_argument(
+            "--from-cache",
+            action="store_true",
+            help="Re-ingest the cached copy of the feeds without any network access",
+        )
+        parser.add_argument(
+            "--stream",
+            action="store_true",
+            help="Parse the feed incrementally while it downloads",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=64 * 1024,
+            help="Size in bytes of the chunks read from the feed in stream mode",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of orders written to the database per transaction",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Number of processes used to parse orders",
+        )
+        parser.add_argument(
+            "--incremental",
+            action="store_true",
+            help="Skip database writes for orders whose content did not change",
+        )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="Skip the orders already committed by an interrupted run of "
+            "the same feed",
+        )
+        parser.add_argument(
+            "--restore-archived",
+            action="store_true",
+            help="Store again the archived orders the feeds contain, instead "
+            "of leaving them in the archive",
+        )
+        parser.add_argument(
+            "--date-from",
+            type=date.fromisoformat,
+            help="Only fetch orders updated from this date (YYYY-MM-DD)",
+        )
+        parser.add_argument(
+            "--date-to",
+            type=date.fromisoformat,
+            help="Only fetch orders updated up to this date (YYYY-MM-DD)",
+        )
+        parser.add_argument(
+            "--stats-json",
+            help="Write the per-stage statistics of the run to this JSON file",
+        )
+        parser.add_argument(
+            "--profile",
+            help="Write a cProfile dump of the run to this file (read it with pstats)",
+        )
 
     def handle(self, *args, **kwargs):
-        url = (
-            kwargs["url"] if kwargs["url"] else "http://test.lengow.io/orders-test.xml"
-        )
+        self.stats = IngestStats()
+        profiler = cProfile.Profile() if kwargs["profile"] else None
+        start = time.perf_counter()
+        if profiler:
+            profiler.enable()
+        try:
+            self.run(kwargs)
+        finally:
+            if profiler:
+                profiler.disable()
+                profiler.dump_stats(kwargs["profile"])
+            self.stats.total_seconds = time.perf_counter() - start
+
+        logger.info(self.stats.summary())
+        if kwargs["stats_json"]:
+            with open(kwargs["stats_json"], "w", encoding="utf-8") as file:
+                json.dump(self.stats.as_dict(), file, indent=2)
+
+    def run(self, kwargs):
+        feeds = [Feed(url) for url in kwargs["url"]]
+        if kwargs["feeds_file"]:
+            feeds += load_feeds(kwargs["feeds_file"])
+        if not feeds:
+            feeds = [Feed(DEFAULT_URL)]
+        params = {
+            param: kwargs[param].isoformat()
+            for param in ("date_from", "date_to")
+            if kwargs[param]
+        }
+
+        cache = FeedCache(kwargs["cache_dir"]) if kwargs["cache_dir"] else None
+
+        if kwargs["from_cache"]:
+            if cache is None:
+                logger.error("--from-cache requires --cache-dir")
+                return
+            for feed in feeds:
+                self.replay_feed(cache, feed, params, kwargs)
+        elif len(feeds) == 1:
+            self.fetch_feed(feeds[0], params, cache, kwargs)
+        else:
+            self.fetch_feeds(feeds, params, cache, kwargs)
 
+    def replay_feed(self, cache, feed, params, options):
+        if cache.metadata(feed.url, params) is None:
+            logger.error(f"No cached copy of {feed.url}")
+            return
+        logger.info(f"Replaying cached copy of {feed.url}")
+        with cache.read_chunks(feed.url, params, options["chunk_size"]) as chunks:
+            self.ingest(
+                iter_elements_from_chunks(timed_chunks(chunks, self.stats), "order"),
+                options,
+                checkpoint_key(feed.url, params),
+            )
+
+    def fetch_feed(self, feed, params, cache, options):
+        stream = options["stream"]
+        start = time.perf_counter()
         try:
-            response = requests.get(url)
+            response = requests.get(
+                feed.url,
+                params=params,
+                headers=conditional_headers(cache, feed.url, params),
+                stream=stream,
+                timeout=feed.timeout or options["timeout"],
+            )
             response.raise_for_status()  # Raise an error for bad HTTP status codes
         except requests.RequestException as e:
             logger.error(f"Failed to fetch data: {e}")
             return
 
-        xml_data = response.content
-        logger.info("Successfully fetched XML data")
-        root = ElementTree.fromstring(xml_data)
+        if response.status_code == requests.codes.not_modified:
+            logger.info(f"Feed {feed.url} not modified since the last fetch")
+            response.close()
+            return
+
+        with (
+            response,
+            cache_writer(cache, feed.url, params, response.headers) as (
+                write_cache,
+                complete_cache,
+            ),
+        ):
+            if stream:
+                logger.info("Streaming XML data")
+
+                self.stats.download_seconds += time.perf_counter() - start
+
+                def chunks():
+                    for chunk in timed_chunks(
+                        response.iter_content(chunk_size=options["chunk_size"]),
+                        self.stats,
+                    ):
+                        write_cache(chunk)
+                        yield chunk
+                    complete_cache()
+
+                order_elements = iter_elements_from_chunks(chunks(), "order")
+            else:
+                xml_data = response.content
+                self.stats.download_bytes += len(xml_data)
+                self.stats.download_seconds += time.perf_counter() - start
+                logger.info("Successfully fetched XML data")
+                write_cache(xml_data)
+                complete_cache()
+                parse_start = time.perf_counter()
+                root = ElementTree.fromstring(xml_data)
+                self.stats.parse_seconds += time.perf_counter() - parse_start
+                order_elements = root.iterfind(".//order")
+
+            self.ingest(order_elements, options, checkpoint_key(feed.url, params))
+
+    def fetch_feeds(self, feeds, params, cache, options):
+        """Download every feed concurrently, ingesting each as it arrives."""
+        chunk_size = options["chunk_size"]
+        for fetched in fetch_feeds(
+            feeds,
+            params,
+            timeout=options["timeout"],
+            concurrency=options["concurrency"],
+            retries=options["retries"],
+            backoff=options["backoff"],
+            chunk_size=chunk_size,
+            cache=cache,
+            refetch={
+                feed.url
+                for feed in feeds
+                if interrupted(checkpoint_key(feed.url, params))
+            },
+        ):
+            if fetched.error is not None:
+                logger.error(f"Failed to fetch {fetched.feed.url}: {fetched.error}")
+                continue
+            if fetched.not_modified:
+                logger.info(
+                    f"Feed {fetched.feed.url} not modified since the last fetch"
+                )
+                continue
+            # Downloads overlap, so this is the sum of the per-feed durations.
+            self.stats.download_bytes += fetched.size
+            self.stats.download_seconds += fetched.duration
+            logger.info(
+                f"Fetched {fetched.size} bytes from {fetched.feed.url} "
+                f"in {fetched.duration:.3f}s"
+            )
+            with fetched.body as body:
+                self.ingest(
+                    iter_elements_from_chunks(
+                        iter(lambda: body.read(chunk_size), b""), "order"
+                    ),
+                    options,
+                    checkpoint_key(fetched.feed.url, params),
+                )
+
+    def ingest(self, order_elements, options, feed):
+        """Save the orders of ``feed`` batch by batch.
 
-        for order_elem in root.findall(".//order"):
+        Each committed batch advances the feed's checkpoint; with --resume
+        the orders before the checkpoint are parsed but not processed again.
+        The checkpoint is dropped once the whole feed is ingested.
+        """
+        stats = self.stats
+        checkpoint, _ = IngestCheckpoint.objects.get_or_create(feed=feed)
+        if options["resume"] and checkpoint.position:
+            logger.info(f"Resuming {feed} after {checkpoint.position} orders")
+            order_elements = itertools.islice(order_elements, checkpoint.position, None)
+        elif checkpoint.position:
+            checkpoint.position = 0
+            checkpoint.save(update_fields=["position", "updated_at"])
+
+        order_elements = timed_iter(
+            order_elements, stats, "parse", nested=("download",)
+        )
+        if options["workers"] > 1:
+            order_values = extract_order_values_in_workers(
+                order_elements, options["workers"]
+            )
+        else:
+            order_values = extract_order_values(order_elements)
+        order_values = timed_iter(
+            order_values, stats, "conversion", nested=("download", "parse")
+        )
+
+        for batch in batched(iter_orders(order_values), options["batch_size"]):
+            batch_number = stats.batches + 1
             try:
-                order = Order()
-
-                for field, xpath in field_mappings.items():
-                    setattr(
-                        order, field, get_str_from_element_and_xpath(order_elem, xpath)
-                    )
-
-                for field, (xpath, date_format) in date_fields.items():
-                    date_value = safe_datetime_conversion(
-                        get_str_from_element_and_xpath(order_elem, xpath), date_format
-                    )
-                    if date_value:
-                        if "time" in field:
-                            setattr(order, field, date_value.time())
-                        else:
-                            setattr(order, field, timezone.make_aware(date_value))
-
-                for field in decimal_fields:
-                    setattr(
-                        order,
-                        field,
-                        safe_decimal_conversion(
-                            get_str_from_element_and_xpath(order_elem, field)
-                        )
-                        or Decimal(0.0),
-                    )
-
-                order.tracking_delivering_by_marketplace = (
-                    get_str_from_element_and_xpath(
-                        order_elem, ".//tracking_deliveringByMarketPlace"
-                    )
-                    == "1"
+                result = save_order_batch(
+                    batch,
+                    options["incremental"],
+                    feed,
+                    checkpoint,
+                    options["restore_archived"],
+                )
+            except DatabaseError as e:
+                logger.error(
+                    f"Failed to save batch {batch_number}: {e}. Run again with "
+                    f"--resume to continue after order {checkpoint.position}"
                 )
+                return
+            stats.batches = batch_number
+            stats.orders += result.rows
+            stats.skipped += result.skipped
+            stats.rejected += result.rejected
+            stats.archived += result.archived
+            stats.db_seconds += result.duration
+            logger.info(
+                f"Wrote batch {batch_number}: {result.rows} orders "
+                f"({result.skipped} unchanged), {result.rejected} rejected, "
+                f"{result.archived} archived, "
+                f"in {result.duration:.3f}s ({result.rows_per_second:.0f} orders/s)"
+            )
+        checkpoint.delete()
+
+
+def checkpoint_key(url: str, params: dict) -> str:
+    return f"{url}?{urlencode(sorted(params.items()))}" if params else url
+
+
+def interrupted(feed: str) -> bool:
+    """Whether the last ingest of ``feed`` stopped before its end.
+
+    The feed cache is written as the body downloads, so its validators would
+    turn the next request into a 304 and leave nothing to --resume.
+    """
+    return IngestCheckpoint.objects.filter(feed=feed).exists()
+
+
+def conditional_headers(cache: FeedCache | None, url: str, params: dict) -> dict:
+    if cache is None or interrupted(checkpoint_key(url, params)):
+        return {}
+    return cache.conditional_headers(url, params)
 
-                order.save()
-                logger.info(f"Successfully created order {order.order_id}")
 
-            except Exception as e:
-                logger.error(f"Failed to process order: {e}")
-                break
+def iter_orders(order_values):
+    for values, rejection in order_values:
+        if rejection is not None:
+            logger.error(
+                "Failed to process order %s: %s", rejection.order_id, rejection.reason
+            )
+        else:
+            logger.debug("Successfully parsed order %s", values["order_id"])
+        yield values, rejection
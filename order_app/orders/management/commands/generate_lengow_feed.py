@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from orders.feedgen import write_feed
+
+
+class Command(BaseCommand):
+    help = "Generate a deterministic synthetic Lengow XML feed"
+
+    def add_arguments(self, parser):
+        parser.add_argument("output", help="Path of the XML file to write")
+        parser.add_argument(
+            "--orders", type=int, default=10000, help="Number of orders in the feed"
+        )
+        parser.add_argument(
+            "--seed", type=int, default=0, help="Seed of the generated orders"
+        )
+        parser.add_argument(
+            "--revision",
+            type=int,
+            default=0,
+            help="Revision of the feed; each one ships a share of the orders",
+        )
+        parser.add_argument(
+            "--change-rate",
+            type=float,
+            default=0.1,
+            help="Share of the orders changed by each revision",
+        )
+
+    def handle(self, *args, **kwargs):
+        start = time.perf_counter()
+        size = write_feed(
+            kwargs["output"],
+            kwargs["orders"],
+            seed=kwargs["seed"],
+            revision=kwargs["revision"],
+            change_rate=kwargs["change_rate"],
+        )
+        self.stdout.write(
+            f"Wrote {kwargs['orders']} orders ({size} bytes) to {kwargs['output']} "
+            f"in {time.perf_counter() - start:.3f}s"
+        )
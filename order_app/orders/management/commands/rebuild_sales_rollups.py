@@ -0,0 +1,20 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from orders.archive import get_archive
+from orders.rollups import rebuild_sales_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the daily sales rollups from every order in the database, "
+        "keeping those of the archived days"
+    )
+
+    def handle(self, *args, **kwargs):
+        archive = get_archive()
+        archived_until = archive.archived_until() if archive is not None else None
+        since = archived_until + timedelta(days=1) if archived_until else None
+        count = rebuild_sales_rollups(since=since)
+        self.stdout.write(f"Rebuilt {count} daily sales rollups")
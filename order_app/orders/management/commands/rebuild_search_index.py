@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from orders.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the search documents of every order in the database"
+
+    def handle(self, *args, **kwargs):
+        count = rebuild_search_index()
+        self.stdout.write(f"Indexed {count} orders")
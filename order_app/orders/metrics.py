@@ -0,0 +1,235 @@
+"""Per-view latency, SQL and response size metrics for the order API.
+
+Metrics are kept in process memory and rendered in the Prometheus text
+exposition format by ``OrderMetricsView``. Each worker process exposes its
+own counters.
+"""
+
+import threading
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.signals import request_started
+from django.db import connection, connections
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+    def cumulative_counts(self):
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            yield bound, total
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.requests = defaultdict(int)
+        self.latency = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+        self.queries = defaultdict(lambda: Histogram(QUERY_COUNT_BUCKETS))
+        self.query_seconds = defaultdict(float)
+        self.response_bytes = defaultdict(int)
+
+    def record(self, view, method, status, duration, queries, query_seconds, size):
+        key = (view, method)
+        with self.lock:
+            self.requests[(view, method, str(status))] += 1
+            self.latency[key].observe(duration)
+            self.queries[key].observe(queries)
+            self.query_seconds[key] += query_seconds
+            self.response_bytes[key] += size
+
+    def render(self) -> str:
+        with self.lock:
+            lines = []
+            lines += _counter(
+                "orders_http_requests_total",
+                "Requests handled, by view, method and status.",
+                {
+                    (("view", view), ("method", method), ("status", status)): value
+                    for (view, method, status), value in self.requests.items()
+                },
+            )
+            lines += _histogram(
+                "orders_http_request_duration_seconds",
+                "Request latency in seconds.",
+                self.latency,
+            )
+            lines += _histogram(
+                "orders_db_queries_per_request",
+                "SQL queries executed per request.",
+                self.queries,
+            )
+            lines += _counter(
+                "orders_db_query_duration_seconds_total",
+                "Time spent executing SQL queries.",
+                {_labels(key): value for key, value in self.query_seconds.items()},
+            )
+            lines += _counter(
+                "orders_http_response_size_bytes_total",
+                "Bytes of serialized response bodies (streamed bodies excluded).",
+                {_labels(key): value for key, value in self.response_bytes.items()},
+            )
+        return "\n".join(lines) + "\n"
+
+
+def _labels(key):
+    view, method = key
+    return (("view", view), ("method", method))
+
+
+def _format_labels(labels) -> str:
+    return ",".join(f'{name}="{value}"' for name, value in labels)
+
+
+def _counter(name, help_text, samples):
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+    for labels, value in samples.items():
+        lines.append(f"{name}{{{_format_labels(labels)}}} {value}")
+    return lines
+
+
+def _histogram(name, help_text, histograms):
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for key, histogram in histograms.items():
+        labels = _format_labels(_labels(key))
+        for bound, count in histogram.cumulative_counts():
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {count}')
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+        lines.append(f"{name}_sum{{{labels}}} {histogram.sum}")
+        lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+    return lines
+
+
+registry = MetricsRegistry()
+
+
+class QueryTimer:
+    """Database execute wrapper counting the queries and their duration."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - start
+
+
+# Timer of the ASGI request being handled. sync_to_async copies the context
+# into the thread that runs the request's queries, so timed_execute finds it.
+current_timer: ContextVar[QueryTimer | None] = ContextVar(
+    "orders_query_timer", default=None
+)
+
+
+def timed_execute(execute, sql, params, many, context):
+    """Execute wrapper of every connection, timing the current ASGI request."""
+    timer = current_timer.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    return timer(execute, sql, params, many, context)
+
+
+def install_timed_execute(**kwargs):
+    """``request_started`` receiver adding timed_execute to the connections
+    of the thread the request's sync code and queries run in."""
+    for conn in connections.all():
+        if timed_execute not in conn.execute_wrappers:
+            conn.execute_wrappers.append(timed_execute)
+
+
+class OrderMetricsMiddleware:
+    """Record latency, SQL queries and response size of the orders routes.
+
+    Disabled unless ``ORDERS_METRICS_ENABLED`` is set: when it is not, Django
+    drops the middleware at startup and it costs nothing. Under ASGI the
+    middleware runs async so async views are not pushed to a thread. Their
+    queries run on another thread's connection, so they are timed through
+    ``current_timer`` by the execute wrapper installed on request start.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, "ORDERS_METRICS_ENABLED", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.prefix = getattr(settings, "ORDERS_METRICS_PATH_PREFIX", "/orders/")
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+            request_started.connect(
+                install_timed_execute, dispatch_uid="orders_metrics_timed_execute"
+            )
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not request.path.startswith(self.prefix):
+            return self.get_response(request)
+
+        timer = QueryTimer()
+        start = time.perf_counter()
+        with connection.execute_wrapper(timer):
+            response = self.get_response(request)
+        self.record(request, response, time.perf_counter() - start, timer)
+        return response
+
+    async def __acall__(self, request):
+        if not request.path.startswith(self.prefix):
+            return await self.get_response(request)
+
+        timer = QueryTimer()
+        token = current_timer.set(timer)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_timer.reset(token)
+        self.record(request, response, time.perf_counter() - start, timer)
+        return response
+
+    def record(self, request, response, duration, timer):
+        match = request.resolver_match
+        view = match.view_name if match else "unresolved"
+        if view != "order_metrics":
+            size = 0 if response.streaming else len(response.content)
+            registry.record(
+                view,
+                request.method,
+                response.status_code,
+                duration,
+                timer.count,
+                timer.seconds,
+                size,
+            )
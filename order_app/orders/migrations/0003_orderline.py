@@ -0,0 +1,55 @@
+# Generated by Django 5.1.6 on 2026-10-18 17:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("orders", "0002_order_content_hash"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OrderLine",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("order_lineid", models.CharField(blank=True, max_length=50)),
+                ("sku", models.CharField(blank=True, max_length=100)),
+                ("ean", models.CharField(blank=True, max_length=50)),
+                ("title", models.CharField(blank=True, max_length=255)),
+                ("brand", models.CharField(blank=True, max_length=100)),
+                ("category", models.CharField(blank=True, max_length=255)),
+                ("quantity", models.PositiveIntegerField(default=0)),
+                (
+                    "price",
+                    models.DecimalField(
+                        blank=True, decimal_places=2, max_digits=10, null=True
+                    ),
+                ),
+                (
+                    "price_unit",
+                    models.DecimalField(
+                        blank=True, decimal_places=2, max_digits=10, null=True
+                    ),
+                ),
+                ("status", models.CharField(blank=True, max_length=50)),
+                (
+                    "order",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="lines",
+                        to="orders.order",
+                    ),
+                ),
+            ],
+        ),
+    ]
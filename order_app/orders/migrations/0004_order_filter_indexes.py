@@ -0,0 +1,39 @@
+# Generated by Django 5.1.6 on 2026-10-18 17:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("orders", "0003_orderline"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["marketplace", "order_purchase_date"],
+                name="order_marketplace_date_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["order_status_lengow", "order_purchase_date"],
+                name="order_status_date_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["order_purchase_date", "order_id"],
+                name="order_purchase_date_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                fields=["billing_email"], name="order_billing_email_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,100 @@
+# Generated by Django 5.1.6 on 2026-10-18 17:18
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, Sum, Value
+from django.db.models.functions import Coalesce
+
+from orders.utils import batched
+
+# Frozen copy of orders.rollups.aggregate_orders as of this migration.
+ROLLUP_KEY = ["marketplace", "order_currency", "order_purchase_date"]
+
+ROLLUP_SUMS = [
+    "order_amount",
+    "order_tax",
+    "order_shipping",
+    "order_commission",
+    "order_processing_fee",
+]
+
+
+def backfill_rollups(apps, schema_editor):
+    Order = apps.get_model("orders", "Order")
+    DailySalesRollup = apps.get_model("orders", "DailySalesRollup")
+    zero = Value(Decimal(0), output_field=DecimalField(max_digits=16, decimal_places=2))
+    rows = (
+        Order.objects.exclude(order_purchase_date__isnull=True)
+        .order_by()
+        .values(*ROLLUP_KEY)
+        .annotate(
+            order_count=Count("order_id"),
+            **{field: Coalesce(Sum(field), zero) for field in ROLLUP_SUMS},
+        )
+        .iterator(chunk_size=1000)
+    )
+    for batch in batched(rows, 1000):
+        DailySalesRollup.objects.bulk_create(DailySalesRollup(**row) for row in batch)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("orders", "0004_order_filter_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailySalesRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("marketplace", models.CharField(max_length=50)),
+                ("order_currency", models.CharField(max_length=10)),
+                ("order_purchase_date", models.DateField()),
+                ("order_count", models.PositiveIntegerField(default=0)),
+                (
+                    "order_amount",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=16),
+                ),
+                (
+                    "order_tax",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=16),
+                ),
+                (
+                    "order_shipping",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=16),
+                ),
+                (
+                    "order_commission",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=16),
+                ),
+                (
+                    "order_processing_fee",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=16),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["order_purchase_date"],
+                        name="daily_sales_rollup_date_idx",
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("marketplace", "order_currency", "order_purchase_date"),
+                        name="daily_sales_rollup_key",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.1.6 on 2026-10-18 17:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("orders", "0005_dailysalesrollup"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="IngestCheckpoint",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("feed", models.CharField(max_length=2000, unique=True)),
+                ("position", models.PositiveIntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="RejectedOrder",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("feed", models.CharField(blank=True, max_length=2000)),
+                (
+                    "order_id",
+                    models.CharField(blank=True, db_index=True, max_length=50),
+                ),
+                (
+                    "stage",
+                    models.CharField(
+                        choices=[
+                            ("extraction", "Extraction"),
+                            ("database", "Database"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("reason", models.TextField()),
+                ("raw", models.TextField(blank=True)),
+                ("rejected_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.1.6 on 2026-10-18 17:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("orders", "0006_rejectedorder_ingestcheckpoint"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OrderSearchDocument",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("document", models.TextField()),
+                (
+                    "order",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="search_document",
+                        to="orders.order",
+                    ),
+                ),
+            ],
+        ),
+    ]
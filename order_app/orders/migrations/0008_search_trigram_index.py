@@ -0,0 +1,126 @@
+# Generated by Django 5.1.6 on 2026-10-18 17:26
+
+import sqlite3
+
+from django.db import migrations
+
+from orders.utils import batched
+
+# Frozen copies of orders.search as of this migration.
+SEARCH_FIELDS = [
+    "billing_lastname",
+    "billing_firstname",
+    "billing_email",
+    "billing_phone_home",
+    "billing_phone_office",
+    "billing_phone_mobile",
+    "billing_zipcode",
+    "delivery_lastname",
+    "delivery_firstname",
+    "delivery_email",
+    "delivery_phone_home",
+    "delivery_phone_office",
+    "delivery_phone_mobile",
+    "delivery_zipcode",
+    "tracking_number",
+]
+
+PHONE_FIELDS = [field for field in SEARCH_FIELDS if "_phone_" in field]
+
+FTS_TABLE = "orders_ordersearchdocument_fts"
+
+
+def sqlite_fts_supported() -> bool:
+    try:
+        with sqlite3.connect(":memory:") as probe:
+            probe.execute(
+                "CREATE VIRTUAL TABLE probe USING fts5(a, tokenize='trigram')"
+            )
+    except sqlite3.Error:
+        return False
+    return True
+
+
+def search_document(order) -> str:
+    values = [getattr(order, field) or "" for field in SEARCH_FIELDS]
+    values += [
+        "".join(char for char in getattr(order, field) or "" if char.isdigit())
+        for field in PHONE_FIELDS
+    ]
+    return " ".join("\n".join(value for value in values if value).lower().split())
+
+
+SQLITE_FORWARD = [
+    f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(document, "
+    "content='orders_ordersearchdocument', content_rowid='id', tokenize='trigram')",
+    f"""CREATE TRIGGER {FTS_TABLE}_insert AFTER INSERT ON orders_ordersearchdocument
+    BEGIN
+        INSERT INTO {FTS_TABLE} (rowid, document) VALUES (new.id, new.document);
+    END""",
+    f"""CREATE TRIGGER {FTS_TABLE}_delete AFTER DELETE ON orders_ordersearchdocument
+    BEGIN
+        INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, document)
+        VALUES ('delete', old.id, old.document);
+    END""",
+    f"""CREATE TRIGGER {FTS_TABLE}_update AFTER UPDATE ON orders_ordersearchdocument
+    BEGIN
+        INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, document)
+        VALUES ('delete', old.id, old.document);
+        INSERT INTO {FTS_TABLE} (rowid, document) VALUES (new.id, new.document);
+    END""",
+]
+
+SQLITE_BACKWARD = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{event}"
+    for event in ("insert", "delete", "update")
+] + [f"DROP TABLE IF EXISTS {FTS_TABLE}"]
+
+POSTGRESQL_FORWARD = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX order_search_document_trgm_idx ON orders_ordersearchdocument "
+    "USING gin (document gin_trgm_ops)",
+]
+
+POSTGRESQL_BACKWARD = ["DROP INDEX IF EXISTS order_search_document_trgm_idx"]
+
+
+def run(schema_editor, statements):
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def create_trigram_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite" and sqlite_fts_supported():
+        run(schema_editor, SQLITE_FORWARD)
+    elif vendor == "postgresql":
+        run(schema_editor, POSTGRESQL_FORWARD)
+
+    Order = apps.get_model("orders", "Order")
+    OrderSearchDocument = apps.get_model("orders", "OrderSearchDocument")
+    orders = Order.objects.only(*SEARCH_FIELDS).iterator()
+    for batch in batched(orders, 1000):
+        OrderSearchDocument.objects.bulk_create(
+            OrderSearchDocument(
+                order_id=order.order_id, document=search_document(order)
+            )
+            for order in batch
+        )
+
+
+def drop_trigram_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        run(schema_editor, SQLITE_BACKWARD)
+    elif vendor == "postgresql":
+        run(schema_editor, POSTGRESQL_BACKWARD)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("orders", "0007_ordersearchdocument"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
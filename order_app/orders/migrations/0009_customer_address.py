@@ -0,0 +1,90 @@
+# Generated by Django 5.1.6 on 2026-10-18 17:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("orders", "0008_search_trigram_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Address",
+            fields=[
+                (
+                    "content_hash",
+                    models.CharField(max_length=32, primary_key=True, serialize=False),
+                ),
+                ("address", models.CharField(blank=True, max_length=255)),
+                ("address_2", models.CharField(blank=True, max_length=255)),
+                ("address_complement", models.CharField(blank=True, max_length=255)),
+                ("zipcode", models.CharField(blank=True, max_length=20)),
+                ("city", models.CharField(blank=True, max_length=100)),
+                ("country", models.CharField(blank=True, max_length=100)),
+                ("country_iso", models.CharField(blank=True, max_length=10)),
+                ("full_address", models.TextField(blank=True)),
+            ],
+            options={
+                "verbose_name_plural": "addresses",
+            },
+        ),
+        migrations.CreateModel(
+            name="Customer",
+            fields=[
+                (
+                    "content_hash",
+                    models.CharField(max_length=32, primary_key=True, serialize=False),
+                ),
+                ("society", models.CharField(blank=True, max_length=100)),
+                ("civility", models.CharField(blank=True, max_length=50)),
+                ("lastname", models.CharField(blank=True, max_length=100)),
+                ("firstname", models.CharField(blank=True, max_length=100)),
+                ("email", models.EmailField(blank=True, db_index=True, max_length=254)),
+                ("phone_home", models.CharField(blank=True, max_length=20)),
+                ("phone_office", models.CharField(blank=True, max_length=20)),
+                ("phone_mobile", models.CharField(blank=True, max_length=20)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="order",
+            name="billing_location",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="+",
+                to="orders.address",
+            ),
+        ),
+        migrations.AddField(
+            model_name="order",
+            name="delivery_location",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="+",
+                to="orders.address",
+            ),
+        ),
+        migrations.AddField(
+            model_name="order",
+            name="billing_customer",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="+",
+                to="orders.customer",
+            ),
+        ),
+        migrations.AddField(
+            model_name="order",
+            name="delivery_customer",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="+",
+                to="orders.customer",
+            ),
+        ),
+    ]
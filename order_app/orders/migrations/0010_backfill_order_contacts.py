@@ -0,0 +1,112 @@
+# Generated by Django 5.1.6 on 2026-10-18 17:40
+
+import hashlib
+
+from django.db import migrations
+
+from orders.utils import batched
+
+# Frozen copies of orders.contacts as of this migration: the contact fields,
+# in the order their digest covers them, and the digest itself.
+CUSTOMER_FIELDS = [
+    "society",
+    "civility",
+    "lastname",
+    "firstname",
+    "email",
+    "phone_home",
+    "phone_office",
+    "phone_mobile",
+]
+ADDRESS_FIELDS = [
+    "address",
+    "address_2",
+    "address_complement",
+    "zipcode",
+    "city",
+    "country",
+    "country_iso",
+    "full_address",
+]
+CONTACT_RELATIONS = {
+    "billing_customer": CUSTOMER_FIELDS,
+    "billing_location": ADDRESS_FIELDS,
+    "delivery_customer": CUSTOMER_FIELDS,
+    "delivery_location": ADDRESS_FIELDS,
+}
+# Flat Order field name -> (contact foreign key, field of the contact).
+CONTACT_FIELDS = {
+    f"{relation.split('_')[0]}_{attribute}": (relation, attribute)
+    for relation, attributes in CONTACT_RELATIONS.items()
+    for attribute in attributes
+}
+
+
+def contact_key(values: dict, fields) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    for field in fields:
+        digest.update(f"{values.get(field) or ''}\x1f".encode())
+    return digest.hexdigest()
+
+
+def build_contact(model, fields, values: dict):
+    values = {field: values.get(field) or "" for field in fields}
+    return model(content_hash=contact_key(values, fields), **values)
+
+
+def relations(apps):
+    Order = apps.get_model("orders", "Order")
+    return {
+        relation: Order._meta.get_field(relation).related_model
+        for relation in CONTACT_RELATIONS
+    }
+
+
+def backfill_contacts(apps, schema_editor):
+    Order = apps.get_model("orders", "Order")
+    models = relations(apps)
+    orders = Order.objects.only(*CONTACT_FIELDS).order_by("order_id").iterator()
+    for batch in batched(orders, 1000):
+        contacts = {}
+        for order in batch:
+            blocks = {}
+            for name, (relation, attribute) in CONTACT_FIELDS.items():
+                blocks.setdefault(relation, {})[attribute] = getattr(order, name)
+            for relation, model in models.items():
+                contact = build_contact(
+                    model, CONTACT_RELATIONS[relation], blocks[relation]
+                )
+                contact = contacts.setdefault((model, contact.pk), contact)
+                setattr(order, relation, contact)
+        for model in models.values():
+            model.objects.bulk_create(
+                [contact for key, contact in contacts.items() if key[0] is model],
+                ignore_conflicts=True,
+            )
+        Order.objects.bulk_update(batch, list(models))
+
+
+def restore_flat_fields(apps, schema_editor):
+    Order = apps.get_model("orders", "Order")
+    models = relations(apps)
+    orders = (
+        Order.objects.select_related(*models)
+        .filter(**{f"{relation}__isnull": False for relation in models})
+        .order_by("order_id")
+        .iterator(chunk_size=1000)
+    )
+    for batch in batched(orders, 1000):
+        for order in batch:
+            for name, (relation, attribute) in CONTACT_FIELDS.items():
+                setattr(order, name, getattr(getattr(order, relation), attribute))
+        Order.objects.bulk_update(batch, list(CONTACT_FIELDS))
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("orders", "0009_customer_address"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_contacts, restore_flat_fields),
+    ]
@@ -0,0 +1,233 @@
+# Generated by Django 5.1.6 on 2026-10-18 17:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("orders", "0010_backfill_order_contacts"),
+    ]
+
+    # Blank contact fields have an empty default, which the columns need
+    # when unapplying this migration re-adds them. Changing blank runs no SQL.
+    operations = [
+        migrations.AlterField(
+            model_name="order",
+            name="billing_lastname",
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AlterField(
+            model_name="order",
+            name="billing_email",
+            field=models.EmailField(blank=True, max_length=254),
+        ),
+        migrations.AlterField(
+            model_name="order",
+            name="billing_zipcode",
+            field=models.CharField(blank=True, max_length=20),
+        ),
+        migrations.AlterField(
+            model_name="order",
+            name="billing_city",
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AlterField(
+            model_name="order",
+            name="billing_country",
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AlterField(
+            model_name="order",
+            name="billing_full_address",
+            field=models.TextField(blank=True),
+        ),
+        migrations.AlterField(
+            model_name="order",
+            name="delivery_zipcode",
+            field=models.CharField(blank=True, max_length=20),
+        ),
+        migrations.AlterField(
+            model_name="order",
+            name="delivery_city",
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AlterField(
+            model_name="order",
+            name="delivery_country",
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AlterField(
+            model_name="order",
+            name="delivery_full_address",
+            field=models.TextField(blank=True),
+        ),
+        migrations.RemoveIndex(
+            model_name="order",
+            name="order_billing_email_idx",
+        ),
+        migrations.RemoveField(
+            model_name="order",
+            name="billing_address",
+        ),
+        migrations.RemoveField(
+            model_name="order",
+            name="billing_address_2",
+        ),
+        migrations.RemoveField(
+            model_name="order",
+            name="billing_address_complement",
+        ),
+        migrations.RemoveField(
+            model_name="order",
+            name="billing_city",
+        ),
+        migrations.RemoveField(
+            model_name="order",
+            name="billing_civility",
+        ),
+        migrations.RemoveField(
+            model_name="order",
+            name="billing_country",
+        ),
+        migrations.RemoveField(
+            model_name="order",
+            name="billing_country_iso",
+        ),
+        migrations.RemoveField(
+            model_name="order",
+            name="billing_email",
+        ),
+        migrations.RemoveField(
+            model_name="order",
+            name="billing_firstname",
+        ),
+        migrations.RemoveField(
+            model_name="order",
+            name="billing_full_address",
+        ),
+        migrations.RemoveField(
+            model_name="order",
+            name="billing_lastname",
+        ),
+        migrations.RemoveField(
+            model_name="order",
+            name="billing_phone_home",
+        ),
+        migrations.RemoveField(
+            model_name="order",
+            name="billing_phone_mobile",
+        ),
+        migrations.RemoveField(
+            model_name="order",
+            name="billing_phone_office",
+        ),
+        migrations.RemoveField(
+            model_name="order",
+            name="billing_society",
+        ),
+        migrations.RemoveField(
+            model_name="order",
+            name="billing_zipcode",
+        ),
+        migrations.RemoveField(
+            model_name="order",
+            name="delivery_address",
+        ),
+        migrations.RemoveField(
+            model_name="order",
+            name="delivery_address_2",
+        ),
+        migrations.RemoveField(
+            model_name="order",
+            name="delivery_address_complement",
+        ),
+        migrations.RemoveField(
+            model_name="order",
+            name="delivery_city",
+        ),
+        migrations.RemoveField(
+            model_name="order",
+            name="delivery_civility",
+        ),
+        migrations.RemoveField(
+            model_name="order",
+            name="delivery_country",
+        ),
+        migrations.RemoveField(
+            model_name="order",
+            name="delivery_country_iso",
+        ),
+        migrations.RemoveField(
+            model_name="order",
+            name="delivery_email",
+        ),
+        migrations.RemoveField(
+            model_name="order",
+            name="delivery_firstname",
+        ),
+        migrations.RemoveField(
+            model_name="order",
+            name="delivery_full_address",
+        ),
+        migrations.RemoveField(
+            model_name="order",
+            name="delivery_lastname",
+        ),
+        migrations.RemoveField(
+            model_name="order",
+            name="delivery_phone_home",
+        ),
+        migrations.RemoveField(
+            model_name="order",
+            name="delivery_phone_mobile",
+        ),
+        migrations.RemoveField(
+            model_name="order",
+            name="delivery_phone_office",
+        ),
+        migrations.RemoveField(
+            model_name="order",
+            name="delivery_society",
+        ),
+        migrations.RemoveField(
+            model_name="order",
+            name="delivery_zipcode",
+        ),
+        migrations.AlterField(
+            model_name="order",
+            name="billing_customer",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="+",
+                to="orders.customer",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="order",
+            name="billing_location",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="+",
+                to="orders.address",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="order",
+            name="delivery_customer",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="+",
+                to="orders.customer",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="order",
+            name="delivery_location",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="+",
+                to="orders.address",
+            ),
+        ),
+    ]
@@ -1,6 +1,60 @@
 from django.db import models
 
 
+class Customer(models.Model):
+    """Contact details of a billing or delivery party, shared by every order
+    with the same values and keyed by their digest (see orders.contacts)."""
+
+    content_hash = models.CharField(max_length=32, primary_key=True)
+    society = models.CharField(max_length=100, blank=True)
+    civility = models.CharField(max_length=50, blank=True)
+    lastname = models.CharField(max_length=100, blank=True)
+    firstname = models.CharField(max_length=100, blank=True)
+    email = models.EmailField(blank=True, db_index=True)
+    phone_home = models.CharField(max_length=20, blank=True)
+    phone_office = models.CharField(max_length=20, blank=True)
+    phone_mobile = models.CharField(max_length=20, blank=True)
+
+    def __str__(self):
+        return " ".join(filter(None, [self.firstname, self.lastname])) or self.email
+
+
+class Address(models.Model):
+    """Postal address of a billing or delivery party, shared by every order
+    with the same values and keyed by their digest (see orders.contacts)."""
+
+    content_hash = models.CharField(max_length=32, primary_key=True)
+    address = models.CharField(max_length=255, blank=True)
+    address_2 = models.CharField(max_length=255, blank=True)
+    address_complement = models.CharField(max_length=255, blank=True)
+    zipcode = models.CharField(max_length=20, blank=True)
+    city = models.CharField(max_length=100, blank=True)
+    country = models.CharField(max_length=100, blank=True)
+    country_iso = models.CharField(max_length=10, blank=True)
+    full_address = models.TextField(blank=True)
+
+    class Meta:
+        verbose_name_plural = "addresses"
+
+    def __str__(self):
+        return self.full_address or f"{self.zipcode} {self.city}".strip()
+
+
+class ContactAttribute:
+    """Read-only access to a field of an order's Customer or Address under
+    its flat name, e.g. ``order.billing_email`` for
+    ``order.billing_customer.email``."""
+
+    def __init__(self, relation: str, attribute: str):
+        self.relation = relation
+        self.attribute = attribute
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        return getattr(getattr(instance, self.relation), self.attribute)
+
+
 class Order(models.Model):
     marketplace = models.CharField(max_length=50)
     id_flux = models.CharField(max_length=50)
@@ -27,38 +81,18 @@ class Order(models.Model):
     payment_time = models.TimeField(blank=True, null=True)
     invoice_number = models.CharField(max_length=50, blank=True)
     invoice_url = models.URLField(blank=True)
-    billing_society = models.CharField(max_length=100, blank=True)
-    billing_civility = models.CharField(max_length=50, blank=True)
-    billing_lastname = models.CharField(max_length=100)
-    billing_firstname = models.CharField(max_length=100, blank=True)
-    billing_email = models.EmailField()
-    billing_address = models.CharField(max_length=255, blank=True)
-    billing_address_2 = models.CharField(max_length=255, blank=True)
-    billing_address_complement = models.CharField(max_length=255, blank=True)
-    billing_zipcode = models.CharField(max_length=20)
-    billing_city = models.CharField(max_length=100)
-    billing_country = models.CharField(max_length=100)
-    billing_country_iso = models.CharField(max_length=10, blank=True)
-    billing_phone_home = models.CharField(max_length=20, blank=True)
-    billing_phone_office = models.CharField(max_length=20, blank=True)
-    billing_phone_mobile = models.CharField(max_length=20, blank=True)
-    billing_full_address = models.TextField()
-    delivery_society = models.CharField(max_length=100, blank=True)
-    delivery_civility = models.CharField(max_length=50, blank=True)
-    delivery_lastname = models.CharField(max_length=100, blank=True)
-    delivery_firstname = models.CharField(max_length=100, blank=True)
-    delivery_email = models.EmailField(blank=True)
-    delivery_address = models.CharField(max_length=255, blank=True)
-    delivery_address_2 = models.CharField(max_length=255, blank=True)
-    delivery_address_complement = models.CharField(max_length=255, blank=True)
-    delivery_zipcode = models.CharField(max_length=20)
-    delivery_city = models.CharField(max_length=100)
-    delivery_country = models.CharField(max_length=100)
-    delivery_country_iso = models.CharField(max_length=10, blank=True)
-    delivery_phone_home = models.CharField(max_length=20, blank=True)
-    delivery_phone_office = models.CharField(max_length=20, blank=True)
-    delivery_phone_mobile = models.CharField(max_length=20, blank=True)
-    delivery_full_address = models.TextField()
+    billing_customer = models.ForeignKey(
+        Customer, on_delete=models.PROTECT, related_name="+"
+    )
+    billing_location = models.ForeignKey(
+        Address, on_delete=models.PROTECT, related_name="+"
+    )
+    delivery_customer = models.ForeignKey(
+        Customer, on_delete=models.PROTECT, related_name="+"
+    )
+    delivery_location = models.ForeignKey(
+        Address, on_delete=models.PROTECT, related_name="+"
+    )
     tracking_method = models.CharField(max_length=50, blank=True)
     tracking_carrier = models.CharField(max_length=50, blank=True)
     tracking_number = models.CharField(max_length=50, blank=True)
@@ -71,6 +105,166 @@ class Order(models.Model):
     )
     order_comments = models.TextField(blank=True)
     customer_id = models.CharField(max_length=50, blank=True)
+    content_hash = models.CharField(max_length=64, blank=True, editable=False)
+
+    # Flat views of the contacts, under the names the API and feeds use.
+    billing_society = ContactAttribute("billing_customer", "society")
+    billing_civility = ContactAttribute("billing_customer", "civility")
+    billing_lastname = ContactAttribute("billing_customer", "lastname")
+    billing_firstname = ContactAttribute("billing_customer", "firstname")
+    billing_email = ContactAttribute("billing_customer", "email")
+    billing_address = ContactAttribute("billing_location", "address")
+    billing_address_2 = ContactAttribute("billing_location", "address_2")
+    billing_address_complement = ContactAttribute(
+        "billing_location", "address_complement"
+    )
+    billing_zipcode = ContactAttribute("billing_location", "zipcode")
+    billing_city = ContactAttribute("billing_location", "city")
+    billing_country = ContactAttribute("billing_location", "country")
+    billing_country_iso = ContactAttribute("billing_location", "country_iso")
+    billing_phone_home = ContactAttribute("billing_customer", "phone_home")
+    billing_phone_office = ContactAttribute("billing_customer", "phone_office")
+    billing_phone_mobile = ContactAttribute("billing_customer", "phone_mobile")
+    billing_full_address = ContactAttribute("billing_location", "full_address")
+    delivery_society = ContactAttribute("delivery_customer", "society")
+    delivery_civility = ContactAttribute("delivery_customer", "civility")
+    delivery_lastname = ContactAttribute("delivery_customer", "lastname")
+    delivery_firstname = ContactAttribute("delivery_customer", "firstname")
+    delivery_email = ContactAttribute("delivery_customer", "email")
+    delivery_address = ContactAttribute("delivery_location", "address")
+    delivery_address_2 = ContactAttribute("delivery_location", "address_2")
+    delivery_address_complement = ContactAttribute(
+        "delivery_location", "address_complement"
+    )
+    delivery_zipcode = ContactAttribute("delivery_location", "zipcode")
+    delivery_city = ContactAttribute("delivery_location", "city")
+    delivery_country = ContactAttribute("delivery_location", "country")
+    delivery_country_iso = ContactAttribute("delivery_location", "country_iso")
+    delivery_phone_home = ContactAttribute("delivery_customer", "phone_home")
+    delivery_phone_office = ContactAttribute("delivery_customer", "phone_office")
+    delivery_phone_mobile = ContactAttribute("delivery_customer", "phone_mobile")
+    delivery_full_address = ContactAttribute("delivery_location", "full_address")
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["marketplace", "order_purchase_date"],
+                name="order_marketplace_date_idx",
+            ),
+            models.Index(
+                fields=["order_status_lengow", "order_purchase_date"],
+                name="order_status_date_idx",
+            ),
+            models.Index(
+                fields=["order_purchase_date", "order_id"],
+                name="order_purchase_date_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"Order {self.order_id} from {self.marketplace}"
+
+
+class OrderLine(models.Model):
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="lines")
+    order_lineid = models.CharField(max_length=50, blank=True)
+    sku = models.CharField(max_length=100, blank=True)
+    ean = models.CharField(max_length=50, blank=True)
+    title = models.CharField(max_length=255, blank=True)
+    brand = models.CharField(max_length=100, blank=True)
+    category = models.CharField(max_length=255, blank=True)
+    quantity = models.PositiveIntegerField(default=0)
+    price = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+    price_unit = models.DecimalField(
+        max_digits=10, decimal_places=2, blank=True, null=True
+    )
+    status = models.CharField(max_length=50, blank=True)
+
+    def __str__(self):
+        return f"{self.quantity} x {self.title or self.sku} for order {self.order_id}"
+
+
+class DailySalesRollup(models.Model):
+    """Sales totals per marketplace, currency and purchase day.
+
+    Maintained by fetch_orders for the days each batch touches; rebuild it
+    with the rebuild_sales_rollups command.
+    """
+
+    marketplace = models.CharField(max_length=50)
+    order_currency = models.CharField(max_length=10)
+    order_purchase_date = models.DateField()
+    order_count = models.PositiveIntegerField(default=0)
+    order_amount = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    order_tax = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    order_shipping = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    order_commission = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    order_processing_fee = models.DecimalField(
+        max_digits=16, decimal_places=2, default=0
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["marketplace", "order_currency", "order_purchase_date"],
+                name="daily_sales_rollup_key",
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=["order_purchase_date"], name="daily_sales_rollup_date_idx"
+            )
+        ]
+
+    def __str__(self):
+        return (
+            f"{self.marketplace} {self.order_currency} "
+            f"{self.order_purchase_date}: {self.order_count} orders"
+        )
+
+
+class RejectedOrder(models.Model):
+    """An order fetch_orders could not save, kept for inspection and replay."""
+
+    EXTRACTION = "extraction"
+    DATABASE = "database"
+    STAGE_CHOICES = [(EXTRACTION, "Extraction"), (DATABASE, "Database")]
+
+    feed = models.CharField(max_length=2000, blank=True)
+    order_id = models.CharField(max_length=50, blank=True, db_index=True)
+    stage = models.CharField(max_length=20, choices=STAGE_CHOICES)
+    reason = models.TextField()
+    # XML fragment for extraction failures, JSON of the extracted fields for
+    # database failures.
+    raw = models.TextField(blank=True)
+    rejected_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Rejected order {self.order_id or '?'} ({self.stage})"
+
+
+class IngestCheckpoint(models.Model):
+    """Number of orders of a feed already committed by an unfinished run."""
+
+    feed = models.CharField(max_length=2000, unique=True)
+    position = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.feed} at order {self.position}"
+
+
+class OrderSearchDocument(models.Model):
+    """Searchable text of an order, behind the ``?q=`` filter of the list.
+
+    Rows are written by orders.search. Migration 0008 indexes ``document``
+    with trigrams: an FTS5 table on SQLite, a pg_trgm GIN index on PostgreSQL.
+    """
+
+    order = models.OneToOneField(
+        Order, on_delete=models.CASCADE, related_name="search_document"
+    )
+    document = models.TextField()
+
+    def __str__(self):
+        return f"Search document of order {self.order_id}"
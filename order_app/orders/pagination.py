@@ -0,0 +1,113 @@
+import base64
+import json
+from datetime import date
+
+from django.db import connection
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def encode_cursor(purchase_date, order_id) -> str:
+    payload = json.dumps(
+        [purchase_date.isoformat() if purchase_date else None, order_id]
+    )
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_cursor(cursor: str):
+    """Position encoded in ``cursor``; raises ValueError when it is invalid."""
+    try:
+        purchase_date, order_id = json.loads(base64.urlsafe_b64decode(cursor))
+        if purchase_date is not None:
+            purchase_date = date.fromisoformat(purchase_date)
+    except (TypeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+    return purchase_date, str(order_id)
+
+
+class OrderKeysetPagination(BasePagination):
+    """Keyset pagination on (order_purchase_date, order_id).
+
+    The cursor encodes the key of the last row of the page, so every page is
+    an index range scan whatever its depth.
+    """
+
+    cursor_query_param = "cursor"
+    page_size = 100
+    page_size_query_param = "page_size"
+    max_page_size = 1000
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by("order_purchase_date", "order_id")
+
+        position = self.decode_cursor(request)
+        if position is not None:
+            queryset = queryset.filter(self.after(*position))
+
+        results = list(queryset[: page_size + 1])
+        self.next_position = None
+        if len(results) > page_size:
+            results = results[:page_size]
+            last = results[-1]
+            self.next_position = (last.order_purchase_date, last.order_id)
+        return results
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        page_size = self.page_size
+        try:
+            requested = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return page_size
+        return min(requested, self.max_page_size) if requested > 0 else page_size
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        cursor = encode_cursor(*self.next_position)
+        return replace_query_param(
+            self.request.build_absolute_uri(), self.cursor_query_param, cursor
+        )
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            return decode_cursor(cursor)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+
+    @staticmethod
+    def after(purchase_date, order_id):
+        """Rows strictly after (purchase_date, order_id) in list order."""
+        nulls_last = connection.features.nulls_order_largest
+        if purchase_date is None:
+            condition = Q(order_purchase_date__isnull=True, order_id__gt=order_id)
+            if not nulls_last:
+                condition |= Q(order_purchase_date__isnull=False)
+            return condition
+        condition = Q(order_purchase_date__gt=purchase_date) | Q(
+            order_purchase_date=purchase_date, order_id__gt=order_id
+        )
+        if nulls_last:
+            condition |= Q(order_purchase_date__isnull=True)
+        return condition
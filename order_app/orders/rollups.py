@@ -0,0 +1,192 @@
+"""Incremental maintenance of the DailySalesRollup table."""
+
+from collections import defaultdict
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, Sum, Value
+from django.db.models.functions import Coalesce
+
+from orders.archive import get_archive
+from orders.models import DailySalesRollup, Order
+from orders.utils import batched
+
+ROLLUP_KEY = ["marketplace", "order_currency", "order_purchase_date"]
+
+ROLLUP_SUMS = [
+    "order_amount",
+    "order_tax",
+    "order_shipping",
+    "order_commission",
+    "order_processing_fee",
+]
+
+# Order fields a change of rollup depends on.
+ROLLUP_FIELDS = ["order_id", *ROLLUP_KEY, *ROLLUP_SUMS]
+
+
+def as_date(value) -> date | None:
+    """Purchase date of an order field value (aware datetimes are local)."""
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+
+def aggregate_orders(queryset):
+    """Rollup rows, as dicts, of ``queryset`` grouped on the rollup key."""
+    zero = Value(Decimal(0), output_field=DecimalField(max_digits=16, decimal_places=2))
+    return (
+        queryset.exclude(order_purchase_date__isnull=True)
+        .order_by()
+        .values(*ROLLUP_KEY)
+        .annotate(
+            order_count=Count("order_id"),
+            **{field: Coalesce(Sum(field), zero) for field in ROLLUP_SUMS},
+        )
+    )
+
+
+def rollup_values(order) -> dict:
+    """ROLLUP_FIELDS of an Order, of a ``values()`` row or of an archived
+    record, with the purchase date as a date and the sums as Decimals."""
+    if not isinstance(order, dict):
+        order = {field: getattr(order, field) for field in ROLLUP_FIELDS}
+    day = order["order_purchase_date"]
+    return {
+        **{field: order[field] for field in ROLLUP_FIELDS},
+        "order_purchase_date": (
+            date.fromisoformat(day) if isinstance(day, str) else as_date(day)
+        ),
+        **{field: Decimal(order[field] or 0) for field in ROLLUP_SUMS},
+    }
+
+
+def refresh_sales_rollups(days, before=(), after=()) -> int:
+    """Bring the rollup rows of ``days`` up to date with the Order table.
+
+    ``before`` and ``after`` are the orders the change touched, as stored
+    before and after it (Orders or rollup_values() dicts). Days after the
+    newest archived purchase date are recomputed from the Order table. The
+    others also count archived orders, so they are adjusted by the changed
+    orders instead; see adjust_sales_rollups.
+    """
+    days = {day for day in days if day is not None}
+    if not days:
+        return 0
+    archive = get_archive()
+    archived_until = archive.archived_until() if archive is not None else None
+    archived_days = {day for day in days if archived_until and day <= archived_until}
+    days -= archived_days
+    count = 0
+    with transaction.atomic():
+        if days:
+            count += recompute_sales_rollups(days)
+        if archived_days:
+            count += adjust_sales_rollups(archive, archived_days, before, after)
+    return count
+
+
+def recompute_sales_rollups(days) -> int:
+    """Recompute the rollup rows of ``days`` from the Order table.
+
+    Rows are upserted, then the rows of keys without orders left are
+    deleted, so concurrent refreshes of a day never both insert its rows.
+    """
+    rows = list(aggregate_orders(Order.objects.filter(order_purchase_date__in=days)))
+    DailySalesRollup.objects.bulk_create(
+        (DailySalesRollup(**row) for row in rows),
+        update_conflicts=True,
+        unique_fields=ROLLUP_KEY,
+        update_fields=["order_count", *ROLLUP_SUMS],
+    )
+    keys = {tuple(row[field] for field in ROLLUP_KEY) for row in rows}
+    stale = [
+        pk
+        for pk, *key in DailySalesRollup.objects.filter(
+            order_purchase_date__in=days
+        ).values_list("pk", *ROLLUP_KEY)
+        if tuple(key) not in keys
+    ]
+    if stale:
+        DailySalesRollup.objects.filter(pk__in=stale).delete()
+    return len(rows)
+
+
+def adjust_sales_rollups(archive, days, before, after) -> int:
+    """Move the rollup rows of archived ``days`` from the ``before`` state of
+    the changed orders to their ``after`` state.
+
+    An order stored in the database shadows its archived copy, so an order
+    missing on one side counts as its archived copy there: re-ingesting an
+    archived order replaces the copy's totals, deleting it brings them back.
+    Only orders whose stored side falls on one of ``days`` are looked up in
+    the archive.
+    """
+    before = {row["order_id"]: row for row in map(rollup_values, before)}
+    after = {row["order_id"]: row for row in map(rollup_values, after)}
+    deltas = defaultdict(lambda: dict.fromkeys(["order_count", *ROLLUP_SUMS], 0))
+    for order_id in before.keys() | after.keys():
+        old, new = before.get(order_id), after.get(order_id)
+        if (old or new)["order_purchase_date"] in days and not (old and new):
+            archived = archive.find(order_id)
+            copy = rollup_values(archived) if archived is not None else None
+            old, new = old or copy, new or copy
+        for sign, values in ((-1, old), (1, new)):
+            if values is None or values["order_purchase_date"] not in days:
+                continue
+            delta = deltas[tuple(values[field] for field in ROLLUP_KEY)]
+            delta["order_count"] += sign
+            for field in ROLLUP_SUMS:
+                delta[field] += sign * values[field]
+
+    deltas = {key: delta for key, delta in deltas.items() if any(delta.values())}
+    if not deltas:
+        return 0
+    # Create the missing rows empty first, so every row to adjust exists
+    # and can be locked whatever other writers do meanwhile.
+    DailySalesRollup.objects.bulk_create(
+        [DailySalesRollup(**dict(zip(ROLLUP_KEY, key))) for key in deltas],
+        ignore_conflicts=True,
+    )
+    rows = {
+        tuple(getattr(row, field) for field in ROLLUP_KEY): row
+        for row in DailySalesRollup.objects.select_for_update().filter(
+            order_purchase_date__in={key[-1] for key in deltas}
+        )
+    }
+    count = 0
+    for key, delta in deltas.items():
+        row = rows[key]
+        row.order_count += delta["order_count"]
+        for field in ROLLUP_SUMS:
+            setattr(row, field, getattr(row, field) + delta[field])
+        if row.order_count > 0:
+            row.save()
+        else:
+            row.delete()
+        count += 1
+    return count
+
+
+def rebuild_sales_rollups(batch_size=1000, since: date | None = None) -> int:
+    """Recompute the whole rollup table, or its days from ``since`` on.
+
+    Days before ``since`` keep their rollups, which is how the days whose
+    orders were archived keep their totals.
+    """
+    count = 0
+    rollups = DailySalesRollup.objects.all()
+    orders = Order.objects.all()
+    if since is not None:
+        rollups = rollups.filter(order_purchase_date__gte=since)
+        orders = orders.filter(order_purchase_date__gte=since)
+    with transaction.atomic():
+        rollups.delete()
+        rows = aggregate_orders(orders).iterator(chunk_size=batch_size)
+        for batch in batched(rows, batch_size):
+            DailySalesRollup.objects.bulk_create(
+                DailySalesRollup(**row) for row in batch
+            )
+            count += len(batch)
+    return count
@@ -0,0 +1,128 @@
+"""Substring search over the customer and tracking fields of orders.
+
+Every order has an OrderSearchDocument holding the lowercased text of
+SEARCH_FIELDS. On SQLite the documents are indexed by an FTS5 trigram table
+kept in sync by triggers, on PostgreSQL by a pg_trgm GIN index; both serve
+``LIKE '%term%'`` style lookups without scanning the orders. Other backends,
+and terms shorter than a trigram, scan the narrow document table instead.
+"""
+
+import sqlite3
+from functools import lru_cache
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+from orders.contacts import only_order_fields
+from orders.models import Order, OrderSearchDocument
+from orders.utils import batched
+
+SEARCH_FIELDS = [
+    "billing_lastname",
+    "billing_firstname",
+    "billing_email",
+    "billing_phone_home",
+    "billing_phone_office",
+    "billing_phone_mobile",
+    "billing_zipcode",
+    "delivery_lastname",
+    "delivery_firstname",
+    "delivery_email",
+    "delivery_phone_home",
+    "delivery_phone_office",
+    "delivery_phone_mobile",
+    "delivery_zipcode",
+    "tracking_number",
+]
+
+PHONE_FIELDS = [field for field in SEARCH_FIELDS if "_phone_" in field]
+
+FTS_TABLE = "orders_ordersearchdocument_fts"
+
+# Trigram indexes cannot serve shorter terms.
+MIN_INDEXED_LENGTH = 3
+
+
+@lru_cache(maxsize=None)
+def sqlite_fts_supported() -> bool:
+    """Whether the SQLite library has FTS5 with the trigram tokenizer (3.34+)."""
+    try:
+        with sqlite3.connect(":memory:") as probe:
+            probe.execute(
+                "CREATE VIRTUAL TABLE probe USING fts5(a, tokenize='trigram')"
+            )
+    except sqlite3.Error:
+        return False
+    return True
+
+
+def normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def search_document(order) -> str:
+    """Searchable text of ``order``; phone numbers are also kept digits-only
+    so "0612" finds "06 12 34 56 78"."""
+    values = [getattr(order, field) or "" for field in SEARCH_FIELDS]
+    values += [
+        "".join(char for char in getattr(order, field) or "" if char.isdigit())
+        for field in PHONE_FIELDS
+    ]
+    return normalize("\n".join(value for value in values if value))
+
+
+def index_orders(orders, batch_size=1000):
+    """Replace the search documents of ``orders``."""
+    for batch in batched(orders, batch_size):
+        OrderSearchDocument.objects.filter(
+            order_id__in=[order.order_id for order in batch]
+        ).delete()
+        OrderSearchDocument.objects.bulk_create(
+            OrderSearchDocument(
+                order_id=order.order_id, document=search_document(order)
+            )
+            for order in batch
+        )
+
+
+def reindex_orders(order_ids):
+    """Rebuild the search documents of the orders stored under ``order_ids``."""
+    index_orders(
+        only_order_fields(Order.objects.filter(order_id__in=order_ids), SEARCH_FIELDS)
+    )
+
+
+def rebuild_search_index() -> int:
+    """Rebuild every search document, returning the number of orders indexed."""
+    OrderSearchDocument.objects.all().delete()
+    orders = only_order_fields(Order.objects.order_by("order_id"), SEARCH_FIELDS)
+    orders = orders.iterator()
+    count = 0
+    for batch in batched(orders, 1000):
+        index_orders(batch)
+        count += len(batch)
+    return count
+
+
+def search_orders(queryset, term: str):
+    """Restrict ``queryset`` to the orders whose search document contains
+    ``term``, case-insensitively."""
+    term = normalize(term)
+    if not term:
+        return queryset
+    if (
+        connection.vendor == "sqlite"
+        and len(term) >= MIN_INDEXED_LENGTH
+        and sqlite_fts_supported()
+    ):
+        phrase = '"{}"'.format(term.replace('"', '""'))
+        documents = OrderSearchDocument.objects.filter(
+            id__in=RawSQL(
+                f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s",
+                [phrase],
+            )
+        )
+    else:
+        # On PostgreSQL, LIKE on the lowercased document uses the trigram index.
+        documents = OrderSearchDocument.objects.filter(document__contains=term)
+    return queryset.filter(order_id__in=documents.values("order_id"))
@@ -1,9 +1,123 @@
 from rest_framework import serializers
 
-from .models import Order
+from .contacts import (
+    CONTACT_FIELDS,
+    CONTACT_RELATIONS,
+    ORDER_FIELD_NAMES,
+    resolve_contacts,
+)
+from .models import DailySalesRollup, Order, OrderLine
+
+# Contact fields that were mandatory as Order columns and still are in the
+# API, although the shared Customer and Address columns are all optional.
+REQUIRED_CONTACT_FIELDS = {
+    "billing_lastname",
+    "billing_email",
+    "billing_zipcode",
+    "billing_city",
+    "billing_country",
+    "billing_full_address",
+    "delivery_zipcode",
+    "delivery_city",
+    "delivery_country",
+    "delivery_full_address",
+}
+
+
+class OrderLineSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = OrderLine
+        exclude = ["id", "order"]
 
 
 class OrderSerializer(serializers.ModelSerializer):
+    """Full order representation.
+
+    Contacts are shown and written as the flat ``billing_*``/``delivery_*``
+    fields. Pass ``fields`` to keep only a subset of the serializer fields.
+    """
+
+    lines = OrderLineSerializer(many=True, read_only=True)
+
     class Meta:
         model = Order
-        fields = "__all__"
+        fields = [
+            "order_id",
+            "lines",
+            *(
+                name
+                for name in ORDER_FIELD_NAMES
+                if name not in ("order_id", "content_hash")
+            ),
+        ]
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for field_name in set(self.fields) - set(fields):
+                self.fields.pop(field_name)
+
+    def build_field(self, field_name, info, model_class, nested_depth):
+        if field_name not in CONTACT_FIELDS:
+            return super().build_field(field_name, info, model_class, nested_depth)
+        relation, attribute = CONTACT_FIELDS[field_name]
+        model_field = CONTACT_RELATIONS[relation]._meta.get_field(attribute)
+        field_class, field_kwargs = self.build_standard_field(attribute, model_field)
+        if field_name in REQUIRED_CONTACT_FIELDS:
+            field_kwargs.pop("required", None)
+            field_kwargs.pop("allow_blank", None)
+        return field_class, field_kwargs
+
+    def create(self, validated_data):
+        return super().create(resolve_contacts(validated_data))
+
+    def update(self, instance, validated_data):
+        return super().update(instance, resolve_contacts(validated_data, instance))
+
+
+class OrderListSerializer(OrderSerializer):
+    """Compact representation used by default when listing orders."""
+
+    class Meta:
+        model = Order
+        fields = [
+            "order_id",
+            "marketplace",
+            "id_flux",
+            "order_status_lengow",
+            "order_purchase_date",
+            "order_purchase_time",
+            "order_amount",
+            "order_currency",
+            "billing_firstname",
+            "billing_lastname",
+            "billing_email",
+            "tracking_number",
+        ]
+
+
+class DailySalesRollupSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DailySalesRollup
+        exclude = ["id"]
+
+
+class OrderBulkUpdateItemSerializer(serializers.Serializer):
+    """One partial tracking/status update of the bulk update endpoint."""
+
+    order_id = serializers.CharField(max_length=50)
+    order_status_lengow = serializers.CharField(
+        max_length=50, allow_blank=True, required=False
+    )
+    tracking_number = serializers.CharField(
+        max_length=50, allow_blank=True, required=False
+    )
+    tracking_carrier = serializers.CharField(
+        max_length=50, allow_blank=True, required=False
+    )
+    tracking_shipped_date = serializers.DateTimeField(allow_null=True, required=False)
+
+    def validate(self, attrs):
+        if len(attrs) < 2:
+            raise serializers.ValidationError("No field to update.")
+        return attrs
@@ -1,16 +1,57 @@
+import csv
+import gzip
+import io
+import json
 import os
-from datetime import datetime
+import pstats
+import tempfile
+from datetime import date, datetime
 from decimal import Decimal
+from unittest import skipUnless
 from unittest.mock import patch
+from urllib.parse import parse_qs, urlsplit
 from xml.etree import ElementTree
 
 import requests
+from asgiref.sync import async_to_sync
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
 from django.core.management import call_command
-from django.test import TestCase
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import DatabaseError
+from django.test import TestCase, override_settings
+from django.urls import reverse
 from django.utils import timezone
-from orders.models import Order
+from orders.archive import OrderArchive
+from orders.benchmarks import compare_to_baseline, legacy_extract
+from orders.contacts import ContactCache, build_contact, contact_cache
+from orders.feedgen import iter_feed
+from orders.ingestion import (
+    bulk_upsert_orders,
+    can_copy,
+    copy_insert,
+    copy_upsert_orders,
+    extract_order_lines,
+    extract_order_values,
+    order_field_extractor,
+    save_order_batch,
+)
+from orders.metrics import registry
+from orders.models import (
+    Address,
+    Customer,
+    DailySalesRollup,
+    IngestCheckpoint,
+    Order,
+    OrderLine,
+    RejectedOrder,
+)
+from orders.serializers import OrderListSerializer
 from orders.utils import (
+    datetime_converter,
     get_str_from_element_and_xpath,
+    iter_elements_from_chunks,
     safe_datetime_conversion,
     safe_decimal_conversion,
 )
@@ -24,6 +65,24 @@ def load_fixture(filename):
         return file.read()
 
 
+# Stands in for the Redis cache response caching needs; the default
+# settings leave it disabled.
+SHARED_CACHE = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+def build_feed(count):
+    """Repeat the single Lengow order fixture ``count`` times with unique ids."""
+    feed = load_fixture("xml_full_orders_lengow.xml")
+    start = feed.index("<order>")
+    end = feed.index("</order>") + len("</order>")
+    order = feed[start:end]
+    orders = "".join(
+        order.replace("111-2222222-3333333", f"111-2222222-{index:07d}")
+        for index in range(count)
+    )
+    return feed[:start] + orders + feed[end:]
+
+
 class TestUtils(TestCase):
     def test_safe_decimal_conversion_valid(self):
         self.assertEqual(safe_decimal_conversion("10.5"), Decimal("10.5"))
@@ -62,6 +121,38 @@ class TestUtils(TestCase):
             safe_datetime_conversion("", "%Y-%m-%d", default=default_date), default_date
         )
 
+    def test_datetime_converter_matches_strptime(self):
+        samples = {
+            "%Y-%m-%d": [
+                "2023-10-05",
+                "2023-1-5",
+                "2023-02-30",
+                "2023-13-01",
+                "0000-01-01",
+                "2023-1_-01",
+                "２０２３-10-05",
+                " 2023-10-05",
+                "",
+                None,
+            ],
+            "%H:%M:%S": ["08:30:15", "8:30:15", "24:00:00", "23:59:60", "", None],
+            "%Y-%m-%d %H:%M:%S": [
+                "2023-10-05 08:30:15",
+                "2023-10-05T08:30:15",
+                "2023-10-05 8:30:15",
+                "2023-10-05 25:30:15",
+                "",
+            ],
+            "%d/%m/%Y": ["05/10/2023", "invalid"],
+        }
+        for date_format, values in samples.items():
+            convert = datetime_converter(date_format)
+            for value in values:
+                with self.subTest(date_format=date_format, value=value):
+                    self.assertEqual(
+                        convert(value), safe_datetime_conversion(value, date_format)
+                    )
+
     def test_get_str_from_element_and_xpath_element_found_with_text(self):
         element = ElementTree.fromstring(load_fixture("simple_xml_model.xml"))
         result = get_str_from_element_and_xpath(element, "child")
@@ -84,6 +175,37 @@ class TestUtils(TestCase):
         result = get_str_from_element_and_xpath(element, ".//billing_address")
         self.assertEqual(result, "014 rue de la poupée")
 
+    def test_iter_elements_from_chunks(self):
+        xml_data = load_fixture("xml_full_orders_lengow.xml").encode("windows-1252")
+        chunks = [xml_data[i : i + 100] for i in range(0, len(xml_data), 100)]
+        orders = [
+            get_str_from_element_and_xpath(element, "order_id")
+            for element in iter_elements_from_chunks(chunks, "order")
+        ]
+        self.assertEqual(orders, ["111-2222222-3333333"])
+
+
+class OrderFieldExtractorTest(TestCase):
+    def test_extract_matches_xpath_helpers(self):
+        root = ElementTree.fromstring(load_fixture("xml_full_orders_lengow.xml"))
+        order_elem = root.find(".//order")
+        self.assertEqual(
+            order_field_extractor.extract(order_elem), legacy_extract(order_elem)
+        )
+
+    def test_extract_matches_xpath_helpers_on_sparse_order(self):
+        order_elem = ElementTree.fromstring(
+            "<order><order_id>1</order_id><order_amount>abc</order_amount>"
+            "<billing_address><billing_zipcode> 75000 </billing_zipcode>"
+            "</billing_address><tracking_deliveringByMarketPlace>1"
+            "</tracking_deliveringByMarketPlace></order>"
+        )
+        values = order_field_extractor.extract(order_elem)
+        self.assertEqual(values, legacy_extract(order_elem))
+        self.assertEqual(values["billing_zipcode"], "75000")
+        self.assertEqual(values["billing_address"], "")
+        self.assertTrue(values["tracking_delivering_by_marketplace"])
+
 
 class FetchOrdersCommandTest(TestCase):
     @patch("requests.get")
@@ -132,3 +254,1104 @@ class FetchOrdersCommandTest(TestCase):
         self.assertEqual(order.tracking_delivering_by_marketplace, False)
         self.assertEqual(order.order_comments, "")
         self.assertEqual(order.customer_id, "")
+
+    @patch("requests.get")
+    def test_fetch_orders_command_stream(self, mock_get):
+        mock_response = requests.Response()
+        mock_response.status_code = 200
+        mock_response.raw = io.BytesIO(
+            load_fixture("xml_full_orders_lengow.xml").encode("windows-1252")
+        )
+        mock_get.return_value = mock_response
+
+        call_command("fetch_orders", "test", "--stream", "--chunk-size", "256")
+
+        mock_get.assert_called_once_with(
+            "test", params={}, headers={}, stream=True, timeout=60
+        )
+        self.assertEqual(Order.objects.count(), 1)
+        order = Order.objects.first()
+        self.assertEqual(order.order_id, "111-2222222-3333333")
+        self.assertEqual(order.billing_lastname, "Tom Croisière")
+        self.assertEqual(order.order_amount, Decimal("34.5"))
+
+    @patch("requests.get")
+    def test_fetch_orders_command_batches(self, mock_get):
+        mock_response = requests.Response()
+        mock_response.status_code = 200
+        mock_response._content = build_feed(5)
+        mock_get.return_value = mock_response
+
+        with self.assertLogs("orders.management.commands.fetch_orders") as logs:
+            call_command("fetch_orders", "test", "--batch-size", "2")
+
+        self.assertEqual(Order.objects.count(), 5)
+        batch_logs = [line for line in logs.output if "Wrote batch" in line]
+        self.assertEqual(len(batch_logs), 3)
+
+    @patch("requests.get")
+    def test_fetch_orders_command_shares_contacts(self, mock_get):
+        mock_response = requests.Response()
+        mock_response.status_code = 200
+        mock_response._content = build_feed(5)
+        mock_get.return_value = mock_response
+
+        call_command("fetch_orders", "test", "--batch-size", "2")
+
+        # One billing and one delivery party, whose addresses are identical.
+        self.assertEqual(Customer.objects.count(), 2)
+        self.assertEqual(Address.objects.count(), 1)
+        order = Order.objects.get(order_id="111-2222222-0000004")
+        self.assertEqual(order.billing_address, "014 rue de la poupée")
+        self.assertEqual(order.delivery_phone_home, "0605040102")
+
+    def test_contact_cache_skips_stored_contacts(self):
+        contact_cache = ContactCache()
+        contacts = [build_contact(Customer, {"lastname": "Tom"})]
+        with self.captureOnCommitCallbacks(execute=True):
+            contact_cache.save(contacts)
+        self.assertEqual(Customer.objects.get().lastname, "Tom")
+        with self.assertNumQueries(0):
+            contact_cache.save(contacts)
+
+    @patch("requests.get")
+    def test_fetch_orders_command_updates_existing_orders(self, mock_get):
+        mock_response = requests.Response()
+        mock_response.status_code = 200
+        mock_response._content = build_feed(2)
+        mock_get.return_value = mock_response
+        call_command("fetch_orders", "test")
+
+        mock_response._content = build_feed(3).replace("Tom Croisière", "Tom Updated")
+        call_command("fetch_orders", "test")
+
+        self.assertEqual(Order.objects.count(), 3)
+        self.assertEqual(
+            set(Order.objects.values_list("billing_customer__lastname", flat=True)),
+            {"Tom Updated"},
+        )
+
+    @patch("requests.get")
+    def test_fetch_orders_command_workers_match_single_process(self, mock_get):
+        mock_response = requests.Response()
+        mock_response.status_code = 200
+        mock_response._content = build_feed(5)
+        mock_get.return_value = mock_response
+
+        call_command("fetch_orders", "test")
+        single_process = list(Order.objects.order_by("order_id").values())
+        Order.objects.all().delete()
+
+        call_command("fetch_orders", "test", "--workers", "2")
+        self.assertEqual(
+            list(Order.objects.order_by("order_id").values()), single_process
+        )
+
+    @patch("requests.get")
+    def test_fetch_orders_command_incremental_skips_unchanged(self, mock_get):
+        mock_response = requests.Response()
+        mock_response.status_code = 200
+        mock_response._content = build_feed(3)
+        mock_get.return_value = mock_response
+        call_command("fetch_orders", "test")
+
+        mock_response._content = build_feed(3).replace(
+            "<order_amount><![CDATA[34.5]]></order_amount>",
+            "<order_amount><![CDATA[40.0]]></order_amount>",
+            1,
+        )
+        with self.assertLogs("orders.management.commands.fetch_orders") as logs:
+            call_command("fetch_orders", "test", "--incremental")
+
+        self.assertIn("1 orders (2 unchanged)", "\n".join(logs.output))
+        self.assertEqual(
+            Order.objects.get(order_id="111-2222222-0000000").order_amount,
+            Decimal("40.0"),
+        )
+
+    @patch("requests.get")
+    def test_fetch_orders_command_date_window(self, mock_get):
+        mock_response = requests.Response()
+        mock_response.status_code = 200
+        mock_response._content = build_feed(1)
+        mock_get.return_value = mock_response
+
+        call_command("fetch_orders", "test", "--date-from", "2024-01-01")
+
+        mock_get.assert_called_once_with(
+            "test",
+            params={"date_from": "2024-01-01"},
+            headers={},
+            stream=False,
+            timeout=60,
+        )
+
+    @patch("requests.get")
+    def test_fetch_orders_command_saves_lines(self, mock_get):
+        mock_response = requests.Response()
+        mock_response.status_code = 200
+        mock_response._content = load_fixture("xml_full_orders_lengow.xml")
+        mock_get.return_value = mock_response
+
+        call_command("fetch_orders", "test")
+        call_command("fetch_orders", "test")
+
+        self.assertEqual(OrderLine.objects.count(), 1)
+        line = OrderLine.objects.get()
+        self.assertEqual(line.order_id, "111-2222222-3333333")
+        self.assertEqual(line.sku, "11_12")
+        self.assertEqual(line.title, "T-Shirt  col rond")
+        self.assertEqual(line.category, "Vetements Femmes > Tee-shirts")
+        self.assertEqual(line.quantity, 1)
+        self.assertEqual(line.price_unit, Decimal("29.0"))
+        self.assertEqual(line.order_lineid, "")
+
+
+@override_settings(CACHES=SHARED_CACHE)
+class OrderApiTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("api", password="secret")
+        with patch("requests.get") as mock_get:
+            mock_response = requests.Response()
+            mock_response.status_code = 200
+            mock_response._content = build_feed(3)
+            mock_get.return_value = mock_response
+            call_command("fetch_orders", "test")
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_list_requires_authentication(self):
+        response = APIClient().get(reverse("order_list"))
+        self.assertIn(response.status_code, (401, 403))
+
+    def test_list_uses_compact_representation(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("order_list"))
+        self.assertEqual(response.status_code, 200)
+        results = response.data["results"]
+        self.assertEqual(len(results), 3)
+        self.assertEqual(set(results[0]), set(OrderListSerializer.Meta.fields))
+
+    def test_list_sparse_fieldset(self):
+        response = self.client.get(
+            reverse("order_list"), {"fields": "order_id,order_amount"}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.data["results"][0],
+            {"order_id": "111-2222222-0000000", "order_amount": "34.50"},
+        )
+
+    def test_list_sparse_fieldset_rejects_unknown_fields(self):
+        response = self.client.get(
+            reverse("order_list"), {"fields": "order_id,content_hash"}
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_list_includes_lines_without_n_plus_one(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(
+                reverse("order_list"), {"fields": "order_id,lines"}
+            )
+        self.assertEqual(response.status_code, 200)
+        results = response.data["results"]
+        self.assertEqual(len(results), 3)
+        self.assertEqual(results[0]["lines"][0]["sku"], "11_12")
+
+    def test_detail(self):
+        response = self.client.get(reverse("order_by_id", args=["111-2222222-0000001"]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["marketplace"], "amazon")
+        self.assertEqual(len(response.data["lines"]), 1)
+
+    def test_list_filters(self):
+        url = reverse("order_list")
+        for params, expected in (
+            ({"marketplace": "amazon"}, 3),
+            ({"marketplace": "fnac"}, 0),
+            ({"order_status_lengow": "processing"}, 3),
+            ({"billing_email": "web1n0r@marketplace.amazon.fr"}, 3),
+            ({"order_purchase_date": "2014-10-21"}, 3),
+            ({"order_purchase_date_from": "2014-10-22"}, 0),
+            ({"marketplace": "amazon", "order_purchase_date_to": "2014-10-21"}, 3),
+        ):
+            with self.subTest(params=params):
+                response = self.client.get(url, params)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.data["results"]), expected)
+
+    def test_list_filters_reject_invalid_date(self):
+        response = self.client.get(
+            reverse("order_list"), {"order_purchase_date_from": "yesterday"}
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def walk_pages(self, page_size):
+        order_ids = []
+        url = reverse("order_list") + f"?page_size={page_size}"
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            order_ids += [order["order_id"] for order in response.data["results"]]
+            url = response.data["next"]
+        return order_ids
+
+    def test_list_keyset_pagination(self):
+        self.assertEqual(
+            self.walk_pages(2),
+            ["111-2222222-0000000", "111-2222222-0000001", "111-2222222-0000002"],
+        )
+
+    def test_list_keyset_pagination_with_null_dates(self):
+        Order.objects.filter(order_id="111-2222222-0000001").update(
+            order_purchase_date=None
+        )
+        order_ids = self.walk_pages(1)
+        self.assertEqual(len(order_ids), 3)
+        self.assertEqual(
+            set(order_ids), set(Order.objects.values_list("pk", flat=True))
+        )
+
+    def test_list_invalid_cursor(self):
+        response = self.client.get(reverse("order_list"), {"cursor": "garbage"})
+        self.assertEqual(response.status_code, 404)
+
+    def test_export_ndjson(self):
+        response = self.client.get(reverse("order_export"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        rows = [
+            json.loads(line)
+            for line in b"".join(response.streaming_content).decode().splitlines()
+        ]
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[0]["billing_lastname"], "Tom Croisière")
+        self.assertEqual(rows[0]["order_amount"], "34.50")
+        self.assertNotIn("content_hash", rows[0])
+
+    def test_export_csv_with_filters(self):
+        response = self.client.get(
+            reverse("order_export"), {"output": "csv", "marketplace": "amazon"}
+        )
+        self.assertEqual(response.status_code, 200)
+        rows = list(
+            csv.reader(b"".join(response.streaming_content).decode().splitlines())
+        )
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[0][0], "marketplace")
+
+        response = self.client.get(
+            reverse("order_export"), {"output": "csv", "marketplace": "fnac"}
+        )
+        self.assertEqual(len(b"".join(response.streaming_content).splitlines()), 1)
+
+    def test_export_rejects_unknown_output(self):
+        response = self.client.get(reverse("order_export"), {"output": "xlsx"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_detail_is_cached_with_etag(self):
+        url = reverse("order_by_id", args=["111-2222222-0000001"])
+        response = self.client.get(url)
+        etag = response["ETag"]
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["order_id"], "111-2222222-0000001")
+
+    def test_update_invalidates_cached_detail_and_list(self):
+        detail_url = reverse("order_by_id", args=["111-2222222-0000001"])
+        list_url = reverse("order_list")
+        etag = self.client.get(detail_url)["ETag"]
+        self.client.get(list_url)
+
+        response = self.client.patch(
+            detail_url, {"tracking_number": "TRACK-1"}, format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get(detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["tracking_number"], "TRACK-1")
+        response = self.client.get(list_url)
+        self.assertEqual(response.data["results"][1]["tracking_number"], "TRACK-1")
+
+    def test_update_contact_field_leaves_shared_contacts(self):
+        url = reverse("order_by_id", args=["111-2222222-0000001"])
+        other = Order.objects.get(order_id="111-2222222-0000002")
+
+        response = self.client.patch(url, {"billing_city": "Lyon"}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["billing_city"], "Lyon")
+        self.assertEqual(response.data["billing_address"], "014 rue de la poupée")
+
+        order = Order.objects.get(order_id="111-2222222-0000001")
+        other.refresh_from_db()
+        self.assertEqual(other.billing_city, "Paris")
+        self.assertNotEqual(order.billing_location_id, other.billing_location_id)
+        self.assertEqual(order.billing_customer_id, other.billing_customer_id)
+
+    def test_ingestion_invalidates_cached_detail(self):
+        # The callbacks also remember contacts the test rollback discards.
+        self.addCleanup(contact_cache.clear)
+        url = reverse("order_by_id", args=["111-2222222-0000001"])
+        self.client.get(url)
+
+        with patch("requests.get") as mock_get:
+            mock_response = requests.Response()
+            mock_response.status_code = 200
+            mock_response._content = build_feed(3).replace("Paris", "Lyon")
+            mock_get.return_value = mock_response
+            with self.captureOnCommitCallbacks() as callbacks:
+                call_command("fetch_orders", "test")
+
+        # The cached copy stays until the ingest transaction commits.
+        self.assertEqual(self.client.get(url).data["billing_city"], "Paris")
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.client.get(url).data["billing_city"], "Lyon")
+
+    def test_metrics_disabled_by_default(self):
+        response = self.client.get(reverse("order_metrics"))
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(ORDERS_METRICS_ENABLED=True)
+    def test_metrics_endpoint(self):
+        registry.reset()
+        self.client.get(reverse("order_list"))
+        self.client.get(reverse("order_list"))
+
+        response = self.client.get(reverse("order_metrics"))
+        self.assertEqual(response.status_code, 200)
+        metrics = response.content.decode()
+        self.assertIn(
+            'orders_http_requests_total{view="order_list",method="GET",status="200"} 2',
+            metrics,
+        )
+        self.assertIn(
+            'orders_db_queries_per_request_bucket{view="order_list",method="GET",'
+            'le="1"} 2',
+            metrics,
+        )
+        self.assertIn(
+            'orders_http_request_duration_seconds_count{view="order_list",'
+            'method="GET"} 2',
+            metrics,
+        )
+        self.assertNotIn('view="order_metrics"', metrics)
+
+    def test_aggregates(self):
+        response = self.client.get(reverse("order_aggregates"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.data,
+            [
+                {
+                    "marketplace": "amazon",
+                    "order_currency": "EUR",
+                    "order_purchase_date": "2014-10-21",
+                    "order_count": 3,
+                    "order_amount": "103.50",
+                    "order_tax": "0.00",
+                    "order_shipping": "16.50",
+                    "order_commission": "0.00",
+                    "order_processing_fee": "0.00",
+                }
+            ],
+        )
+        response = self.client.get(
+            reverse("order_aggregates"), {"order_purchase_date_from": "2015-01-01"}
+        )
+        self.assertEqual(response.data, [])
+
+    def test_ingestion_refreshes_affected_rollups(self):
+        feed = build_feed(3).replace(
+            "<order_purchase_date><![CDATA[2014-10-21]]>",
+            "<order_purchase_date><![CDATA[2014-10-22]]>",
+            1,
+        )
+        with patch("requests.get") as mock_get:
+            mock_response = requests.Response()
+            mock_response.status_code = 200
+            mock_response._content = feed
+            mock_get.return_value = mock_response
+            call_command("fetch_orders", "test")
+
+        rollups = dict(
+            DailySalesRollup.objects.values_list("order_purchase_date", "order_count")
+        )
+        self.assertEqual(rollups, {date(2014, 10, 21): 2, date(2014, 10, 22): 1})
+
+        def rollup_rows():
+            return list(
+                DailySalesRollup.objects.order_by("order_purchase_date").values(
+                    "order_purchase_date", "order_count", "order_amount"
+                )
+            )
+
+        incremental = rollup_rows()
+        call_command("rebuild_sales_rollups", stdout=io.StringIO())
+        self.assertEqual(rollup_rows(), incremental)
+
+    def test_destroy_refreshes_rollups(self):
+        response = self.client.delete(
+            reverse("order_by_id", args=["111-2222222-0000001"])
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(DailySalesRollup.objects.get().order_count, 2)
+
+    def test_list_search(self):
+        def search(term):
+            response = self.client.get(reverse("order_list"), {"q": term})
+            self.assertEqual(response.status_code, 200)
+            return [order["order_id"] for order in response.data["results"]]
+
+        self.assertEqual(len(search("CROISIÈ")), 3)
+        self.assertEqual(len(search("060504")), 3)
+        self.assertEqual(len(search("@marketplace.amazon")), 3)
+        self.assertEqual(len(search("ro")), 3)
+        self.assertEqual(search("nobody"), [])
+
+        self.client.patch(
+            reverse("order_by_id", args=["111-2222222-0000001"]),
+            {"tracking_number": "1Z999AA10123456784"},
+            format="json",
+        )
+        self.assertEqual(search("a1012345"), ["111-2222222-0000001"])
+
+    def test_ingestion_updates_search_index(self):
+        feed = build_feed(3).replace("Tom Croisière", "Jeanne Martin", 1)
+        with patch("requests.get") as mock_get:
+            mock_response = requests.Response()
+            mock_response.status_code = 200
+            mock_response._content = feed
+            mock_get.return_value = mock_response
+            call_command("fetch_orders", "test")
+
+        response = self.client.get(reverse("order_list"), {"q": "jeanne mar"})
+        self.assertEqual(
+            [order["order_id"] for order in response.data["results"]],
+            ["111-2222222-0000000"],
+        )
+        response = self.client.get(reverse("order_list"), {"q": "croisière"})
+        self.assertEqual(len(response.data["results"]), 2)
+
+    def test_bulk_update(self):
+        detail_url = reverse("order_by_id", args=["111-2222222-0000001"])
+        etag = self.client.get(detail_url)["ETag"]
+        payload = [
+            {
+                "order_id": "111-2222222-0000001",
+                "tracking_number": "TRACK-1",
+                "tracking_carrier": "UPS",
+            },
+            {"order_id": "111-2222222-0000002", "order_status_lengow": "shipped"},
+            {"order_id": "111-2222222-0000002", "tracking_number": "TRACK-2"},
+            {"order_id": "unknown", "tracking_number": "TRACK-3"},
+            {"order_id": "111-2222222-0000000"},
+            {"order_id": "111-2222222-0000000", "tracking_shipped_date": "nope"},
+        ]
+
+        # In a savepoint: one locking existence check, then one UPDATE per
+        # field group and the search reindex of the new tracking number.
+        with self.assertNumQueries(8):
+            response = self.client.post(
+                reverse("order_bulk_update"), payload, format="json"
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["updated"], 2)
+        self.assertEqual(
+            [result["status"] for result in response.data["results"]],
+            ["updated", "updated", "invalid", "not_found", "invalid", "invalid"],
+        )
+        self.assertIn("tracking_shipped_date", response.data["results"][5]["errors"])
+
+        order = Order.objects.get(order_id="111-2222222-0000001")
+        self.assertEqual(
+            (order.tracking_number, order.tracking_carrier), ("TRACK-1", "UPS")
+        )
+        order = Order.objects.get(order_id="111-2222222-0000002")
+        self.assertEqual(order.order_status_lengow, "shipped")
+        self.assertNotEqual(order.tracking_number, "TRACK-2")
+
+        response = self.client.get(detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["tracking_number"], "TRACK-1")
+
+    def test_bulk_update_rejects_non_list(self):
+        response = self.client.post(
+            reverse("order_bulk_update"), {"order_id": "x"}, format="json"
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class FetchOrdersMultiFeedTest(TestCase):
+    def feed_response(self, content):
+        response = requests.Response()
+        response.status_code = 200
+        response.raw = io.BytesIO(content.encode("windows-1252"))
+        return response
+
+    @patch("requests.Session.get")
+    def test_fetch_orders_command_multiple_feeds(self, mock_get):
+        responses = {
+            "http://feed/1": self.feed_response(build_feed(2)),
+            "http://feed/2": self.feed_response(
+                build_feed(5).replace("111-2222222-", "222-2222222-")
+            ),
+        }
+
+        def get(url, **kwargs):
+            if url == "http://feed/3":
+                raise requests.ConnectionError("unreachable")
+            return responses[url]
+
+        mock_get.side_effect = get
+        with tempfile.NamedTemporaryFile("w", suffix=".json") as feeds_file:
+            json.dump(
+                ["http://feed/2", {"url": "http://feed/3", "timeout": 5}],
+                feeds_file,
+            )
+            feeds_file.flush()
+            with self.assertLogs("orders.management.commands.fetch_orders") as logs:
+                call_command(
+                    "fetch_orders", "http://feed/1", "--feeds-file", feeds_file.name
+                )
+
+        self.assertEqual(Order.objects.count(), 7)
+        self.assertIn("Failed to fetch http://feed/3", "\n".join(logs.output))
+        timeouts = {
+            call.args[0]: call.kwargs["timeout"] for call in mock_get.mock_calls
+        }
+        self.assertEqual(
+            timeouts, {"http://feed/1": 60, "http://feed/2": 60, "http://feed/3": 5}
+        )
+
+
+class FetchOrdersFeedCacheTest(TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.cache_dir.cleanup)
+
+    @patch("requests.get")
+    def test_conditional_fetch_and_replay(self, mock_get):
+        mock_response = requests.Response()
+        mock_response.status_code = 200
+        mock_response.headers["ETag"] = '"v1"'
+        mock_response.raw = io.BytesIO(build_feed(3).encode("windows-1252"))
+        mock_get.return_value = mock_response
+        call_command(
+            "fetch_orders", "test", "--stream", "--cache-dir", self.cache_dir.name
+        )
+        self.assertEqual(Order.objects.count(), 3)
+
+        not_modified = requests.Response()
+        not_modified.status_code = 304
+        not_modified.raw = io.BytesIO(b"")
+        mock_get.return_value = not_modified
+        Order.objects.all().delete()
+        with self.assertLogs("orders.management.commands.fetch_orders") as logs:
+            call_command("fetch_orders", "test", "--cache-dir", self.cache_dir.name)
+        self.assertEqual(
+            mock_get.call_args.kwargs["headers"], {"If-None-Match": '"v1"'}
+        )
+        self.assertIn("not modified", "\n".join(logs.output))
+        self.assertEqual(Order.objects.count(), 0)
+
+        mock_get.reset_mock()
+        call_command(
+            "fetch_orders", "test", "--from-cache", "--cache-dir", self.cache_dir.name
+        )
+        mock_get.assert_not_called()
+        self.assertEqual(Order.objects.count(), 3)
+        self.assertEqual(Order.objects.first().billing_lastname, "Tom Croisière")
+
+    @patch("requests.get")
+    def test_resume_refetches_interrupted_feed(self, mock_get):
+        def get(url, headers, **kwargs):
+            response = requests.Response()
+            if headers.get("If-None-Match") == '"v1"':
+                response.status_code = 304
+                response.raw = io.BytesIO(b"")
+            else:
+                response.status_code = 200
+                response.headers["ETag"] = '"v1"'
+                response.raw = io.BytesIO(build_feed(3).encode("windows-1252"))
+            return response
+
+        def fail_third_batch(batch, *args):
+            if batch[0][0]["order_id"] == "111-2222222-0000002":
+                raise DatabaseError("connection lost")
+            return save_order_batch(batch, *args)
+
+        mock_get.side_effect = get
+        options = ["--batch-size", "1", "--cache-dir", self.cache_dir.name]
+        with patch(
+            "orders.management.commands.fetch_orders.save_order_batch",
+            side_effect=fail_third_batch,
+        ):
+            call_command("fetch_orders", "test", *options)
+        self.assertEqual(Order.objects.count(), 2)
+
+        call_command("fetch_orders", "test", "--resume", *options)
+        self.assertEqual(mock_get.call_args.kwargs["headers"], {})
+        self.assertEqual(Order.objects.count(), 3)
+        self.assertFalse(IngestCheckpoint.objects.exists())
+
+        call_command("fetch_orders", "test", *options)
+        self.assertEqual(
+            mock_get.call_args.kwargs["headers"], {"If-None-Match": '"v1"'}
+        )
+
+
+class FetchOrdersStatsTest(TestCase):
+    @patch("requests.get")
+    def test_stats_json_and_profile(self, mock_get):
+        content = build_feed(3).encode("windows-1252")
+        mock_response = requests.Response()
+        mock_response.status_code = 200
+        mock_response.raw = io.BytesIO(content)
+        mock_get.return_value = mock_response
+
+        with tempfile.TemporaryDirectory() as directory:
+            stats_path = os.path.join(directory, "stats.json")
+            profile_path = os.path.join(directory, "fetch.prof")
+            with self.assertLogs("orders.management.commands.fetch_orders") as logs:
+                call_command(
+                    "fetch_orders",
+                    "test",
+                    "--stream",
+                    "--stats-json",
+                    stats_path,
+                    "--profile",
+                    profile_path,
+                )
+            with open(stats_path, encoding="utf-8") as file:
+                stats = json.load(file)
+            self.assertTrue(pstats.Stats(profile_path).total_calls)
+
+        self.assertEqual(stats["orders"], 3)
+        self.assertEqual(stats["batches"], 1)
+        self.assertEqual(stats["download_bytes"], len(content))
+        self.assertGreater(stats["peak_rss_bytes"], 0)
+        for stage in ("download", "parse", "conversion", "db", "total"):
+            self.assertGreaterEqual(stats[f"{stage}_seconds"], 0)
+        self.assertFalse([line for line in logs.output if "parsed order" in line])
+        self.assertIn("Saved 3 orders", logs.output[-1])
+
+
+class FetchOrdersRejectionTest(TestCase):
+    def setUp(self):
+        patcher = patch("requests.get")
+        mock_get = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.mock_response = requests.Response()
+        self.mock_response.status_code = 200
+        self.mock_response._content = build_feed(3)
+        mock_get.return_value = self.mock_response
+
+    def test_extraction_failure_rejects_only_that_order(self):
+        def extract_lines(order_elem):
+            if order_elem.findtext("order_id") == "111-2222222-0000001":
+                raise ValueError("broken cart")
+            return extract_order_lines(order_elem)
+
+        with patch("orders.ingestion.extract_order_lines", side_effect=extract_lines):
+            call_command("fetch_orders", "test")
+
+        self.assertEqual(
+            list(Order.objects.order_by("order_id").values_list("order_id", flat=True)),
+            ["111-2222222-0000000", "111-2222222-0000002"],
+        )
+        rejected = RejectedOrder.objects.get()
+        self.assertEqual(rejected.order_id, "111-2222222-0000001")
+        self.assertEqual(rejected.stage, RejectedOrder.EXTRACTION)
+        self.assertEqual(rejected.reason, "broken cart")
+        self.assertEqual(rejected.feed, "test")
+        self.assertTrue(rejected.raw.startswith("<order>"))
+
+    def test_database_failure_rejects_only_that_order(self):
+        call_command("fetch_orders", "test")
+        # A new order id reusing the marketplace id of an existing order.
+        self.mock_response._content = build_feed(3).replace(
+            "<order_id><![CDATA[111-2222222-0000001]]></order_id>",
+            "<order_id><![CDATA[999-2222222-0000001]]></order_id>",
+        )
+        with self.assertLogs("orders.management.commands.fetch_orders") as logs:
+            call_command("fetch_orders", "test")
+
+        self.assertIn("Saved 2 orders (0 unchanged), 1 rejected", logs.output[-1])
+        self.assertFalse(Order.objects.filter(order_id="999-2222222-0000001").exists())
+        rejected = RejectedOrder.objects.get()
+        self.assertEqual(rejected.order_id, "999-2222222-0000001")
+        self.assertEqual(rejected.stage, RejectedOrder.DATABASE)
+        self.assertEqual(
+            ElementTree.fromstring(rejected.raw).findtext("order_id"),
+            "999-2222222-0000001",
+        )
+
+    def test_resume_after_interrupted_run(self):
+        def fail_third_batch(batch, *args):
+            if batch[0][0]["order_id"] == "111-2222222-0000002":
+                raise DatabaseError("connection lost")
+            return save_order_batch(batch, *args)
+
+        with patch(
+            "orders.management.commands.fetch_orders.save_order_batch",
+            side_effect=fail_third_batch,
+        ):
+            call_command("fetch_orders", "test", "--batch-size", "1")
+        self.assertEqual(Order.objects.count(), 2)
+        self.assertEqual(IngestCheckpoint.objects.get(feed="test").position, 2)
+
+        with self.assertLogs("orders.management.commands.fetch_orders") as logs:
+            call_command("fetch_orders", "test", "--batch-size", "1", "--resume")
+        self.assertIn("Resuming test after 2 orders", logs.output[1])
+        self.assertIn("Saved 1 orders", logs.output[-1])
+        self.assertEqual(Order.objects.count(), 3)
+        self.assertFalse(IngestCheckpoint.objects.exists())
+
+
+@skipUnless(can_copy(), "COPY needs PostgreSQL with psycopg 3")
+class CopyIngestionTest(TestCase):
+    def test_copy_upsert_orders_and_lines(self):
+        root = ElementTree.fromstring(build_feed(2))
+        order_values = [
+            values for values, _ in extract_order_values(root.iterfind(".//order"))
+        ]
+        with (
+            patch(
+                "orders.ingestion.copy_upsert_orders", wraps=copy_upsert_orders
+            ) as upsert,
+            patch("orders.ingestion.copy_insert", wraps=copy_insert) as insert,
+        ):
+            bulk_upsert_orders(order_values)
+            order_values[0]["order_status_lengow"] = "shipped"
+            order_values[0]["billing_city"] = "Lyon"
+            bulk_upsert_orders(order_values)
+
+        self.assertEqual((upsert.call_count, insert.call_count), (2, 2))
+        self.assertEqual(Order.objects.count(), 2)
+        self.assertEqual(
+            OrderLine.objects.count(),
+            sum(len(values["lines"]) for values in order_values),
+        )
+        order = Order.objects.get(order_id=order_values[0]["order_id"])
+        self.assertEqual(order.order_status_lengow, "shipped")
+        self.assertEqual(order.billing_city, "Lyon")
+
+
+class FeedGeneratorTest(TestCase):
+    def fetch(self, content, *args):
+        with patch("requests.get") as mock_get:
+            mock_response = requests.Response()
+            mock_response.status_code = 200
+            mock_response._content = content
+            mock_get.return_value = mock_response
+            with self.assertLogs("orders.management.commands.fetch_orders") as logs:
+                call_command("fetch_orders", "test", *args)
+        return logs.output[-1]
+
+    def test_feed_is_deterministic(self):
+        feed = b"".join(iter_feed(5))
+        self.assertEqual(b"".join(iter_feed(5)), feed)
+        self.assertNotEqual(b"".join(iter_feed(5, seed=1)), feed)
+        self.assertEqual(b"".join(iter_feed(5, revision=1, change_rate=0)), feed)
+
+    def test_generated_feed_is_ingested(self):
+        feed = b"".join(iter_feed(20))
+        root = ElementTree.fromstring(feed)
+        self.fetch(feed)
+
+        self.assertEqual(Order.objects.count(), 20)
+        self.assertEqual(OrderLine.objects.count(), len(root.findall(".//product")))
+        order = Order.objects.get(order_id=root.findtext(".//order_id"))
+        self.assertEqual(
+            order.order_amount,
+            sum(line.price for line in order.lines.all()) + order.order_shipping,
+        )
+
+        summary = self.fetch(
+            b"".join(iter_feed(20, revision=1, change_rate=1)), "--incremental"
+        )
+        self.assertIn("Saved 20 orders (0 unchanged)", summary)
+        self.assertEqual(
+            set(Order.objects.values_list("order_status_lengow", flat=True)),
+            {"shipped"},
+        )
+
+    def test_compare_to_baseline(self):
+        baseline = {
+            "ingest": {"per_second": 1000.0, "peak_rss_bytes": 100},
+            "api_list": {"per_second": 100.0, "p99_ms": 10.0},
+        }
+        results = {
+            "ingest": {"per_second": 850.0, "peak_rss_bytes": 130},
+            "api_list": {"per_second": 120.0, "p99_ms": 12.5},
+            "api_search": {"per_second": 1.0},
+        }
+        self.assertEqual(
+            compare_to_baseline(results, baseline, tolerance=0.2),
+            ["ingest peak_rss_bytes: 100 -> 130", "api_list p99_ms: 10 -> 12.5"],
+        )
+
+
+@override_settings(CACHES=SHARED_CACHE)
+class AsyncOrderApiTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("api", password="secret")
+        cls.token = Token.objects.create(user=cls.user)
+        with patch("requests.get") as mock_get:
+            mock_response = requests.Response()
+            mock_response.status_code = 200
+            mock_response._content = build_feed(3)
+            mock_get.return_value = mock_response
+            call_command("fetch_orders", "test")
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get_async(self, name, *args, params=None, authenticated=True, **headers):
+        """GET an async view, returning the response and its full body."""
+        if authenticated:
+            headers["Authorization"] = f"Token {self.token.key}"
+
+        async def get():
+            response = await self.async_client.get(
+                reverse(name, args=args), params or {}, headers=headers
+            )
+            if not response.streaming:
+                return response, response.content
+            body = b"".join([chunk async for chunk in response.streaming_content])
+            return response, body
+
+        return async_to_sync(get)()
+
+    def test_requires_authentication(self):
+        expected = APIClient().get(reverse("order_list"))
+        response, _ = self.get_async("order_list_async", authenticated=False)
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(response.status_code, 403)
+        response, _ = self.get_async(
+            "order_list_async", authenticated=False, Authorization="Token nope"
+        )
+        self.assertEqual(response.status_code, 403)
+
+    def test_accepts_session_like_sync_view(self):
+        self.async_client.force_login(self.user)
+        response, body = self.get_async("order_list_async", authenticated=False)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(json.loads(body)["results"]), 3)
+
+    def test_list_matches_sync_view(self):
+        params = {"page_size": 2, "marketplace": "amazon"}
+        expected = self.client.get(reverse("order_list"), params).data
+        response, body = self.get_async("order_list_async", params=params)
+        self.assertEqual(response.status_code, 200)
+        page = json.loads(body)
+        self.assertEqual(page["results"], json.loads(json.dumps(expected["results"])))
+
+        cursor = parse_qs(urlsplit(page["next"]).query)["cursor"][0]
+        response, body = self.get_async(
+            "order_list_async", params={**params, "cursor": cursor}
+        )
+        page = json.loads(body)
+        self.assertEqual(
+            [order["order_id"] for order in page["results"]], ["111-2222222-0000002"]
+        )
+        self.assertIsNone(page["next"])
+
+    def test_list_errors(self):
+        response, body = self.get_async(
+            "order_list_async", params={"order_purchase_date_from": "nope"}
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("order_purchase_date_from", json.loads(body))
+        response, _ = self.get_async("order_list_async", params={"cursor": "nope"})
+        self.assertEqual(response.status_code, 404)
+
+    def test_detail_shares_cache_with_sync_view(self):
+        expected = self.client.get(reverse("order_by_id", args=["111-2222222-0000001"]))
+        response, body = self.get_async("order_by_id_async", "111-2222222-0000001")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(body), json.loads(json.dumps(expected.data)))
+        self.assertEqual(response["ETag"], expected["ETag"])
+
+        response, _ = self.get_async(
+            "order_by_id_async",
+            "111-2222222-0000001",
+            If_None_Match=expected["ETag"],
+        )
+        self.assertEqual(response.status_code, 304)
+        response, _ = self.get_async("order_by_id_async", "unknown")
+        self.assertEqual(response.status_code, 404)
+
+    def test_export(self):
+        response, body = self.get_async(
+            "order_export_async", params={"output": "csv", "q": "croisière"}
+        )
+        self.assertEqual(response.status_code, 200)
+        rows = list(csv.reader(io.StringIO(body.decode())))
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[0][0], "marketplace")
+
+    @override_settings(ORDERS_METRICS_ENABLED=True)
+    def test_metrics_count_queries_of_asgi_requests(self):
+        registry.reset()
+        self.get_async("order_list_async")
+        self.get_async("order_list")
+
+        metrics = registry.render()
+        for view in ("order_list_async", "order_list"):
+            self.assertIn(
+                f'orders_db_queries_per_request_bucket{{view="{view}",method="GET",'
+                'le="0"} 0',
+                metrics,
+            )
+            self.assertIn(
+                f'orders_db_queries_per_request_count{{view="{view}",method="GET"}} 1',
+                metrics,
+            )
+
+    def test_sync_export_streams_asynchronously_under_asgi(self):
+        expected = self.client.get(reverse("order_export"))
+        self.assertFalse(expected.is_async)
+        response, body = self.get_async("order_export")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        self.assertEqual(body, b"".join(expected.streaming_content))
+
+
+@override_settings(CACHES=SHARED_CACHE)
+class OrderArchiveTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("api", password="secret")
+        with patch("requests.get") as mock_get:
+            mock_response = requests.Response()
+            mock_response.status_code = 200
+            mock_response._content = build_feed(3)
+            mock_get.return_value = mock_response
+            call_command("fetch_orders", "test")
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.archive_dir = directory.name
+
+    def test_archive_moves_old_orders_and_detail_falls_back(self):
+        url = reverse("order_by_id", args=["111-2222222-0000001"])
+        expected = self.client.get(url)
+        rollups = list(DailySalesRollup.objects.values())
+
+        with override_settings(ORDERS_ARCHIVE_DIR=self.archive_dir):
+            with self.captureOnCommitCallbacks(execute=True):
+                call_command(
+                    "archive_orders", "--before", "2014-10-22", stdout=io.StringIO()
+                )
+            call_command("rebuild_sales_rollups", stdout=io.StringIO())
+            response = self.client.get(url)
+            missing = self.client.get(reverse("order_by_id", args=["unknown"]))
+
+        self.assertEqual(Order.objects.count(), 0)
+        self.assertEqual(list(DailySalesRollup.objects.values()), rollups)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, json.loads(json.dumps(expected.data)))
+        self.assertEqual(response["ETag"], expected["ETag"])
+        self.assertEqual(missing.status_code, 404)
+
+    def test_changes_on_archived_days_keep_archived_totals(self):
+        call_command(
+            "archive_orders",
+            "--before",
+            "2014-10-22",
+            "--archive-dir",
+            self.archive_dir,
+            stdout=io.StringIO(),
+        )
+        url = reverse("order_by_id", args=["111-2222222-0000000"])
+
+        def rollup():
+            return DailySalesRollup.objects.values_list(
+                "order_count", "order_amount"
+            ).get()
+
+        self.assertEqual(rollup(), (3, Decimal("103.50")))
+        with override_settings(ORDERS_ARCHIVE_DIR=self.archive_dir):
+
+            def feed_response(*args, **kwargs):
+                mock_response = requests.Response()
+                mock_response.status_code = 200
+                mock_response._content = build_feed(1).replace(
+                    "<order_amount><![CDATA[34.5]]>", "<order_amount><![CDATA[40.5]]>"
+                )
+                return mock_response
+
+            with patch("requests.get", side_effect=feed_response):
+                # A plain re-fetch leaves archived orders in the archive.
+                with self.assertLogs("orders", level="INFO") as logs:
+                    call_command("fetch_orders", "test")
+                self.assertIn("0 rejected, 1 archived", logs.output[-1])
+                self.assertFalse(Order.objects.exists())
+                self.assertEqual(rollup(), (3, Decimal("103.50")))
+
+                call_command("fetch_orders", "--restore-archived", "test")
+            self.assertEqual(rollup(), (3, Decimal("109.50")))
+
+            response = self.client.patch(url, {"order_amount": "50.50"}, format="json")
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(rollup(), (3, Decimal("119.50")))
+
+            # Deleting the stored copy brings the archived one back.
+            response = self.client.delete(url)
+            self.assertEqual(response.status_code, 204)
+            self.assertEqual(rollup(), (3, Decimal("103.50")))
+
+    def test_lookup_opens_only_the_segment_holding_the_order(self):
+        call_command(
+            "archive_orders",
+            "--before",
+            "2015-01-01",
+            "--archive-dir",
+            self.archive_dir,
+            "--segment-size",
+            "2",
+            stdout=io.StringIO(),
+        )
+        archive = OrderArchive(self.archive_dir)
+        self.assertEqual([entry["rows"] for entry in archive.segments()], [2, 1])
+        self.assertEqual(archive.archived_until(), date(2014, 10, 21))
+
+        with patch("orders.archive.gzip.open", wraps=gzip.open) as opened:
+            self.assertEqual(
+                archive.find("111-2222222-0000002")["order_id"], "111-2222222-0000002"
+            )
+            self.assertIsNone(archive.find("999-0000000-0000000"))
+            self.assertIsNone(archive.find("111-2222222-00000015"))
+            self.assertNotIn("111-2222222-00000015", archive)
+        self.assertEqual(opened.call_count, 1)
+
+        # Indexes written before they listed order_ids still resolve them.
+        index = json.loads(archive.index_path.read_text())
+        for entry in index:
+            del entry["order_ids"]
+        archive.index_path.write_text(json.dumps(index))
+        legacy = OrderArchive(self.archive_dir)
+        self.assertIn("111-2222222-0000002", legacy)
+        self.assertEqual(
+            legacy.find("111-2222222-0000000")["order_id"], "111-2222222-0000000"
+        )
@@ -1,8 +1,19 @@
 from django.urls import path
 
-from . import views
+from . import async_views, views
 
 urlpatterns = [
     path("", views.OrderListView.as_view(), name="order_list"),
+    path("export/", views.OrderExportView.as_view(), name="order_export"),
+    path("bulk-update/", views.OrderBulkUpdateView.as_view(), name="order_bulk_update"),
+    path("aggregates/", views.SalesAggregatesView.as_view(), name="order_aggregates"),
+    path("metrics/", views.OrderMetricsView.as_view(), name="order_metrics"),
+    path("async/", async_views.order_list, name="order_list_async"),
+    path("async/export/", async_views.order_export, name="order_export_async"),
+    path(
+        "async/<str:order_id>/",
+        async_views.order_detail,
+        name="order_by_id_async",
+    ),
     path("<str:order_id>/", views.OrderDetailView.as_view(), name="order_by_id"),
 ]
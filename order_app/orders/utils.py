@@ -1,9 +1,12 @@
 from datetime import datetime
 from decimal import Decimal, InvalidOperation
+from functools import lru_cache, partial
 from xml.etree import ElementTree
 
 
 def safe_decimal_conversion(value):
+    if value is None or value == "":
+        return None
     try:
         return Decimal(value)
     except (InvalidOperation, TypeError, ValueError):
@@ -17,9 +20,111 @@ def safe_datetime_conversion(value, date_format, default=None):
         return default
 
 
+def _ascii_digits(value: str) -> bool:
+    return value.isascii() and value.isdigit()
+
+
+def _parse_date(value: str):
+    if len(value) == 10 and value[4] == value[7] == "-":
+        year, month, day = value[:4], value[5:7], value[8:]
+        if _ascii_digits(year + month + day):
+            return datetime(int(year), int(month), int(day))
+    return None
+
+
+def _parse_time(value: str):
+    if len(value) == 8 and value[2] == value[5] == ":":
+        hour, minute, second = value[:2], value[3:5], value[6:]
+        if _ascii_digits(hour + minute + second):
+            return datetime(1900, 1, 1, int(hour), int(minute), int(second))
+    return None
+
+
+def _parse_datetime(value: str):
+    if len(value) == 19 and value[10] == " ":
+        day = _parse_date(value[:10])
+        time = _parse_time(value[11:])
+        if day is not None and time is not None:
+            return datetime.combine(day.date(), time.time())
+    return None
+
+
+_FAST_PARSERS = {
+    "%Y-%m-%d": _parse_date,
+    "%H:%M:%S": _parse_time,
+    "%Y-%m-%d %H:%M:%S": _parse_datetime,
+}
+
+
+def datetime_converter(date_format: str):
+    """Return a ``value -> datetime | None`` converter for ``date_format``.
+
+    Same results as ``safe_datetime_conversion``, but the fixed formats of the
+    Lengow feed are parsed by slicing instead of ``strptime``. Anything the
+    fast path does not recognise falls back to ``strptime``.
+    """
+    fast_parse = _FAST_PARSERS.get(date_format)
+    if fast_parse is None:
+        return partial(safe_datetime_conversion, date_format=date_format)
+
+    @lru_cache(maxsize=4096)
+    def convert(value):
+        if value:
+            try:
+                parsed = fast_parse(value)
+            except ValueError:
+                parsed = None
+            if parsed is not None:
+                return parsed
+        return safe_datetime_conversion(value, date_format)
+
+    return convert
+
+
 def get_str_from_element_and_xpath(element: ElementTree.Element, xpath: str) -> str:
     found_element = element.find(xpath)
     if found_element is not None:
         return found_element.text.strip() if found_element.text else ""
     else:
         return ""
+
+
+def iter_elements_from_chunks(chunks, tag: str):
+    """Incrementally parse an XML byte stream and yield each ``tag`` element.
+
+    Yielded elements are complete; once the caller resumes the generator they
+    are detached from their parent, so memory only holds the elements the
+    caller keeps (fetch_orders keeps a batch, to store the source of orders
+    the database rejects).
+    """
+    parser = ElementTree.XMLPullParser(events=("start", "end"))
+    stack: list[ElementTree.Element] = []
+
+    def drain():
+        for event, element in parser.read_events():
+            if event == "start":
+                stack.append(element)
+                continue
+            stack.pop()
+            if element.tag == tag:
+                yield element
+                if stack:
+                    stack[-1].remove(element)
+
+    for chunk in chunks:
+        parser.feed(chunk)
+        yield from drain()
+    parser.close()
+    yield from drain()
+
+
+def batched(iterable, size: int):
+    """Yield lists of at most ``size`` items from ``iterable``."""
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
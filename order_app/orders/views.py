@@ -1,17 +1,334 @@
-from rest_framework import generics, permissions
+import csv
 
-from .models import Order
-from .serializers import OrderSerializer
+from django.core.serializers.json import DjangoJSONEncoder
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from rest_framework import generics, permissions, status
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .archive import find_archived_order
+from .cache import cached_response, detail_key, invalidate_orders, list_key
+from .contacts import (
+    CONTACT_RELATIONS,
+    ORDER_FIELD_NAMES,
+    order_lookups,
+    only_order_fields,
+)
+from .filters import ROLLUP_FILTERS, filter_orders
+from .metrics import registry
+from .models import DailySalesRollup, Order
+from .pagination import OrderKeysetPagination
+from .rollups import refresh_sales_rollups, rollup_values
+from .search import reindex_orders, search_orders
+from .serializers import (
+    DailySalesRollupSerializer,
+    OrderBulkUpdateItemSerializer,
+    OrderListSerializer,
+    OrderSerializer,
+)
+
+# Columns written by the bulk export, in model order, and their ORM lookups.
+EXPORT_COLUMNS = [name for name in ORDER_FIELD_NAMES if name != "content_hash"]
+EXPORT_LOOKUPS = order_lookups(EXPORT_COLUMNS)
+
+# Columns the keyset pagination always needs.
+PAGINATION_COLUMNS = ["order_purchase_date", "order_id"]
 
 
 class OrderListView(generics.ListCreateAPIView):
     queryset = Order.objects.all()
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = OrderKeysetPagination
+
+    def get_sparse_fields(self):
+        """Field names requested through ``?fields=``, or None."""
+        param = self.request.query_params.get("fields")
+        if not param:
+            return None
+        fields = [field.strip() for field in param.split(",") if field.strip()]
+        unknown = set(fields) - set(OrderSerializer().fields)
+        if unknown:
+            raise ValidationError({"fields": f"Unknown fields: {sorted(unknown)}"})
+        return fields
+
+    def get_list_fields(self):
+        return self.get_sparse_fields() or OrderListSerializer.Meta.fields
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request.method == "GET":
+            fields = self.get_list_fields()
+            queryset = only_order_fields(queryset, [*fields, *PAGINATION_COLUMNS])
+            if "lines" in fields:
+                queryset = queryset.prefetch_related("lines")
+        queryset = filter_orders(queryset, self.request.query_params)
+        return search_orders(queryset, self.request.query_params.get("q", ""))
+
+    def list(self, request, *args, **kwargs):
+        return cached_response(
+            request,
+            list_key(request),
+            lambda: super(OrderListView, self).list(request, *args, **kwargs),
+        )
+
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        reindex_orders([serializer.instance.order_id])
+        refresh_sales_rollups(
+            [serializer.instance.order_purchase_date], after=[serializer.instance]
+        )
+        invalidate_orders([serializer.instance.order_id])
+
+    def get_serializer(self, *args, **kwargs):
+        if self.request.method != "GET":
+            return super().get_serializer(*args, **kwargs)
+        kwargs.setdefault("context", self.get_serializer_context())
+        sparse_fields = self.get_sparse_fields()
+        if sparse_fields is None:
+            return OrderListSerializer(*args, **kwargs)
+        return OrderSerializer(*args, fields=sparse_fields, **kwargs)
 
 
 class OrderDetailView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = Order.objects.all()
+    queryset = Order.objects.select_related(*CONTACT_RELATIONS).prefetch_related(
+        "lines"
+    )
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated]
     lookup_field = "order_id"
+
+    def retrieve(self, request, *args, **kwargs):
+        return cached_response(
+            request,
+            detail_key(kwargs["order_id"]),
+            lambda: self.retrieve_live_or_archived(request, *args, **kwargs),
+        )
+
+    def retrieve_live_or_archived(self, request, *args, **kwargs):
+        """Serve the order from the database or, once archived, read-only
+        from the archive."""
+        try:
+            return super().retrieve(request, *args, **kwargs)
+        except Http404:
+            data = find_archived_order(kwargs["order_id"])
+            if data is None:
+                raise
+            return Response(data)
+
+    def perform_update(self, serializer):
+        previous = rollup_values(serializer.instance)
+        super().perform_update(serializer)
+        reindex_orders([serializer.instance.order_id])
+        refresh_sales_rollups(
+            [previous["order_purchase_date"], serializer.instance.order_purchase_date],
+            [previous],
+            [serializer.instance],
+        )
+        invalidate_orders([serializer.instance.order_id])
+
+    def perform_destroy(self, instance):
+        # Taken first: deleting the instance clears its order_id.
+        previous = rollup_values(instance)
+        super().perform_destroy(instance)
+        refresh_sales_rollups([previous["order_purchase_date"]], before=[previous])
+        invalidate_orders([previous["order_id"]])
+
+
+class OrderBulkUpdateView(APIView):
+    """Apply a batch of partial tracking/status updates in one transaction.
+
+    The body is a list of objects with an order_id and any of
+    order_status_lengow, tracking_number, tracking_carrier and
+    tracking_shipped_date. Items are validated in one pass, then written with
+    one bulk_update per set of updated fields. The response reports, in
+    input order, whether each item was updated, invalid or not found.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+    max_items = 5000
+
+    def post(self, request):
+        items = request.data
+        if not isinstance(items, list):
+            raise ValidationError("Expected a list of updates.")
+        if len(items) > self.max_items:
+            raise ValidationError(f"At most {self.max_items} updates per request.")
+
+        results = []
+        updates = {}
+        for item in items:
+            serializer = OrderBulkUpdateItemSerializer(data=item)
+            if not serializer.is_valid():
+                order_id = item.get("order_id") if isinstance(item, dict) else None
+                results.append(
+                    {
+                        "order_id": order_id,
+                        "status": "invalid",
+                        "errors": serializer.errors,
+                    }
+                )
+                continue
+            fields = dict(serializer.validated_data)
+            order_id = fields.pop("order_id")
+            if order_id in updates:
+                results.append(
+                    {
+                        "order_id": order_id,
+                        "status": "invalid",
+                        "errors": {"order_id": ["Duplicate order_id in batch."]},
+                    }
+                )
+                continue
+            updates[order_id] = fields
+            results.append({"order_id": order_id, "status": "updated"})
+
+        with transaction.atomic():
+            # Locked so an order deleted meanwhile is not reported updated.
+            existing = set(
+                Order.objects.select_for_update()
+                .filter(order_id__in=list(updates))
+                .values_list("order_id", flat=True)
+            )
+            groups = {}
+            for order_id, fields in updates.items():
+                if order_id in existing:
+                    groups.setdefault(tuple(sorted(fields)), []).append(
+                        Order(order_id=order_id, **fields)
+                    )
+            for fields, orders in groups.items():
+                Order.objects.bulk_update(orders, fields, batch_size=500)
+            reindex_orders(
+                [
+                    order.order_id
+                    for fields, orders in groups.items()
+                    if "tracking_number" in fields
+                    for order in orders
+                ]
+            )
+
+        for result in results:
+            if result["status"] == "updated" and result["order_id"] not in existing:
+                result["status"] = "not_found"
+        invalidate_orders(existing)
+
+        return Response(
+            {"updated": len(existing), "results": results}, status=status.HTTP_200_OK
+        )
+
+
+class SalesAggregatesView(generics.ListAPIView):
+    """Daily sales totals per marketplace and currency, read from the rollups.
+
+    Filter with marketplace, order_currency and the
+    order_purchase_date_from/_to range.
+    """
+
+    serializer_class = DailySalesRollupSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return filter_orders(
+            DailySalesRollup.objects.order_by(
+                "order_purchase_date", "marketplace", "order_currency"
+            ),
+            self.request.query_params,
+            ROLLUP_FILTERS,
+        )
+
+
+class Echo:
+    """File-like object whose ``write`` returns the value, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+class OrderExportView(APIView):
+    """Stream every order matching the list filters as NDJSON or CSV.
+
+    Rows are read with ``values_list().iterator()`` so no model instance is
+    built and memory stays constant whatever the export size. Under ASGI they
+    are read with ``aiterator()`` instead: Django would otherwise load a sync
+    iterator whole before sending the first byte.
+    """
+
+    permission_classes = [permissions.IsAuthenticated]
+    chunk_size = 2000
+    content_types = {
+        "ndjson": "application/x-ndjson",
+        "csv": "text/csv",
+    }
+
+    def get(self, request):
+        return self.export(
+            request.query_params, asynchronous=isinstance(request._request, ASGIRequest)
+        )
+
+    @classmethod
+    def export(cls, params, asynchronous=False) -> StreamingHttpResponse:
+        """Export response for the query ``params``, also used by the async
+        export view. ``asynchronous`` streams it from an async iterator."""
+        output = params.get("output", "ndjson")
+        if output not in cls.content_types:
+            raise ValidationError(
+                {"output": f"Choose one of {sorted(cls.content_types)}."}
+            )
+        queryset = filter_orders(Order.objects.all(), params)
+        queryset = search_orders(queryset, params.get("q", "")).order_by()
+        if asynchronous:
+            # values() rather than values_list(): on Django 5.1 the latter
+            # runs its query as soon as aiterator() starts, in the event loop.
+            rows = queryset.values(*EXPORT_LOOKUPS).aiterator(chunk_size=cls.chunk_size)
+            content = cls.aiter_csv(rows) if output == "csv" else cls.aiter_ndjson(rows)
+        else:
+            rows = queryset.values_list(*EXPORT_LOOKUPS).iterator(
+                chunk_size=cls.chunk_size
+            )
+            content = cls.iter_csv(rows) if output == "csv" else cls.iter_ndjson(rows)
+        response = StreamingHttpResponse(
+            content, content_type=cls.content_types[output]
+        )
+        response["Content-Disposition"] = f'attachment; filename="orders.{output}"'
+        return response
+
+    @staticmethod
+    def iter_ndjson(rows):
+        encoder = DjangoJSONEncoder()
+        for row in rows:
+            yield encoder.encode(dict(zip(EXPORT_COLUMNS, row))) + "\n"
+
+    @staticmethod
+    def iter_csv(rows):
+        writer = csv.writer(Echo())
+        yield writer.writerow(EXPORT_COLUMNS)
+        for row in rows:
+            yield writer.writerow(row)
+
+    @staticmethod
+    async def aiter_ndjson(rows):
+        encoder = DjangoJSONEncoder()
+        async for row in rows:
+            yield encoder.encode(dict(zip(EXPORT_COLUMNS, row.values()))) + "\n"
+
+    @staticmethod
+    async def aiter_csv(rows):
+        writer = csv.writer(Echo())
+        yield writer.writerow(EXPORT_COLUMNS)
+        async for row in rows:
+            yield writer.writerow(row.values())
+
+
+class OrderMetricsView(APIView):
+    """Expose the order API metrics in the Prometheus text format."""
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        if not getattr(settings, "ORDERS_METRICS_ENABLED", False):
+            raise Http404
+        return HttpResponse(registry.render(), content_type="text/plain; version=0.0.4")
@@ -0,0 +1,66 @@
+"""Process pool used by ``fetch_orders --workers`` to parse orders in parallel.
+
+Workers only receive serialized ``<order>`` fragments and return plain field
+dicts, the parent process keeps ownership of every database write.
+"""
+
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from xml.etree import ElementTree
+
+import django
+
+from orders.utils import batched
+
+
+def init_worker():
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "order_app.settings")
+    django.setup()
+
+
+def extract_order_fragments(fragments: list[bytes]) -> list:
+    """One ``(values, rejection)`` pair per fragment, without the source:
+    the parent process already holds the fragments."""
+    from orders.ingestion import SOURCE_FIELD, OrderRejection, extract_order_values
+
+    results = []
+    for fragment in fragments:
+        try:
+            order_elem = ElementTree.fromstring(fragment)
+        except ElementTree.ParseError as e:
+            rejection = OrderRejection(
+                order_id="", reason=str(e), raw=fragment.decode(errors="replace")
+            )
+            results.append((None, rejection))
+            continue
+        for values, rejection in extract_order_values([order_elem]):
+            if values is not None:
+                del values[SOURCE_FIELD]
+            results.append((values, rejection))
+    return results
+
+
+def extract_order_values_in_workers(order_elements, workers: int, chunk_size=200):
+    """Yield ``(values, rejection)`` for each order element, in feed order.
+
+    At most ``2 * workers`` chunks are in flight so a streamed feed is never
+    buffered entirely in memory.
+    """
+    from orders.ingestion import SOURCE_FIELD
+
+    def results(chunk, future):
+        for fragment, (values, rejection) in zip(chunk, future.result()):
+            if values is not None:
+                values[SOURCE_FIELD] = fragment
+            yield values, rejection
+
+    fragments = (ElementTree.tostring(order_elem) for order_elem in order_elements)
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as executor:
+        pending = deque()
+        for chunk in batched(fragments, chunk_size):
+            pending.append((chunk, executor.submit(extract_order_fragments, chunk)))
+            if len(pending) >= 2 * workers:
+                yield from results(*pending.popleft())
+        while pending:
+            yield from results(*pending.popleft())